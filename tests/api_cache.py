@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from tests.api_transport import add_middleware, make_response
+from tests.docker_configs.docker_configs import API_CACHE_DB
+from tests.log_util import init_logger
+from tests.run_context import get_current_docker_name
+from tests.timing_store import get_config_digest
+
+"""
+- Record/replay cache of the Waii API calls made by the clients of init_api_client (refer api_transport.py).
+- Mode is set by $WAII_API_CACHE:
+    - off (default): calls go to the container.
+    - record: calls go to the container; successful responses are stored.
+    - replay: responses are served from the cache only; no container is launched (refer conftest.py). A call
+      that was never recorded fails with ApiCacheMiss.
+- Key: endpoint + canonical (sorted) JSON body + image digest of the docker config of the test. So a new image
+  invalidates the recordings. Replay without docker falls back to the digest of the last recording of the config.
+- The same request recorded twice keeps the last response; e.g a polled connector status replays as 'completed'.
+- Stored in API_CACHE_DB (or $WAII_API_CACHE_DB), bounded to $WAII_API_CACHE_MAX_MB (default 256) by evicting the
+  least recently used responses.
+"""
+
+logger = init_logger()
+
+MODE_OFF = "off"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+DEFAULT_MAX_MB = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    docker_name TEXT,
+    image_digest TEXT,
+    request TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    content_type TEXT,
+    content BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    recorded_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used_at);
+CREATE TABLE IF NOT EXISTS digests (
+    docker_name TEXT PRIMARY KEY,
+    image_digest TEXT
+);
+CREATE TABLE IF NOT EXISTS totals (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals (name, value) SELECT 'size', COALESCE(SUM(size), 0) FROM responses;
+"""
+
+_local = threading.local()
+
+
+class ApiCacheMiss(Exception):
+    pass
+
+
+def get_mode():
+    mode = os.environ.get("WAII_API_CACHE", MODE_OFF).strip().lower() or MODE_OFF
+    if mode not in (MODE_OFF, MODE_RECORD, MODE_REPLAY):
+        raise ValueError(f"Invalid WAII_API_CACHE: {mode}; use one of {MODE_OFF}, {MODE_RECORD}, {MODE_REPLAY}")
+    return mode
+
+
+def is_replay():
+    return get_mode() == MODE_REPLAY
+
+
+def get_db_path():
+    return os.environ.get("WAII_API_CACHE_DB", API_CACHE_DB)
+
+
+def get_max_bytes():
+    return int(float(os.environ.get("WAII_API_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024)
+
+
+def get_connection():
+    """SQLite connection of this thread (async_client runs calls in several threads)."""
+    db_path = get_db_path()
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.db_path != db_path:
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=60)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        _local.conn, _local.db_path = conn, db_path
+    return conn
+
+
+def canonical_body(data):
+    try:
+        return json.dumps(json.loads(data or "{}"), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return data or ""
+
+
+def get_image_digest(conn, docker_name):
+    if docker_name is None:
+        return None
+    image_digest = get_config_digest(docker_name)
+    if image_digest is None and is_replay():
+        row = conn.execute("SELECT image_digest FROM digests WHERE docker_name = ?", (docker_name,)).fetchone()
+        image_digest = row[0] if row else None
+    return image_digest
+
+
+def get_key(endpoint, body, image_digest):
+    return hashlib.sha256(json.dumps([endpoint, body, image_digest]).encode("utf-8")).hexdigest()
+
+
+def lookup(conn, key):
+    row = conn.execute("SELECT status_code, content_type, content FROM responses WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    with conn:
+        conn.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+    return make_response(row[0], bytes(row[2]), row[1])
+
+
+def get_total_bytes(conn):
+    """Size of the stored responses; kept up to date by store and evict, so that no store sums them."""
+    return conn.execute("SELECT value FROM totals WHERE name = 'size'").fetchone()[0]
+
+
+def store(conn, key, endpoint, body, docker_name, image_digest, response):
+    now = time.time()
+    size = len(response.content) + len(body)
+    with conn:
+        # First statement of the transaction: takes the write lock, so the replaced size is the current one
+        conn.execute("UPDATE totals SET value = value + ? - COALESCE((SELECT size FROM responses WHERE key = ?), 0)"
+                     " WHERE name = 'size'", (size, key))
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, endpoint, docker_name, image_digest, request, status_code,"
+            " content_type, content, size, recorded_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, endpoint, docker_name, image_digest, body, response.status_code,
+             response.headers.get("Content-Type"), response.content, size, now, now))
+        if docker_name is not None:
+            conn.execute("INSERT OR REPLACE INTO digests (docker_name, image_digest) VALUES (?, ?)",
+                         (docker_name, image_digest))
+    evict(conn, get_max_bytes())
+
+
+def evict(conn, max_bytes):
+    """Delete the least recently used responses until the cache is within 90% of max_bytes."""
+    total = get_total_bytes(conn)
+    if total <= max_bytes:
+        return 0
+    target = int(max_bytes * 0.9)
+    evicted = 0
+    with conn:
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used_at").fetchall():
+            if total <= target:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.execute("UPDATE totals SET value = value - ? WHERE name = 'size'", (size,))
+            total -= size
+            evicted += 1
+    logger.info(f"API cache: evicted {evicted} least recently used responses")
+    return evicted
+
+
+def api_cache_middleware(request, call_next):
+    mode = get_mode()
+    if mode == MODE_OFF:
+        return call_next(request)
+    conn = get_connection()
+    docker_name = get_current_docker_name()
+    image_digest = get_image_digest(conn, docker_name)
+    body = canonical_body(request.data)
+    key = get_key(request.endpoint, body, image_digest)
+    if mode == MODE_REPLAY:
+        response = lookup(conn, key)
+        if response is None:
+            raise ApiCacheMiss(f"No recorded response for {request.endpoint} (docker: {docker_name}): {body[:200]}")
+        return response
+    response = call_next(request)
+    if response.status_code == 200:
+        store(conn, key, request.endpoint, body, docker_name, image_digest, response)
+    return response
+
+
+def enable_api_cache():
+    """Install the cache in the transport of the SDK, unless $WAII_API_CACHE is off."""
+    if get_mode() == MODE_OFF:
+        return
+    add_middleware(api_cache_middleware)
+    logger.info(f"API cache enabled: mode: {get_mode()}, db: {get_db_path()}")
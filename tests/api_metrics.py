@@ -0,0 +1,167 @@
+import html
+import json
+import threading
+import time
+
+from tests.api_transport import add_middleware
+from tests.docker_configs.docker_configs import get_logger_file
+from tests.log_util import init_logger
+from tests.run_context import get_current_item, strip_group
+
+"""
+- Instrumentation of the API calls of the Waii clients (init_api_client): endpoint, request/response size, latency
+  and status of every call, attributed to the test running in this process (calls of custom_setup go to the first
+  test of the class, those of custom_cleanup to the last one).
+- Time spent waiting by the test is recorded as well, as endpoint "wait:<category>", so that it shows up next to the
+  calls: sleeps between polls (polling.py) and waits for the connector watcher (its status calls, made in
+  background, overlap with the wait).
+- When a test is done (teardown report), its per-endpoint stats are attached to the report as user property
+  "api_calls" (so they reach the xdist controller and any pytest_runtest_logreport hook) and, with --html, as a
+  table in the report.
+- The controller aggregates them per test, per class and per endpoint and writes logs/api_calls.json at the end
+  of the session.
+"""
+
+logger = init_logger()
+
+SUMMARY_FILE = "logs/api_calls.json"
+WAIT_PREFIX = "wait:"
+USER_PROPERTY = "api_calls"
+
+_lock = threading.Lock()
+# nodeid -> [call], for the tests of this process that are not done yet
+_calls = {}
+# nodeid -> {endpoint: stats}, of the reports collected by this process
+_test_stats = {}
+
+
+def get_nodeid():
+    item = get_current_item()
+    return strip_group(item.nodeid) if item is not None else None
+
+
+def get_class_id(nodeid):
+    return nodeid.rsplit("::", 1)[0]
+
+
+def record_call(endpoint, latency, request_bytes=0, response_bytes=0, status=None, nodeid=None):
+    nodeid = nodeid or get_nodeid()
+    if nodeid is None:
+        # Outside of a test (e.g pre-launch); not attributed
+        return
+    call = {"endpoint": endpoint, "latency": latency, "request_bytes": request_bytes,
+            "response_bytes": response_bytes, "status": status, "ts": time.time()}
+    with _lock:
+        _calls.setdefault(nodeid, []).append(call)
+
+
+def record_wait(category, seconds):
+    """Time the current test spent waiting (sleeping or blocked) on category (e.g "ingest", not a job id)."""
+    if seconds > 0:
+        record_call(f"{WAIT_PREFIX}{category}", seconds)
+
+
+def api_metrics_middleware(request, call_next):
+    start_time = time.perf_counter()
+    try:
+        response = call_next(request)
+    except Exception as e:
+        record_call(request.endpoint, time.perf_counter() - start_time, len(request.data or ""),
+                    status=type(e).__name__)
+        raise
+    record_call(request.endpoint, time.perf_counter() - start_time, len(request.data or ""),
+                len(response.content or b""), response.status_code)
+    return response
+
+
+def enable_api_metrics():
+    add_middleware(api_metrics_middleware)
+
+
+def new_stats():
+    return {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "request_bytes": 0, "response_bytes": 0, "errors": 0}
+
+
+def add_stats(total, stats):
+    total["calls"] += stats["calls"]
+    total["seconds"] += stats["seconds"]
+    total["max_seconds"] = max(total["max_seconds"], stats["max_seconds"])
+    total["request_bytes"] += stats["request_bytes"]
+    total["response_bytes"] += stats["response_bytes"]
+    total["errors"] += stats["errors"]
+    return total
+
+
+def summarize_calls(calls):
+    """{endpoint: stats} of a list of calls, slowest endpoint first."""
+    summary = {}
+    for call in calls:
+        stats = summary.setdefault(call["endpoint"], new_stats())
+        add_stats(stats, {"calls": 1, "seconds": call["latency"], "max_seconds": call["latency"],
+                          "request_bytes": call["request_bytes"], "response_bytes": call["response_bytes"],
+                          "errors": int(call["status"] is not None and call["status"] != 200)})
+    return dict(sorted(summary.items(), key=lambda entry: -entry[1]["seconds"]))
+
+
+def pop_test_calls(nodeid):
+    """Calls recorded for the test so far, removed from the buffer."""
+    with _lock:
+        return _calls.pop(strip_group(nodeid), [])
+
+
+def attach_api_calls(item, report, pytest_html=None):
+    """Attach the per-endpoint stats of the test (done) to its report; as html table too if pytest_html is given."""
+    summary = summarize_calls(pop_test_calls(item.nodeid))
+    if not summary:
+        return
+    report.user_properties.append((USER_PROPERTY, summary))
+    if pytest_html is not None:
+        report.extras = getattr(report, "extras", []) + [pytest_html.extras.html(format_html_table(summary))]
+
+
+def format_html_table(summary):
+    rows = "".join(
+        f"<tr><td>{html.escape(endpoint)}</td><td>{stats['calls']}</td><td>{stats['seconds']:.3f}</td>"
+        f"<td>{stats['max_seconds']:.3f}</td><td>{stats['request_bytes']}</td><td>{stats['response_bytes']}</td>"
+        f"<td>{stats['errors']}</td></tr>"
+        for endpoint, stats in summary.items())
+    return ("<table><tr><th>API endpoint</th><th>calls</th><th>seconds</th><th>max seconds</th>"
+            f"<th>request bytes</th><th>response bytes</th><th>errors</th></tr>{rows}</table>")
+
+
+def collect_report(report):
+    """Keep the api_calls user property of a (teardown) report; called by pytest_runtest_logreport."""
+    for name, value in getattr(report, "user_properties", []):
+        if name == USER_PROPERTY:
+            _test_stats[strip_group(report.nodeid)] = value
+
+
+def get_test_stats(nodeid):
+    """{endpoint: stats} of a test whose report was collected."""
+    return _test_stats.get(strip_group(nodeid), {})
+
+
+def build_summary():
+    """Stats per endpoint, per class and per test of the collected reports."""
+    endpoints, classes = {}, {}
+    for nodeid, summary in _test_stats.items():
+        class_stats = classes.setdefault(get_class_id(nodeid), {})
+        for endpoint, stats in summary.items():
+            add_stats(endpoints.setdefault(endpoint, new_stats()), stats)
+            add_stats(class_stats.setdefault(endpoint, new_stats()), stats)
+    return {"endpoints": endpoints, "classes": classes, "tests": dict(_test_stats)}
+
+
+def save_summary(summary_file=SUMMARY_FILE):
+    """Write the summary of the collected reports (controller, end of the session). Returns its path."""
+    if not _test_stats:
+        return None
+    summary = build_summary()
+    path = get_logger_file(summary_file)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    slowest = sorted(summary["endpoints"].items(), key=lambda entry: -entry[1]["seconds"])[:5]
+    logger.info(f"API calls of {len(_test_stats)} tests written to {path}. Slowest endpoints: "
+                + ", ".join(f"{endpoint}: {stats['calls']} calls {stats['seconds']:.2f}s"
+                            for endpoint, stats in slowest))
+    return path
@@ -0,0 +1,74 @@
+import threading
+
+import requests
+from waii_sdk_py.waii_http_client import waii_http_client
+
+"""
+- Transport of the Waii SDK: WaiiHttpClient.common_fetch sends every API call with requests.post.
+- install() swaps the requests module seen by the SDK with a shim, so that middlewares can observe, serve or
+  modify the calls of every client (e.g api_cache.py records and replays them).
+- A middleware is middleware(request: ApiRequest, call_next) -> requests.Response. call_next(request) calls the
+  next middleware, and the last one sends the request.
+"""
+
+_middlewares = []
+_install_lock = threading.Lock()
+
+
+class ApiRequest:
+    """POST request of the SDK. endpoint is relative to the base url of the client (e.g 'update-db-connect-info')."""
+
+    def __init__(self, url, headers, data, timeout):
+        self.url = url
+        self.headers = headers or {}
+        self.data = data
+        self.timeout = timeout
+
+    @property
+    def endpoint(self):
+        return self.url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def send(request):
+    return requests.post(request.url, headers=request.headers, data=request.data, timeout=request.timeout)
+
+
+def dispatch(request, index=0):
+    if index >= len(_middlewares):
+        return send(request)
+    return _middlewares[index](request, lambda next_request: dispatch(next_request, index + 1))
+
+
+class _RequestsShim:
+    """Stands in for the requests module in waii_http_client; everything but post is the real module."""
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    @staticmethod
+    def post(url, headers=None, data=None, timeout=None):
+        return dispatch(ApiRequest(url, headers, data, timeout))
+
+
+def install():
+    with _install_lock:
+        if not isinstance(waii_http_client.requests, _RequestsShim):
+            waii_http_client.requests = _RequestsShim()
+
+
+def add_middleware(middleware):
+    """Add middleware (once) to the transport of all the clients. Earlier middlewares wrap the later ones."""
+    install()
+    with _install_lock:
+        if middleware not in _middlewares:
+            _middlewares.append(middleware)
+
+
+def make_response(status_code, content, content_type="application/json"):
+    """requests.Response for a response that was not received over the network (e.g replayed)."""
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = content
+    response.encoding = "utf-8"
+    response.headers["Content-Type"] = content_type
+    return response
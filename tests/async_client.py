@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import os
+import weakref
+
+"""
+- Async facade of the (blocking) Waii client returned by init_api_client, so that tests can gather independent
+  calls (e.g LLM generations) against one container instead of making them one at a time.
+- Same API as the client, but every method returns a coroutine:
+      aclient = AsyncWaiiClient(api_client)
+      responses = run_concurrently(aclient.query.generate(params=...) for ask in asks)
+- Calls run in threads (asyncio.to_thread). At most max_concurrency calls of a client are in flight at a time
+  ($WAII_ASYNC_CONCURRENCY, defaults to 8), so that a test does not overload the container.
+"""
+
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+def get_default_concurrency():
+    return max(1, int(os.environ.get("WAII_ASYNC_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)))
+
+
+class AsyncWaiiClient:
+    """Wraps api_client; api_client.<impl>.<method>(...) becomes await aclient.<impl>.<method>(...)."""
+
+    def __init__(self, api_client, max_concurrency=None):
+        self.api_client = api_client
+        self.max_concurrency = max_concurrency or get_default_concurrency()
+        # asyncio.Semaphore is bound to the loop it is first used in; one per loop (e.g per asyncio.run).
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _get_semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def call(self, fn, *args, **kwargs):
+        """Run the blocking fn(*args, **kwargs) in a thread, within the concurrency limit."""
+        async with self._get_semaphore():
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return _AsyncProxy(getattr(self.api_client, name), self)
+
+
+class _AsyncProxy:
+    """Async view of an attribute of the client: methods become coroutine functions, objects are proxied again."""
+
+    def __init__(self, target, client):
+        self._target = target
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return _AsyncProxy(attr, self._client)
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return await self._client.call(attr, *args, **kwargs)
+        return call
+
+
+def run_concurrently(coroutines):
+    """Run the coroutines concurrently (from sync code, e.g a test) and return their results in order."""
+    async def gather():
+        return await asyncio.gather(*coroutines)
+    return asyncio.run(gather())
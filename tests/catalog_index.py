@@ -0,0 +1,155 @@
+import json
+import threading
+
+from waii_sdk_py.database import GetCatalogRequest, SearchContext
+
+from tests.api_transport import add_middleware
+from tests.log_util import init_logger
+
+"""
+- Index of the catalogs (get_catalogs) of a connection, for lookups of tables/columns by (db, schema, table, column)
+  without walking catalog -> schema -> table -> column every time. Names are compared after strip() + lower().
+- get_catalog_index(api_client) fetches the catalogs of the activated connection once and caches the index per
+  container (base url of the client) and connection.
+- The cached indexes of a container are dropped whenever connections are added or removed (update-db-connect-info
+  with "updated"/"removed"), so an index never outlives a change of the connections. Listing the connections goes to
+  the same endpoint and keeps the indexes; activating another connection changes the scope, which is part of the key.
+- For connections too large to fetch (or index) at once, iter_catalogs()/iter_tables() walk the catalogs lazily with
+  one scoped get_catalogs call (SearchContext) per database; only the response of the current database is held.
+"""
+
+logger = init_logger()
+
+CONNECTIONS_ENDPOINT = "update-db-connect-info"
+
+_lock = threading.Lock()
+# (base_url, connection key) -> CatalogIndex
+_indexes = {}
+
+
+def normalize(name):
+    return (name or "").strip().lower()
+
+
+class CatalogIndex:
+    """Tables and columns of a list of CatalogDefinition, keyed by normalized names."""
+
+    def __init__(self, catalogs):
+        self.catalog_names = [catalog.name for catalog in catalogs]
+        # (db, schema, table) -> TableDefinition
+        self.tables = {}
+        # (db, schema, table, column) -> ColumnDefinition
+        self.columns = {}
+        # table -> [(db, schema, table)], for lookups without db/schema
+        self.tables_by_name = {}
+        for catalog in catalogs:
+            for schema in catalog.schemas or []:
+                for table in schema.tables or []:
+                    self.add_table(table)
+
+    def add_table(self, table):
+        key = (normalize(table.name.database_name), normalize(table.name.schema_name), normalize(table.name.table_name))
+        self.tables[key] = table
+        self.tables_by_name.setdefault(key[2], []).append(key)
+        for column in table.columns or []:
+            self.columns[key + (normalize(column.name),)] = column
+
+    def __len__(self):
+        return len(self.tables)
+
+    def find_tables(self, table_name, schema_name=None, db_name=None):
+        """Keys of the tables named table_name, optionally restricted to schema_name/db_name."""
+        return [key for key in self.tables_by_name.get(normalize(table_name), [])
+                if (schema_name is None or key[1] == normalize(schema_name))
+                and (db_name is None or key[0] == normalize(db_name))]
+
+    def get_table(self, table_name, schema_name=None, db_name=None):
+        if schema_name is not None and db_name is not None:
+            return self.tables.get((normalize(db_name), normalize(schema_name), normalize(table_name)))
+        keys = self.find_tables(table_name, schema_name, db_name)
+        return self.tables[keys[0]] if keys else None
+
+    def get_column(self, table_name, column_name, schema_name=None, db_name=None):
+        """First column named column_name in the tables named table_name (of schema_name/db_name if given)."""
+        for key in self.find_tables(table_name, schema_name, db_name):
+            column = self.columns.get(key + (normalize(column_name),))
+            if column is not None:
+                return column
+        return None
+
+
+def get_scoped_catalogs(api_client, db_name="*", schema_name="*", table_name="*"):
+    """Catalogs of the activated connection within db_name/schema_name/table_name (names or patterns)."""
+    search_context = SearchContext(db_name=db_name, schema_name=schema_name, table_name=table_name)
+    return api_client.database.get_catalogs(GetCatalogRequest(search_context=[search_context])).catalogs
+
+
+def iter_catalogs(api_client, db_names=("*",), schema_name="*", table_name="*"):
+    """Yield the CatalogDefinition of each of db_names, fetching one database at a time."""
+    if isinstance(db_names, str):
+        db_names = [db_names]
+    for db_name in db_names:
+        catalogs = get_scoped_catalogs(api_client, db_name, schema_name, table_name)[::-1]
+        while catalogs:
+            # Popped, so that a catalog is released as soon as the caller is done with it
+            yield catalogs.pop()
+
+
+def iter_tables(api_client, db_names=("*",), schema_name="*", table_name="*",
+                exclude_schemas=("information_schema",)):
+    """Yield the TableDefinition of the scope lazily, skipping exclude_schemas."""
+    for catalog in iter_catalogs(api_client, db_names, schema_name, table_name):
+        for schema in catalog.schemas or []:
+            if normalize(schema.name.schema_name) in exclude_schemas:
+                continue
+            yield from schema.tables or []
+
+
+def get_index_key(api_client):
+    http_client = api_client.database.http_client
+    return http_client.url, http_client.get_scope()
+
+
+def get_catalog_index(api_client, refresh=False):
+    """CatalogIndex of the activated connection of api_client; fetched once until the connections change."""
+    key = get_index_key(api_client)
+    with _lock:
+        index = None if refresh else _indexes.get(key)
+    if index is None:
+        index = CatalogIndex(api_client.database.get_catalogs().catalogs)
+        logger.info(f"Indexed {len(index)} tables of {key[1]} ({key[0]})")
+        with _lock:
+            _indexes[key] = index
+    return index
+
+
+def invalidate(base_url=None):
+    """Drop the cached indexes of the container at base_url (all of them if None)."""
+    with _lock:
+        for key in [key for key in _indexes if base_url is None or key[0] == base_url]:
+            del _indexes[key]
+
+
+def is_connection_change(request):
+    """True if request adds/updates or removes connections (and not only lists them)."""
+    if request.endpoint != CONNECTIONS_ENDPOINT:
+        return False
+    try:
+        body = json.loads(request.data or "{}")
+    except (TypeError, ValueError):
+        # Unknown body; assume a change
+        return True
+    return bool(body.get("updated") or body.get("removed"))
+
+
+def catalog_index_middleware(request, call_next):
+    try:
+        return call_next(request)
+    finally:
+        # After the call, so that an index fetched while the connections were being changed is dropped as well
+        if is_connection_change(request):
+            invalidate(request.url[:-len(CONNECTIONS_ENDPOINT)])
+
+
+def enable_catalog_index():
+    add_middleware(catalog_index_middleware)
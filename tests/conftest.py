@@ -1,21 +1,149 @@
+import time
+
 import pytest
 
-from tests.docker_configs.docker_configs import DOCKER_CONFIGS, get_pg_dir, get_log_dir, get_base_url
-from tests.docker_utils import cleanup_existing_container, start_docker_container, stop_docker_container
-from tests.log_util import init_logger
-from tests.utils import init_api_client
+from tests.connections import get_connection_key, get_fingerprint
+from tests.container_state import RUN_ID
+from tests.api_cache import is_replay
+from tests.api_metrics import attach_api_calls, collect_report, save_summary
+from tests.container_launcher import collect_docker_configs, get_replay_container, get_snapshot_connections, \
+    prelaunch_containers
+from tests.container_teardown import attach_container, collect_container_users, detach_container, \
+    join_pending_stops, start_reaper, stop_all_containers
+from tests.docker_configs.docker_configs import DOCKER_CONFIGS
+from tests.log_slices import end_slice, get_item_container_name, get_report_extras, start_slice
+from tests.log_util import flush_logs, init_logger, merge_logs
+from tests.pg_snapshot import is_snapshot_enabled, capture_snapshot
+from tests.run_context import set_current_item, get_current_item, strip_group
+from tests.scheduling import DockerGroupScheduling, DurationEstimates, assign_containers, get_assigned_replica, \
+    record_duration, save_durations
+from tests.timeline import collect_spans, flush_spans, record_span, render_waterfall, save_chrome_trace, span
+from tests.timing_store import PHASE_CUSTOM_CLEANUP, PHASE_CUSTOM_SETUP, PHASE_TEST, flush, record_timing
+from tests.utils import init_api_client, register_connection
 
 
 logger = init_logger()
 
+def pytest_addoption(parser):
+    parser.addoption("--no-docker-prelaunch", action="store_true", default=False,
+                     help="Start containers lazily in docker_environment, instead of launching all the "
+                          "containers needed by the collected tests before the first test runs.")
+    parser.addoption("--keep-containers", action="store_true", default=False,
+                     help="Leave the containers running after their tests (and the session) are done, "
+                          "instead of stopping them.")
+    parser.addoption("--container-logs", choices=("failed", "all", "off"), default="failed",
+                     help="Attach the container logs written during a test to the html report (--html): for the "
+                          "failed tests (default), all the tests or none.")
+
+def pytest_configure(config):
+    # xdist workers share the RUN_ID of the controller (PYTEST_XDIST_TESTRUNUID), so it can read their container state.
+    if not hasattr(config, "workerinput") and hasattr(config.option, "testrunuid"):
+        config.option.testrunuid = config.option.testrunuid or RUN_ID
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(config, items):
+    # tryfirst: xdist reads the xdist_group markers (added for containers) in its own collection_modifyitems
+    assign_containers(items, DurationEstimates(config))
+
+def pytest_xdist_make_scheduler(config, log):
+    if config.getvalue("dist") == "loadgroup":
+        return DockerGroupScheduling(config, log)
+    return None
+
+def pytest_runtest_logreport(report):
+    record_duration(report)
+    if report.when == "teardown":
+        collect_report(report)
+    # Reports forwarded by xdist workers (report.node) are recorded in the timing store by the worker itself.
+    if report.when == "call" and getattr(report, "node", None) is None:
+        record_timing(PHASE_TEST, report.duration, node_id=strip_group(report.nodeid), outcome=report.outcome)
+
+def pytest_sessionfinish(session):
+    # Durations are recorded by the controller (or the only process without xdist); workers report to it.
+    if not hasattr(session.config, "workerinput"):
+        save_durations(session.config)
+        save_summary()
+    flush()
+    if not keep_containers(session.config):
+        # Controller runs after all the workers are done; stops the containers still running.
+        if hasattr(session.config, "workerinput"):
+            join_pending_stops()
+        else:
+            stop_all_containers()
+    # Workers write their logs and spans before reporting that they are done; the controller then merges them.
+    if hasattr(session.config, "workerinput"):
+        flush_spans()
+        flush_logs()
+    else:
+        save_timeline(session)
+        merge_logs()
+
+def save_timeline(session):
+    """Chrome trace of the spans of all the processes; kept for the html report (refer timeline.py)."""
+    session.config.timeline_spans = collect_spans()
+    if session.config.timeline_spans:
+        logger.info(f"Timeline written to {save_chrome_trace(session.config.timeline_spans)}")
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_html_results_summary(prefix, summary, postfix, session):
+    prefix.append(render_waterfall(getattr(session.config, "timeline_spans", [])))
+
+def keep_containers(config):
+    return config.getoption("--keep-containers") or is_replay()
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_setup(item):
+    set_current_item(item, get_item_container_name(item))
+    if get_html_plugin(item.config) is not None and item.config.getoption("--container-logs") != "off":
+        start_slice(item)
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    report = (yield).get_result()
+    record_span(f"{item.name} ({report.when})", f"test_{report.when}", report.start, report.stop,
+                nodeid=strip_group(item.nodeid), outcome=report.outcome)
+    # API calls of the test, including those of its teardown (refer api_metrics.py)
+    if report.when == "teardown":
+        attach_api_calls(item, report, get_html_plugin(item.config))
+    # Slice runs from setup to the call (or to the failed/skipped setup)
+    if report.when == "setup" and report.passed:
+        return
+    container_name, slices = end_slice(item)
+    if slices and (report.failed or item.config.getoption("--container-logs") == "all"):
+        report.extras = getattr(report, "extras", []) + get_report_extras(get_html_plugin(item.config),
+                                                                          container_name, slices)
+
+def get_html_plugin(config):
+    """pytest-html, when the html report is enabled."""
+    if not config.getoption("htmlpath", None):
+        return None
+    return config.pluginmanager.getplugin("html")
+
+def pytest_collection_finish(session):
+    """Launch all the containers needed by the selected tests concurrently, before the first test runs."""
+    docker_names = collect_docker_configs(session.items)
+    collect_container_users(session.items)
+    if session.config.option.collectonly or is_replay():
+        return
+    if not keep_containers(session.config):
+        start_reaper()
+    if session.config.getoption("--no-docker-prelaunch"):
+        return
+    logger.info(f"Pre-launching containers for collected tests: {docker_names}")
+    prelaunch_containers(docker_names)
+
 @pytest.fixture(scope="class")
 def docker_environment(request):
     """
     Class-scoped fixture that:
       - Reads the 'docker_config' marker from the test class (defaults to 'waii_default').
       - Loads the corresponding configuration from DOCKER_CONFIGS.
-      - Starts the Docker container using the fully formatted run_command.
-      - Yields control for the test class, then stops the container on teardown.
+      - Attaches to the container if it was pre-launched (or launched by another worker) in this run.
+        Otherwise, restores the pg data dir from a golden snapshot (if enabled) and starts the Docker container
+        using the fully formatted run_command.
+      - Yields the container details (container_name, ports, base_url) to the test class.
+      - Stops the container once the last class using it is done (unless --keep-containers).
+      - With WAII_API_CACHE=replay, nothing is launched; API responses are replayed (refer api_cache.py).
     """
 
     config, docker_name = get_config_for_docker(request)
@@ -26,34 +154,20 @@ def docker_environment(request):
     if not config or docker_name not in DOCKER_CONFIGS:
         return
 
-    # Use the fully formatted run_command and ready_message from the configuration.
-    ready_message = config["ready_message"]
-    startup_timeout = config.get("startup_timeout", 120)
-
-    # Assume the container name is the same as the config key.
-    container_name = docker_name
-
-    # Replace container name in the placeholders. i.e {container_name}, {pg_dir_container_name}, {log_dir_container_name}
-    api_port = str(config.get("api_port", 9859))
-    run_command = (config["run_command"].replace("{{pg_dir_container_name}}", get_pg_dir(container_name))
-                   .replace("{{log_dir_container_name}}", get_log_dir(container_name))
-                   .replace("{{port}}", api_port)
-                   .replace("{{container_name}}", container_name))
-
-    logger.info(f"launching docker name: {container_name}: command {run_command}")
-
-    # Ensure the container is not running by cleaning up any existing instance.
-    cleanup_existing_container(container_name)
-
-    logger.info(f"Starting Docker container with configuration: {container_name}")
-    start_docker_container(run_command, ready_message, startup_timeout, container_name)
+    # Replica assigned at collection (refer scheduling.py).
+    replica = get_assigned_replica(get_current_item())
+    if is_replay():
+        container = get_replay_container(docker_name, config, replica or 0)
+    else:
+        # Registered as user of the container, so that it is not stopped while the class runs
+        with span(f"attach {docker_name}", "docker_environment", replica=replica):
+            container = attach_container(docker_name, config, replica, request.node.nodeid)
 
-    yield  # Tests in the class execute here.
+    yield container  # Tests in the class execute here.
 
-    # TODO: If you want docker container to stop, uncomment out the following
-    # print(f"Stopping Docker container with configuration: {container_name}")
-    # stop_docker_container(container_name) # Just stop
-    # cleanup_existing_container(container_name) # Stop and clean
+    # Stops the container if this was the last class using it (refer container_teardown.py).
+    if not keep_containers(request.config):
+        detach_container(container, request.node.nodeid)
 
 def get_config_for_docker(request):
     marker = request.node.get_closest_marker("docker_config")
@@ -67,6 +181,36 @@ def get_config_for_docker(request):
         pytest.fail(f"No Docker configuration found for key: {docker_name}")
     return config, docker_name
 
+def capture_snapshot_if_indexed(request, api_client, config, docker_name, container_name):
+    """
+    Register the connections declared by the class (docker_config marker) and capture a golden pg snapshot once
+    all the snapshot connections are indexed. Runs before custom_setup, so that class specific state does not end up
+    in the snapshot.
+    Only for a class whose declared definitions are the ones of the snapshot; another class would register them just
+    to have custom_setup register its own over them (two indexings), so that is left to its custom_setup.
+    """
+    snapshot_connections = get_snapshot_connections(docker_name)
+    if not snapshot_connections or not is_snapshot_enabled(config) or is_replay():
+        return
+    declared = request.node.get_closest_marker("docker_config").kwargs.get("connections", [])
+    if not declared:
+        return
+    for connection in declared:
+        key = get_connection_key(connection)
+        if key not in snapshot_connections or get_fingerprint(snapshot_connections[key]) != get_fingerprint(connection):
+            logger.info(f"{request.node.nodeid} declares another definition of {key} than the pg snapshot of "
+                        f"{docker_name}; registered by its custom_setup")
+            return
+    for connection in declared:
+        register_connection(api_client, connection, logger=logger)
+    connector_statuses = api_client.database.get_connections().connector_status or {}
+    pending = [key for key in snapshot_connections
+               if key not in connector_statuses or connector_statuses[key].status != 'completed']
+    if pending:
+        logger.info(f"Skipping pg snapshot for {docker_name}; connections not indexed yet: {pending}")
+        return
+    capture_snapshot(docker_name, config, container_name, snapshot_connections)
+
 @pytest.fixture(scope="class", autouse=True)
 def class_setup_api_client(request, docker_environment):
     """
@@ -80,15 +224,23 @@ def class_setup_api_client(request, docker_environment):
         base_url = "http://localhost:9859/api/"
         api_key = ""
     else:
-        base_url = get_base_url(config)
+        base_url = docker_environment["base_url"]
         api_key = config.get("api_key")
     cls = request.cls
     logger.info(f"Starting API client with configuration: url: {base_url}, api_key: {api_key} for docker: {docker_name}")
     api_client = init_api_client(base_url=base_url, api_key=api_key)
+    if config and docker_name in DOCKER_CONFIGS:
+        capture_snapshot_if_indexed(request, api_client, config, docker_name, docker_environment["container_name"])
     if hasattr(cls, "custom_setup"):
         logger.info(f"Running custom setup() for {cls.__name__} with base_url: {base_url} and api_key: {api_key}")
+        start_time = time.time()
         cls.custom_setup(api_client=api_client)
+        record_timing(PHASE_CUSTOM_SETUP, time.time() - start_time, node_id=request.node.nodeid)
+        record_span(f"custom_setup {cls.__name__}", "custom_setup", start_time, time.time())
     yield
     if hasattr(cls, "custom_cleanup"):
         logger.info(f"Running custom cleanup() for {cls.__name__} with base_url: {base_url} and api_key: {api_key}")
+        start_time = time.time()
         cls.custom_cleanup(api_client=api_client)
+        record_timing(PHASE_CUSTOM_CLEANUP, time.time() - start_time, node_id=request.node.nodeid)
+        record_span(f"custom_cleanup {cls.__name__}", "custom_cleanup", start_time, time.time())
@@ -0,0 +1,116 @@
+import contextlib
+import hashlib
+import json
+import threading
+
+from waii_sdk_py.database import DBConnection, DBContentFilter, DBContentFilterScope, DBContentFilterType, \
+    DBContentFilterActionType
+
+from tests.container_state import find_container_name, locked, read_state, update_state
+
+"""
+- Connection definitions shared by the test modules, and the registry of the connections of a container.
+- register_connection() (utils.py) fingerprints the definition (everything sent to Waii, including content
+  filters) and keeps the fingerprints of the registered connections per container, in the container state
+  (container_state.py). So the registry is shared by the xdist workers of a run and reset when the container is
+  relaunched. Containers restored from a pg snapshot start with the fingerprints of the snapshot (pg_snapshot.py).
+- Registrations on a container are serialized by its own lock (<container>.connections.lock), not the state lock:
+  they last as long as the indexing, while the state is updated by every acquire/release of the container.
+- A connection that is already registered with the same fingerprint and indexed (status: completed) is only
+  activated; modify_connections and the indexing wait are skipped. Any change of the definition registers it again.
+- Without a container of this run (e.g existing docker at localhost:9859), the registry is kept in this process.
+"""
+
+POSTGRES_CONN_KEY = "postgresql://waii@localhost:5432/test"
+
+POSTGRES_CONNECTION = {
+    "key": POSTGRES_CONN_KEY,
+    "db_type": "postgresql",
+    "password": "password",
+    "description": None,
+    "username": "waii",
+    "database": "test",
+    "host": "localhost",
+    "port": "5432",
+    "sample_col_values": True,
+    "push": False,
+    "embedding_model": "text-embedding-ada-002",
+    "db_access_policy": {
+        "read_only": False,
+        "allow_access_beyond_db_content_filter": True,
+        "allow_access_beyond_search_context": True
+    }
+}
+
+ORACLE_CONN_KEY = "oracle://movie_db_user@localhost:1521/movie_db"
+
+ORACLE_CONNECTION = {
+    "key": ORACLE_CONN_KEY,
+    "db_type": "oracle",
+    "password": "password",
+    "description": None,
+    "username": "movie_db_user",
+    "database": "movie_db",
+    "host": "localhost",
+    "port": "1521",
+    "sample_col_values": True,
+    "push": False,
+    "embedding_model": "text-embedding-ada-002",
+    "db_access_policy": {
+        "read_only": False,
+        "allow_access_beyond_db_content_filter": True,
+        "allow_access_beyond_search_context": True
+    }
+}
+
+FINGERPRINTS_FIELD = "connection_fingerprints"
+
+# base_url -> {key: fingerprint}, for the clients that are not connected to a container of this run
+_local_fingerprints = {}
+_local_lock = threading.Lock()
+
+
+def get_tweakit_content_filters():
+    """Content filter of the tweakit tables used by the postgres tests."""
+    return [DBContentFilter(
+        filter_scope=DBContentFilterScope.table,
+        filter_type=DBContentFilterType.include,
+        filter_action_type=DBContentFilterActionType.visibility,
+        pattern='(DB_OWNER_STORAGE|USERS|PARAMETERS)'
+    )]
+
+
+def get_tweakit_connection():
+    """POSTGRES_CONNECTION restricted to the tweakit tables."""
+    db_conn = DBConnection(**POSTGRES_CONNECTION)
+    db_conn.db_content_filters = get_tweakit_content_filters()
+    return db_conn
+
+
+def get_connection_key(db_conn):
+    return db_conn["key"] if isinstance(db_conn, dict) else db_conn.key
+
+
+def get_fingerprint(db_conn):
+    """Digest of the definition of db_conn (dict or DBConnection), as it is sent to Waii."""
+    # Same digest for a dict and the equivalent DBConnection (which has all the fields, with their defaults)
+    db_conn = db_conn if isinstance(db_conn, DBConnection) else DBConnection(**db_conn)
+    return hashlib.sha256(json.dumps(db_conn, default=vars, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+@contextlib.contextmanager
+def registry(base_url):
+    """Yields the registered {key: fingerprint} of the container at base_url, saved on exit. Exclusive."""
+    container_name = find_container_name(base_url)
+    if container_name is None:
+        with _local_lock:
+            yield _local_fingerprints.setdefault(base_url, {})
+        return
+    with locked(container_name, "connections"):
+        registered = read_state(container_name).get(FINGERPRINTS_FIELD, {})
+        fingerprints = dict(registered)
+        try:
+            yield fingerprints
+        finally:
+            if fingerprints != registered:
+                update_state(container_name, **{FINGERPRINTS_FIELD: fingerprints})
@@ -0,0 +1,136 @@
+import threading
+import time
+import weakref
+from concurrent.futures import Future, wait
+
+from tests.log_util import init_logger
+from tests.polling import get_delays
+
+"""
+- Watches the indexing status of many connector aliases of an api client with one polling loop.
+- Each tick fetches get_connections().connector_status once for all the watched aliases, and resolves the future
+  of every alias that reached 'completed'. So N aliases cost one request per tick, instead of N.
+- Ticks back off exponentially (refer tests/polling.py). Watching a new alias triggers an immediate tick.
+- Use get_connector_watcher(api_client) to share the loop between all the waits on the same client.
+"""
+
+logger = init_logger()
+
+STATUS_COMPLETED = "completed"
+
+_watchers = weakref.WeakKeyDictionary()
+_watchers_lock = threading.Lock()
+
+
+class ConnectorStatusWatcher:
+    """
+    Future of watch(alias) resolves with the DBConnectionIndexingStatus of the alias once it is completed.
+    It fails with TimeoutError if it is not completed in time, LookupError if the alias has no connector status,
+    or with the error raised by get_connections.
+    """
+
+    def __init__(self, api_client, initial_delay=0.5, max_delay=10.0, multiplier=2.0, jitter=0.2):
+        # Weak, so that the shared watchers (keyed by client) do not keep the clients alive.
+        self._api_client = weakref.ref(api_client)
+        self.delay_options = (initial_delay, max_delay, multiplier, jitter)
+        self.ticks = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        # alias -> (future, deadline, started_at)
+        self._pending = {}
+        self._thread = None
+
+    def watch(self, alias_key, timeout):
+        """Returns the future of alias_key. Aliases already watched share the future (with the later deadline)."""
+        now = time.monotonic()
+        with self._lock:
+            if alias_key in self._pending:
+                future, deadline, started_at = self._pending[alias_key]
+                self._pending[alias_key] = (future, max(deadline, now + timeout), started_at)
+                return future
+            future = Future()
+            future.set_running_or_notify_cancel()
+            self._pending[alias_key] = (future, now + timeout, now)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="connector-watcher", daemon=True)
+                self._thread.start()
+            else:
+                self._wake.set()
+        return future
+
+    def wait_all(self, alias_keys, timeout):
+        """
+        Watch all the aliases and wait for all of them. Returns {alias: future}.
+        Futures are resolved by the loop at their deadline at the latest; the margin covers a slow last tick.
+        A future that is still not done after that means that get_connections itself is stuck.
+        """
+        futures = {alias_key: self.watch(alias_key, timeout) for alias_key in alias_keys}
+        wait(futures.values(), timeout=timeout + 60)
+        return futures
+
+    def _run(self):
+        delays = get_delays(*self.delay_options)
+        while True:
+            self.tick()
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                next_deadline = min(deadline for _, deadline, _ in self._pending.values())
+            if self._wake.wait(min(next(delays), max(0.0, next_deadline - time.monotonic()))):
+                # New alias: poll it right away, and back off from scratch.
+                self._wake.clear()
+                delays = get_delays(*self.delay_options)
+
+    def tick(self):
+        """Fetch the connector statuses once and resolve the futures of the aliases that are done."""
+        try:
+            api_client = self._api_client()
+            if api_client is None:
+                raise RuntimeError("api client of the connector watcher is gone")
+            connector_statuses = api_client.database.get_connections().connector_status or {}
+            error = None
+        except Exception as e:
+            connector_statuses, error = {}, e
+        now = time.monotonic()
+        self.ticks += 1
+
+        resolved = []
+        with self._lock:
+            for alias_key, (future, deadline, started_at) in list(self._pending.items()):
+                status = connector_statuses.get(alias_key)
+                if error is not None:
+                    outcome = error
+                elif status is None:
+                    outcome = LookupError(f"No connector status found for key: {alias_key}")
+                elif status.status == STATUS_COMPLETED:
+                    outcome = status
+                elif now >= deadline:
+                    outcome = TimeoutError(f"Connector {alias_key} not completed in time, status: {status.status}")
+                else:
+                    continue
+                del self._pending[alias_key]
+                resolved.append((alias_key, future, outcome, now - started_at))
+            pending = len(self._pending)
+            if pending:
+                logger.info("Waiting for connectors: " + ", ".join(
+                    f"{alias_key}: {getattr(connector_statuses.get(alias_key), 'status', None)}"
+                    for alias_key in self._pending))
+
+        # Resolve outside the lock; callbacks of the futures may watch other aliases.
+        for alias_key, future, outcome, elapsed in resolved:
+            logger.info(f"Connector {alias_key}: {getattr(outcome, 'status', outcome)} after {elapsed:.2f}s "
+                        f"(tick {self.ticks}, {pending} aliases still pending)")
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+
+def get_connector_watcher(api_client):
+    """Watcher shared by all the waits on api_client."""
+    with _watchers_lock:
+        watcher = _watchers.get(api_client)
+        if watcher is None:
+            watcher = _watchers[api_client] = ConnectorStatusWatcher(api_client)
+        return watcher
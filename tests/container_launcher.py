@@ -0,0 +1,262 @@
+import os
+import socket
+import threading
+import time
+
+from tests.connections import get_connection_key, get_fingerprint
+from tests.container_state import claim_launch, update_state, wait_for_status, STATUS_READY, STATUS_FAILED, \
+    STATUS_STOPPED
+from tests.docker_configs.docker_configs import DOCKER_CONFIGS, get_pg_dir, get_log_dir, get_base_url
+from tests.docker_utils import cleanup_existing_container, start_docker_container
+from tests.log_util import init_logger
+from tests.pg_snapshot import is_snapshot_enabled, restore_snapshot
+from tests.timeline import record_span
+from tests.timing_store import PHASE_CONTAINER_STARTUP, record_timing
+
+"""
+- Launching of the docker containers in DOCKER_CONFIGS. Used by:
+    - the session-wide pre-launch (pytest_collection_finish in conftest.py), which starts all the containers
+      needed by the collected tests concurrently, before the first test runs.
+    - the docker_environment fixture, which attaches to the (pre-launched) container or launches it itself.
+- Only one process of a test run launches a given container (refer container_state.py).
+- Configs with "replicas" are launched as <config>-r<i> containers; the replica of each test is assigned at
+  collection (refer scheduling.py).
+  Ports configured as "auto" are allocated at launch and published in the container state.
+"""
+
+logger = init_logger()
+
+# docker_name -> {key: connection definition} declared by the collected test classes (for pg snapshots)
+SNAPSHOT_CONNECTIONS = {}
+
+# docker_name -> number of collected test classes using it
+COLLECTED_CLASSES = {}
+
+# docker_name -> replicas assigned to the collected tests (refer scheduling.py)
+REQUIRED_REPLICAS = {}
+
+# Extra time on top of startup_timeout, to cover cleanup and snapshot restore of the launching process.
+LAUNCH_WAIT_MARGIN = 300
+
+
+def get_docker_name(item):
+    """Returns the docker config name of the test item from its docker_config marker (None if not marked)."""
+    marker = item.get_closest_marker("docker_config")
+    if marker is None or not marker.args:
+        return None
+    return marker.args[0]
+
+
+def collect_docker_configs(items):
+    """Returns the docker config names used by the given items, and records their snapshot connections."""
+    docker_names = []
+    classes = {}
+    for item in items:
+        docker_name = get_docker_name(item)
+        if docker_name is None or docker_name not in DOCKER_CONFIGS:
+            continue
+        if docker_name not in docker_names:
+            docker_names.append(docker_name)
+        owners = classes.setdefault(docker_name, set())
+        if (item.cls or item.module) in owners:
+            continue
+        owners.add(item.cls or item.module)
+        connections = item.get_closest_marker("docker_config").kwargs.get("connections", [])
+        declared = SNAPSHOT_CONNECTIONS.setdefault(docker_name, {})
+        for connection in connections:
+            key = get_connection_key(connection)
+            if key not in declared:
+                declared[key] = connection
+            elif get_fingerprint(declared[key]) != get_fingerprint(connection):
+                # First declaration (collection order) goes to the snapshot; the others register their own
+                logger.info(f"{item.nodeid.rsplit('::', 1)[0]} declares another definition of {key} for {docker_name}; "
+                            f"the snapshot uses the first one")
+    COLLECTED_CLASSES.update({docker_name: len(owners) for docker_name, owners in classes.items()})
+    return docker_names
+
+
+def require_replica(docker_name, replica):
+    REQUIRED_REPLICAS.setdefault(docker_name, set()).add(replica)
+
+
+def get_snapshot_connections(docker_name):
+    """{key: connection definition} captured in the pg snapshots of docker_name."""
+    return SNAPSHOT_CONNECTIONS.get(docker_name, {})
+
+
+def get_worker_count():
+    return max(1, int(os.environ.get("PYTEST_XDIST_WORKER_COUNT", "1")))
+
+
+def get_replica_count(config):
+    replicas = config.get("replicas", 1)
+    if replicas == "auto":
+        return get_worker_count()
+    return max(1, int(replicas))
+
+
+def get_pool_size(config):
+    """Replicas worth using: no more than the workers, as a worker uses one container at a time."""
+    return min(get_replica_count(config), get_worker_count())
+
+
+def get_replica_index(config):
+    """Replica used by this process. xdist workers are spread across the replicas (gw0 -> r0, gw1 -> r1...)."""
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+    return int(worker[2:] or 0) % get_pool_size(config)
+
+
+def get_container_name(docker_name, config, replica):
+    # Configs without replicas keep the config name as container name.
+    if "replicas" not in config:
+        return docker_name
+    return f"{docker_name}-r{replica}"
+
+
+def find_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+def allocate_port(configured_port, replica):
+    """"auto" picks a free host port. Fixed ports are offset by the replica index to avoid clashes."""
+    if configured_port == "auto":
+        return find_free_port()
+    return int(configured_port) + replica
+
+
+def get_run_command(config, container_name, api_port, ui_port=None):
+    # Replace container name in the placeholders. i.e {container_name}, {pg_dir_container_name}, {log_dir_container_name}
+    run_command = (config["run_command"].replace("{{pg_dir_container_name}}", get_pg_dir(container_name))
+                   .replace("{{log_dir_container_name}}", get_log_dir(container_name))
+                   .replace("{{port}}", str(api_port))
+                   .replace("{{container_name}}", container_name))
+    if ui_port is not None:
+        run_command = run_command.replace("{{ui_port}}", str(ui_port))
+    return run_command
+
+
+def launch_container(docker_name, config, replica=0):
+    """
+    Clean up any existing container, restore pg snapshot (if available) and start the container.
+    Returns the details of the launched container (container_name, ports and base_url).
+    """
+    container_name = get_container_name(docker_name, config, replica)
+    api_port = allocate_port(config.get("api_port", 9859), replica)
+    ui_port = allocate_port(config.get("ui_port", "auto"), replica) if "{{ui_port}}" in config["run_command"] else None
+    run_command = get_run_command(config, container_name, api_port, ui_port)
+    container = {
+        "docker_name": docker_name,
+        "container_name": container_name,
+        "replica": replica,
+        "api_port": api_port,
+        "ui_port": ui_port,
+        "base_url": get_base_url(config, api_port),
+    }
+    logger.info(f"launching docker name: {container_name}: command {run_command}")
+
+    # Ensure the container is not running by cleaning up any existing instance.
+    cleanup_existing_container(container_name)
+
+    snapshot_connections = get_snapshot_connections(docker_name)
+    if snapshot_connections and is_snapshot_enabled(config):
+        manifest = restore_snapshot(docker_name, config, container_name, snapshot_connections)
+        if manifest is not None:
+            # Connections indexed in the snapshot; refer connections.py
+            container["connection_fingerprints"] = manifest.get("connection_fingerprints", {})
+
+    logger.info(f"Starting Docker container with configuration: {container_name}")
+    proc = start_docker_container(run_command, config.get("ready_message"), config.get("startup_timeout", 120),
+                                  container_name, base_url=container["base_url"], api_key=config.get("api_key", ""))
+    # Process of the run command (e.g local stub server, docker client); terminated when the container is stopped.
+    container["process_pid"] = proc.pid if proc is not None else None
+    return container
+
+
+def get_replay_container(docker_name, config, replica=0):
+    """Details of a container that is not launched, as its API calls are replayed from the API cache."""
+    return {
+        "docker_name": docker_name,
+        "container_name": get_container_name(docker_name, config, replica),
+        "replica": replica,
+        "api_port": None,
+        "ui_port": None,
+        "base_url": get_base_url(config, "replay"),
+    }
+
+
+def launch_and_record(docker_name, config, replica=0):
+    """Launch the container (claimed via claim_launch) and publish the outcome to the other processes."""
+    container_name = get_container_name(docker_name, config, replica)
+    start_time = time.time()
+    try:
+        container = launch_container(docker_name, config, replica)
+    except Exception as e:
+        record_timing(PHASE_CONTAINER_STARTUP, time.time() - start_time, node_id=container_name,
+                      docker_name=docker_name, outcome="failed")
+        record_span(f"launch {container_name}", "container_launch", start_time, time.time(), outcome="failed")
+        update_state(container_name, status=STATUS_FAILED, error=str(e))
+        raise
+    startup_seconds = time.time() - start_time
+    record_timing(PHASE_CONTAINER_STARTUP, startup_seconds, node_id=container_name, docker_name=docker_name,
+                  outcome="ready")
+    record_span(f"launch {container_name}", "container_launch", start_time, time.time(), outcome="ready")
+    # Idle clock starts when a class is done with it (refer release_container), not while it waits for its first class
+    return update_state(container_name, status=STATUS_READY, startup_seconds=startup_seconds, idle_since=None,
+                        **container)
+
+
+def ensure_container(docker_name, config, replica=None):
+    """
+    Make sure that the container (replica) of docker_name for this process is running in this test run.
+    Blocks until it is ready and returns its state (container_name, ports, base_url).
+    Launches it, unless it was already launched (or is being launched) by pre-launch or another worker.
+    """
+    if replica is None:
+        replica = get_replica_index(config)
+    container_name = get_container_name(docker_name, config, replica)
+    timeout = config.get("startup_timeout", 120) + LAUNCH_WAIT_MARGIN
+    # Second attempt only if the process that was launching the container died midway (or it was stopped).
+    for _ in range(2):
+        if claim_launch(container_name):
+            return launch_and_record(docker_name, config, replica)
+        logger.info(f"Waiting for {container_name} launched by another process/thread")
+        state = wait_for_status(container_name, timeout)
+        if state.get("status") == STATUS_READY:
+            logger.info(f"Attached to running container: {container_name}")
+            return state
+        if state.get("status") != STATUS_STOPPED and "died" not in state.get("error", ""):
+            break
+    raise RuntimeError(f"Docker container {container_name} failed to start: {state.get('error')}")
+
+
+def get_prelaunch_replicas(docker_name, config):
+    """
+    Replicas worth pre-launching: the ones assigned to the collected tests. Without assignment, no more than
+    the workers or the test classes that can use them.
+    """
+    if REQUIRED_REPLICAS.get(docker_name):
+        return sorted(REQUIRED_REPLICAS[docker_name])
+    count = min(get_pool_size(config), max(1, COLLECTED_CLASSES.get(docker_name, 1)))
+    return list(range(count))
+
+
+def prelaunch_containers(docker_names):
+    """Launch the given containers concurrently in background threads. Returns immediately."""
+    def prelaunch(docker_name, config, replica):
+        try:
+            launch_and_record(docker_name, config, replica)
+        except Exception as e:
+            # Recorded in the state; docker_environment raises it for the tests using this container.
+            logger.error(f"Pre-launch of {docker_name} (replica: {replica}) failed: {e}")
+
+    for docker_name in docker_names:
+        config = DOCKER_CONFIGS[docker_name]
+        for replica in get_prelaunch_replicas(docker_name, config):
+            container_name = get_container_name(docker_name, config, replica)
+            if not claim_launch(container_name):
+                continue
+            logger.info(f"Pre-launching container: {container_name}")
+            threading.Thread(target=prelaunch, args=(docker_name, config, replica),
+                             name=f"prelaunch-{container_name}", daemon=True).start()
@@ -0,0 +1,111 @@
+import collections
+import logging
+import os
+import threading
+from logging.handlers import RotatingFileHandler
+
+from tests.docker_configs.docker_configs import get_log_dir
+from tests.log_util import init_logger
+
+"""
+- Output (stdout/stderr) of the run command of the containers (docker run, local stub server).
+- A ContainerLogPump drains the output of a container for its whole life, so that the pipe never fills up and
+  stalls a chatty (e.g --debug) container once it is ready.
+- Every line goes to a rotating file <log dir of the container>/container_output.log (refer get_log_dir) and to a
+  ring buffer of the last lines, used by the failure reports.
+- Lines are echoed to the console only with WAII_CONTAINER_LOG_ECHO=1.
+"""
+
+logger = init_logger()
+
+OUTPUT_FILE = "container_output.log"
+MAX_BYTES = 20 * 1024 * 1024
+BACKUP_COUNT = 3
+DEFAULT_RING_SIZE = 500
+
+_lock = threading.Lock()
+# container_name -> ContainerLogPump (the latest one, if the container was launched several times)
+_pumps = {}
+
+
+def is_echo_enabled():
+    return os.environ.get("WAII_CONTAINER_LOG_ECHO", "0").lower() in ("1", "true", "yes")
+
+
+class ContainerLogPump:
+    """Background thread draining the output stream of a container into a rotating file and a ring buffer."""
+
+    def __init__(self, container_name, stream, ring_size=DEFAULT_RING_SIZE, echo=None, listeners=()):
+        self.container_name = container_name
+        self.stream = stream
+        self.echo = is_echo_enabled() if echo is None else echo
+        self.path = os.path.join(get_log_dir(container_name), OUTPUT_FILE)
+        self.lines = collections.deque(maxlen=ring_size)
+        self.line_count = 0
+        self.closed = threading.Event()
+        # Refer add_listener; those given here see every line, from the first one
+        self._listeners = list(listeners)
+        self._lock = threading.Lock()
+        self._file = RotatingFileHandler(self.path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8")
+        self._file.setFormatter(logging.Formatter("%(message)s"))
+        self._thread = threading.Thread(target=self._run, name=f"logs-{container_name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def add_listener(self, listener):
+        """listener(line) is called for every line until it returns True (or the output is closed)."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _run(self):
+        try:
+            for line in iter(self.stream.readline, ''):
+                self._write(line)
+        except (OSError, ValueError) as e:
+            # Stream closed under us (e.g process killed)
+            logger.info(f"Output of container {self.container_name} closed: {e}")
+        finally:
+            self._file.close()
+            self.closed.set()
+
+    def _write(self, line):
+        self._file.handle(logging.makeLogRecord({"msg": line.rstrip("\n")}))
+        with self._lock:
+            self.lines.append(line.rstrip("\n"))
+            self.line_count += 1
+            listeners = list(self._listeners)
+        if self.echo:
+            print(line, end='', flush=True)
+        for listener in listeners:
+            if listener(line):
+                with self._lock:
+                    self._listeners.remove(listener)
+
+    def tail(self, n=None):
+        """Last n lines (all the lines of the ring buffer if None)."""
+        with self._lock:
+            lines = list(self.lines)
+        return lines if n is None else lines[-n:]
+
+    def join(self, timeout=None):
+        return self.closed.wait(timeout)
+
+
+def start_log_pump(container_name, stream, **kwargs):
+    pump = ContainerLogPump(container_name, stream, **kwargs).start()
+    with _lock:
+        _pumps[container_name] = pump
+    return pump
+
+
+def get_log_pump(container_name):
+    with _lock:
+        return _pumps.get(container_name)
+
+
+def get_recent_lines(container_name, n=None):
+    """Last lines of output of the container launched by this process ([] if it was launched elsewhere)."""
+    pump = get_log_pump(container_name)
+    return pump.tail(n) if pump is not None else []
@@ -0,0 +1,171 @@
+import contextlib
+import fcntl
+import glob
+import json
+import os
+import time
+import uuid
+
+from tests.docker_configs.docker_configs import STATE_DIR
+
+"""
+- Per container state shared by all the processes of a test run (xdist workers).
+- State is kept in STATE_DIR/<container_name>.json and guarded by an flock on STATE_DIR/<container_name>.lock
+- RUN_ID identifies the test run. All xdist workers of a run share PYTEST_XDIST_TESTRUNUID.
+"""
+
+RUN_ID = os.environ.get("PYTEST_XDIST_TESTRUNUID") or uuid.uuid4().hex
+
+STATUS_STARTING = "starting"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+STATUS_STOPPING = "stopping"
+STATUS_STOPPED = "stopped"
+
+
+def get_state_file(container_name):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, f"{container_name}.json")
+
+
+@contextlib.contextmanager
+def locked(container_name, purpose=None):
+    """
+    Exclusive (cross process) lock for the state of the given container. Locks for other purposes (e.g registering
+    connections, held for minutes) are separate, so that they do not hold up the state updates.
+    """
+    os.makedirs(STATE_DIR, exist_ok=True)
+    lock_name = f"{container_name}.{purpose}.lock" if purpose else f"{container_name}.lock"
+    with open(os.path.join(STATE_DIR, lock_name), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_state(container_name):
+    """Returns the state of the container for the current run, or {} if it is from another run (or missing)."""
+    try:
+        with open(get_state_file(container_name)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state if state.get("run_id") == RUN_ID else {}
+
+
+def read_run_states():
+    """Returns the states of all the containers of the current run."""
+    states = []
+    for state_file in sorted(glob.glob(os.path.join(STATE_DIR, "*.json"))):
+        state = read_state(os.path.basename(state_file)[:-len(".json")])
+        if state:
+            states.append(state)
+    return states
+
+
+def find_container_name(base_url):
+    """Returns the name of the container of this run that serves base_url, or None."""
+    for state in read_run_states():
+        if state.get("base_url") == base_url:
+            return state.get("container_name")
+    return None
+
+
+def write_state(container_name, state):
+    state = dict(state, run_id=RUN_ID, updated_at=time.time())
+    tmp_file = f"{get_state_file(container_name)}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_file, get_state_file(container_name))
+    return state
+
+
+def update_state(container_name, /, **fields):
+    with locked(container_name):
+        return write_state(container_name, dict(read_state(container_name), **fields))
+
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def claim_launch(container_name):
+    """
+    Returns True if the caller should launch the container in this run. Only one process in a run gets True,
+    unless the process that claimed it earlier died before the container was ready, or it was stopped since.
+    """
+    with locked(container_name):
+        state = read_state(container_name)
+        if state and state.get("status") != STATUS_STOPPED and \
+                not (state.get("status") == STATUS_STARTING and not is_process_alive(state.get("pid", 0))):
+            return False
+        # Classes that were done with the stopped container are still done with the relaunched one
+        write_state(container_name, {"status": STATUS_STARTING, "pid": os.getpid(),
+                                     "done_users": state.get("done_users", [])})
+        return True
+
+
+def wait_for_status(container_name, timeout, poll_interval=0.2):
+    """Wait until the container launched by another process is ready, failed or stopped. Returns the final state."""
+    deadline = time.time() + timeout
+    while True:
+        state = read_state(container_name)
+        if state.get("status") in (STATUS_READY, STATUS_FAILED, STATUS_STOPPED):
+            return state
+        if state.get("status") == STATUS_STARTING and not is_process_alive(state.get("pid", 0)):
+            return dict(state, status=STATUS_FAILED, error=f"launching process {state.get('pid')} died")
+        if time.time() > deadline:
+            return dict(state, status=STATUS_FAILED, error=f"not ready within {timeout}s")
+        time.sleep(poll_interval)
+
+
+def acquire_container(container_name, user):
+    """Register user (test class) of the ready container. Returns False if it is not ready (e.g being stopped)."""
+    with locked(container_name):
+        state = read_state(container_name)
+        if state.get("status") != STATUS_READY:
+            return False
+        users = sorted(set(state.get("users", [])) | {user})
+        write_state(container_name, dict(state, users=users, idle_since=None))
+        return True
+
+
+def release_container(container_name, user, expected_users):
+    """
+    Unregister user of the container. Returns True if the caller should stop it, i.e it is no longer used and all
+    the expected_users are done with it; the container is then marked as stopping.
+    """
+    with locked(container_name):
+        state = read_state(container_name)
+        if state.get("status") != STATUS_READY:
+            return False
+        users = sorted(set(state.get("users", [])) - {user})
+        done_users = sorted(set(state.get("done_users", [])) | {user})
+        stop = not users and set(expected_users) <= set(done_users)
+        write_state(container_name, dict(state, users=users, done_users=done_users,
+                                         idle_since=None if users else time.time(),
+                                         status=STATUS_STOPPING if stop else STATUS_READY))
+        return stop
+
+
+def claim_stop(container_name, idle_ttl=None, force=False):
+    """
+    Returns True (and marks the container as stopping) if the caller should stop the container: it is ready and
+    unused (unless force), and idle for more than idle_ttl seconds (if given). A container that no class has been
+    done with yet (e.g pre-launched) is never idle.
+    """
+    with locked(container_name):
+        state = read_state(container_name)
+        if state.get("status") != STATUS_READY or (state.get("users") and not force):
+            return False
+        if idle_ttl is not None and (state.get("idle_since") is None or time.time() - state["idle_since"] < idle_ttl):
+            return False
+        write_state(container_name, dict(state, status=STATUS_STOPPING))
+        return True
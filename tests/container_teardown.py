@@ -0,0 +1,128 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.container_launcher import ensure_container, get_container_name, get_docker_name
+from tests.container_state import acquire_container, claim_stop, read_run_states, release_container, update_state, \
+    STATUS_STOPPED
+from tests.docker_configs.docker_configs import DOCKER_CONFIGS
+from tests.docker_utils import remove_docker_container
+from tests.log_util import init_logger
+from tests.scheduling import get_assigned_replica, get_scope
+from tests.timeline import span
+
+"""
+- Teardown of the containers of a test run, shared by the xdist workers through the container state.
+- Every test class using a container registers itself while it runs (acquire/release). A container is stopped as
+  soon as the last of the classes collected for it is done, instead of being left running after the session.
+- Idle reaper: a container that nobody uses for $WAII_CONTAINER_IDLE_TTL seconds (default 600) after a class is
+  done with it is stopped even if more classes will use it later; they relaunch it. Set it to 0 to disable the
+  reaper. Containers waiting for their first class (e.g pre-launched) are not reaped.
+- At the end of the session, the containers still running are stopped in parallel.
+- --keep-containers disables all of the above (e.g to debug a container after the run).
+- Containers are force removed (docker rm -f); their data is not reused (refer cleanup_existing_container).
+"""
+
+logger = init_logger()
+
+DEFAULT_IDLE_TTL = 600
+
+# container_name -> test classes (scopes) collected for it in this process
+CONTAINER_USERS = {}
+
+_stop_threads = []
+_reaper = None
+
+
+def get_idle_ttl():
+    return float(os.environ.get("WAII_CONTAINER_IDLE_TTL", DEFAULT_IDLE_TTL))
+
+
+def collect_container_users(items):
+    """Record the test classes using each container; every xdist worker collects (and assigns) all the tests."""
+    for item in items:
+        docker_name = get_docker_name(item)
+        replica = get_assigned_replica(item)
+        if docker_name not in DOCKER_CONFIGS or replica is None:
+            continue
+        container_name = get_container_name(docker_name, DOCKER_CONFIGS[docker_name], replica)
+        CONTAINER_USERS.setdefault(container_name, set()).add(get_scope(item.nodeid))
+
+
+def attach_container(docker_name, config, replica, user):
+    """ensure_container() and register user of it; relaunches the container if it was stopped in the meantime."""
+    while True:
+        container = ensure_container(docker_name, config, replica=replica)
+        if acquire_container(container["container_name"], user):
+            return container
+        logger.info(f"Container {container['container_name']} is being stopped; launching it again for {user}")
+
+
+def stop_container(state):
+    """Remove the container (claimed via claim_stop/release_container) and mark it as stopped."""
+    container_name = state["container_name"]
+    logger.info(f"Stopping container {container_name}")
+    with span(f"stop {container_name}", "container_stop"):
+        remove_docker_container(container_name, process_pid=state.get("process_pid"))
+    update_state(container_name, status=STATUS_STOPPED, users=[], idle_since=None)
+
+
+def stop_in_background(state):
+    thread = threading.Thread(target=stop_container, args=(state,), name=f"stop-{state['container_name']}",
+                              daemon=True)
+    thread.start()
+    _stop_threads.append(thread)
+
+
+def detach_container(container, user):
+    """Unregister user of the container; stops it (in background) if all its collected classes are done."""
+    container_name = container["container_name"]
+    if release_container(container_name, user, CONTAINER_USERS.get(container_name, {user})):
+        logger.info(f"All test classes using {container_name} are done")
+        stop_in_background(container)
+
+
+def reap_idle_containers(idle_ttl):
+    """Stop the containers of this run that have been unused for more than idle_ttl seconds."""
+    for state in read_run_states():
+        if state.get("container_name") and claim_stop(state["container_name"], idle_ttl=idle_ttl):
+            logger.info(f"Container {state['container_name']} idle for more than {idle_ttl}s")
+            stop_in_background(state)
+
+
+def start_reaper():
+    """Start the idle reaper of this process (once), unless disabled."""
+    global _reaper
+    idle_ttl = get_idle_ttl()
+    if _reaper is not None or idle_ttl <= 0:
+        return
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(min(idle_ttl / 4, 30)):
+            try:
+                reap_idle_containers(idle_ttl)
+            except Exception as e:
+                logger.error(f"Idle container reaper failed: {e}")
+
+    _reaper = stopped
+    threading.Thread(target=run, name="container-reaper", daemon=True).start()
+
+
+def stop_all_containers():
+    """Stop all the containers of this run that are still running, in parallel. Waits for the pending stops."""
+    if _reaper is not None:
+        _reaper.set()
+    states = [state for state in read_run_states()
+              if state.get("container_name") and claim_stop(state["container_name"], force=True)]
+    if states:
+        logger.info(f"Stopping containers: {[state['container_name'] for state in states]}")
+        with ThreadPoolExecutor(max_workers=len(states), thread_name_prefix="stop") as executor:
+            list(executor.map(stop_container, states))
+    join_pending_stops()
+
+
+def join_pending_stops():
+    for thread in _stop_threads:
+        thread.join()
+    _stop_threads.clear()
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 # Compute absolute paths using the PROJ dir.
@@ -7,6 +8,10 @@ PROJ_DIR = os.path.abspath(os.path.join(CUR_DIR, '..', '..'))
 SANDBOX_DIR = os.path.join(PROJ_DIR, "waii-sandbox-test-integ")
 PG_DIR = os.path.join(SANDBOX_DIR, "pg")
 LOG_DIR = os.path.join(SANDBOX_DIR, "log")
+SNAPSHOT_DIR = os.path.join(SANDBOX_DIR, "snapshots")
+STATE_DIR = os.path.join(SANDBOX_DIR, "state")
+TIMING_DB = os.path.join(SANDBOX_DIR, "timings.sqlite")
+API_CACHE_DB = os.path.join(SANDBOX_DIR, "api_cache.sqlite")
 
 # Place all additional docker files in the same directory, where this file is located.
 SCRIPT_DIR = Path(__file__).parent.resolve()
@@ -16,6 +21,12 @@ SCRIPT_DIR = Path(__file__).parent.resolve()
 - This file contains the Docker configurations for different setups.
 - Provide the run_command, ready_message, startup_timeout
 - Ensure to provide the proper base_url and api_key
+- "api_port"/"ui_port": "auto" allocates free host ports when the container is launched ({{port}}, {{ui_port}})
+- "replicas": N (or "auto", i.e one per xdist worker) launches up to N containers named <config>-r<i>.
+  Test classes are spread across the replicas (refer tests/scheduling.py).
+- "waii_stub" runs tests/stub_server.py (canned answers, no docker) instead of the sandbox image.
+- Set "pg_snapshot": True (along with "image") to restore the postgres data dir from a golden snapshot
+  instead of indexing the connections from scratch. Refer README.md
 """
 
 
@@ -34,12 +45,33 @@ def get_log_dir(container_name):
     os.makedirs(this_dir, exist_ok=True)
     return this_dir
 
-def get_base_url(current_config):
-    api_port = str(current_config.get("api_port", 9859))
+def get_base_url(current_config, api_port=None):
+    """Base url of the config. Pass api_port for configs with dynamically allocated ports ("api_port": "auto")."""
+    api_port = str(api_port if api_port is not None else current_config.get("api_port", 9859))
     base_url = current_config.get("base_url")
     return base_url.replace("{{port}}", api_port)
 
 
+SANDBOX_RUN_COMMAND = (
+    "docker run --rm "
+    "--env OPENAI_API_KEY=$OPENAI_API_KEY "
+    "--env ENABLE_LOG_STREAMING_DOCKER=true "
+    "--env LOAD_SAMPLE_DB=false "
+    "-p {{ui_port}}:3456 "
+    "-p {{port}}:9859 "
+    "-v {{pg_dir_container_name}}:/var/lib/postgresql/data:rw "
+    "-v {{log_dir_container_name}}:/tmp/logs:rw "
+    "--name '{{container_name}}' "
+    "sandbox:latest --debug"
+)
+
+# Local stand-in of the Waii API (tests/stub_server.py); no docker needed. Exits along with the launching process.
+STUB_RUN_COMMAND = (
+    f"cd '{PROJ_DIR}' && exec '{sys.executable}' -m tests.stub_server "
+    "--port {{port}} --exit-with-parent"
+)
+
+
 DOCKER_CONFIGS = {
     "krishna_birla_local": {
         "run_command": "echo 'Local Waii is ready!'",
@@ -49,83 +81,38 @@ DOCKER_CONFIGS = {
         "startup_timeout": 0,
         "api_key": ""
     },
-    # ENSURE TO HAVE API_PORT DIFF FROM OTHER CONFIGS
+    # Ports are allocated when launched; scale via "replicas" instead of copying the config.
     "waii_default": {
-        "run_command": (
-            "docker run --rm "
-            "--env OPENAI_API_KEY=$OPENAI_API_KEY "
-            "--env ENABLE_LOG_STREAMING_DOCKER=true "
-            "--env LOAD_SAMPLE_DB=false "
-            "-p 3000:3456 "
-            "-p {{port}}:9859 "
-            "-v {{pg_dir_container_name}}:/var/lib/postgresql/data:rw "
-            "-v {{log_dir_container_name}}:/tmp/logs:rw "
-            "--name '{{container_name}}' "
-            "sandbox:latest --debug"
-        ),
+        "run_command": SANDBOX_RUN_COMMAND,
+        "image": "sandbox:latest",
         "ready_message": "Waii is ready! Please visit http://localhost:3000 to start using it!",
         "startup_timeout": 120,
-        "api_port": 9859,
+        "api_port": "auto",
+        "ui_port": "auto",
+        "replicas": 3,
         "base_url": "http://localhost:{{port}}/api/",
-        "api_key": ""
+        "api_key": "",
+        "pg_snapshot": True
     },
-    # ENSURE TO HAVE API_PORT DIFF FROM OTHER CONFIGS
-    "waii_default_ex_1": {
-        "run_command": (
-            "docker run --rm "
-            "--env OPENAI_API_KEY=$OPENAI_API_KEY "
-            "--env ENABLE_LOG_STREAMING_DOCKER=true "
-            "--env LOAD_SAMPLE_DB=false "
-            "-p 4000:3456 "
-            "-p {{port}}:9859 "
-            "-v {{pg_dir_container_name}}:/var/lib/postgresql/data:rw "
-            "-v {{log_dir_container_name}}:/tmp/logs:rw "
-            "--name '{{container_name}}' "
-            "sandbox:latest --debug"
-        ),
-        "ready_message": "Waii is ready! Please visit http://localhost:3000 to start using it!",
-        "startup_timeout": 120,
-        "api_port": 9860,
-        "base_url": "http://localhost:{{port}}/api/",
-        "api_key": ""
-    },
-    # ENSURE TO HAVE API_PORT DIFF FROM OTHER CONFIGS
-    "waii_default_ex_2": {
-        "run_command": (
-            "docker run --rm "
-            "--env OPENAI_API_KEY=$OPENAI_API_KEY "
-            "--env ENABLE_LOG_STREAMING_DOCKER=true "
-            "--env LOAD_SAMPLE_DB=false "
-            "-p 6000:3456 "
-            "-p {{port}}:9859 "
-            "-v {{pg_dir_container_name}}:/var/lib/postgresql/data:rw "
-            "-v {{log_dir_container_name}}:/tmp/logs:rw "
-            "--name '{{container_name}}' "
-            "sandbox:latest --debug"
-        ),
+    "waii_default_postgres": {
+        "run_command": SANDBOX_RUN_COMMAND,
+        "image": "sandbox:latest",
         "ready_message": "Waii is ready! Please visit http://localhost:3000 to start using it!",
         "startup_timeout": 120,
-        "api_port": 9861,
+        "api_port": "auto",
+        "ui_port": "auto",
+        "replicas": 2,
         "base_url": "http://localhost:{{port}}/api/",
-        "api_key": ""
+        "api_key": "",
+        "pg_snapshot": True
     },
-    # ENSURE TO HAVE API_PORT DIFF FROM OTHER CONFIGS
-    "waii_default_postgres": {
-        "run_command": (
-            "docker run --rm "
-            "--env OPENAI_API_KEY=$OPENAI_API_KEY "
-            "--env ENABLE_LOG_STREAMING_DOCKER=true "
-            "--env LOAD_SAMPLE_DB=false "
-            "-p 6001:3456 "
-            "-p {{port}}:9859 "
-            "-v {{pg_dir_container_name}}:/var/lib/postgresql/data:rw "
-            "-v {{log_dir_container_name}}:/tmp/logs:rw "
-            "--name '{{container_name}}' "
-            "sandbox:latest --debug"
-        ),
-        "ready_message": "Waii is ready! Please visit http://localhost:3000 to start using it!",
-        "startup_timeout": 120,
-        "api_port": 9862,
+    # Harness self-tests and benchmarks. Tune latency/failures with $WAII_STUB_* (refer tests/stub_server.py).
+    "waii_stub": {
+        "run_command": STUB_RUN_COMMAND,
+        "ready_message": "Waii stub server is ready",
+        "startup_timeout": 30,
+        "api_port": "auto",
+        "replicas": "auto",
         "base_url": "http://localhost:{{port}}/api/",
         "api_key": ""
     }
@@ -136,5 +123,6 @@ if __name__ == "__main__":
         tes = ((v['run_command'].replace("{{pg_dir_container_name}}", get_pg_dir(k))
                 .replace("{{log_dir_container_name}}", get_log_dir(k)))
                .replace("{{port}}", "5030")
+               .replace("{{ui_port}}", "5031")
                .replace("{{container_name}}", k))
         print(tes)
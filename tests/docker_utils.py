@@ -1,15 +1,130 @@
+import glob
+import http.client
+import json
 import os
+import queue
 import shutil
+import signal
 import subprocess
 import threading
 import time
+import urllib.request
+import uuid
 
+from tests.container_logs import start_log_pump
+from tests.docker_configs.docker_configs import PG_DIR, LOG_DIR
 from tests.log_util import init_logger
 
 logger = init_logger()
 
-def start_docker_container(run_command, ready_message, startup_timeout, container_name):
-    """Starts a Docker container using the provided run_command and waits until the ready_message is detected."""
+class ContainerReadiness:
+    """
+    Readiness signal of a starting container.
+      - Primary: probes the API (get-connections) with a fast backoff (50ms -> 1s) until it answers.
+      - Secondary (optional): the ready_message showing up in the container output.
+    Whichever comes first sets the `ready` event, so that the caller is woken up immediately.
+    Caller is also woken up when startup failed (e.g process exited), with the reason in `failure`.
+    """
+
+    def __init__(self, container_name, base_url=None, api_key="", ready_message=None,
+                 min_probe_delay=0.05, max_probe_delay=1.0, log_pump=None, max_report_lines=50):
+        self.container_name = container_name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.ready_message = ready_message
+        self.min_probe_delay = min_probe_delay
+        self.max_probe_delay = max_probe_delay
+        self.ready = threading.Event()
+        self.reason = None
+        self.failure = None
+        # Output of the container (refer container_logs.py), for failure reports
+        self.log_pump = log_pump
+        self.max_report_lines = max_report_lines
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._probe_thread = None
+
+    def set_ready(self, reason):
+        if not self.ready.is_set() and self.failure is None:
+            self.reason = reason
+            self.ready.set()
+            self._wake.set()
+
+    def set_failed(self, reason):
+        if not self.ready.is_set() and self.failure is None:
+            self.failure = reason
+            self._wake.set()
+
+    def on_log_line(self, line):
+        """Log pump listener; returns True (unsubscribes) once startup is over."""
+        if self.ready_message and self.ready_message in line:
+            self.set_ready("ready message")
+        return self._wake.is_set()
+
+    def start_probe(self):
+        if not self.base_url:
+            return
+        self._probe_thread = threading.Thread(target=self._probe_loop, daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        delay = self.min_probe_delay
+        while not self._wake.is_set() and not self._stopped.is_set():
+            if probe_api(self.base_url, self.api_key):
+                self.set_ready("api probe")
+                return
+            # Event.wait() instead of sleep, so that stop() is not delayed by the backoff
+            self._stopped.wait(delay)
+            delay = min(delay * 2, self.max_probe_delay)
+
+    def wait(self, timeout):
+        """Returns True once the container is ready or has failed; False on timeout."""
+        return self._wake.wait(timeout)
+
+    def failure_report(self):
+        recent_lines = self.log_pump.tail(self.max_report_lines) if self.log_pump is not None else []
+        lines = "\n".join(recent_lines) or "<no output>"
+        return f"Docker container {self.container_name} failed to start: {self.failure}. Last output:\n{lines}"
+
+    def stop(self):
+        self._stopped.set()
+
+
+def probe_api(base_url, api_key="", timeout=1.0):
+    """Returns True if the Waii API at base_url answers get-connections."""
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    request = urllib.request.Request(f"{base_url}update-db-connect-info",
+                                     data=json.dumps({"org_id": "", "user_id": ""}).encode("utf-8"),
+                                     headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status == 200
+    except (OSError, http.client.HTTPException):
+        # Connection refused/reset while booting, HTTP errors (URLError is an OSError) and timeouts.
+        return False
+
+
+def get_container_state(container_name):
+    """Returns the docker state of the container (e.g created, running, exited) or None if it does not exist."""
+    try:
+        result = subprocess.run(["docker", "inspect", "--format", "{{.State.Status}}", container_name],
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip()
+
+
+def start_docker_container(run_command, ready_message, startup_timeout, container_name, base_url=None, api_key=""):
+    """
+    Starts a Docker container using the provided run_command and waits until it is ready.
+    Container is ready when the API at base_url answers or the ready_message is detected (whichever comes first).
+    Fails fast (RuntimeError with the last lines of output) if the process exits or the container is not running.
+    The output is drained by a log pump (refer container_logs.py) until the process exits.
+    """
     if str(container_name).endswith("_local"):
         logger.info("start_docker_container: local process")
         return None
@@ -21,44 +136,116 @@ def start_docker_container(run_command, ready_message, startup_timeout, containe
         bufsize=1,     # line-buffered
         text=True      # enable text mode
     )
-    ready = False
+    readiness = ContainerReadiness(container_name, base_url=base_url, api_key=api_key, ready_message=ready_message)
     start_time = time.time()
+    # Listening from the first line: the ready message may come before anything else
+    log_pump = start_log_pump(container_name, proc.stdout, listeners=[readiness.on_log_line])
+    readiness.log_pump = log_pump
+    readiness.start_probe()
 
-    def read_output():
-        nonlocal ready
-        for line in iter(proc.stdout.readline, ''):
-            print(line, end='', flush=True)
-            if ready_message in line:
-                ready = True
+    last_progress_log = start_time
+    try:
+        while time.time() - start_time < startup_timeout:
+            remaining = startup_timeout - (time.time() - start_time)
+            if readiness.wait(min(remaining, 1)):
                 break
+            if log_pump.closed.is_set():
+                # Output closed before the container was ready; process has exited (or is about to)
+                readiness.set_failed(f"output closed (exit code: {proc.wait()})")
+                break
+            if proc.poll() is not None:
+                readiness.set_failed(f"process exited with code {proc.returncode}")
+                break
+            if get_container_state(container_name) in ("exited", "dead"):
+                readiness.set_failed("container exited")
+                break
+            if time.time() - last_progress_log >= 5:
+                last_progress_log = time.time()
+                logger.info(f"Waiting for Docker container to be ready... {time.time() - start_time:.2f}s elapsed")
+    finally:
+        readiness.stop()
 
-    reader_thread = threading.Thread(target=read_output, daemon=True)
-    reader_thread.start()
-
-    while time.time() - start_time < startup_timeout:
-        if ready:
-            logger.info(f"Ready message detected! for docker: {container_name}")
-            return proc
-        time.sleep(2)
-        logger.info(f"Waiting for Docker container to be ready... {time.time() - start_time:.2f}s elapsed")
+    if readiness.ready.is_set():
+        logger.info(f"Docker container {container_name} is ready ({readiness.reason}) "
+                    f"in {time.time() - start_time:.2f}s")
+        return proc
     proc.terminate()
+    if readiness.failure is not None:
+        logger.error(readiness.failure_report())
+        raise RuntimeError(readiness.failure_report())
     raise TimeoutError("Docker container did not become ready within the timeout period.")
 
 def cleanup_existing_container(container_name):
-    """Stop and remove any existing Docker container with the given name."""
+    """
+    Remove any existing Docker container with the given name, and move its pg/log dirs aside.
+    The dirs are deleted in background (refer discard_dir), so that the new container can start right away.
+    """
     if str(container_name).endswith("_local"):
         logger.info("cleanup_existing_container: local process")
         return
     logger.info(f"Cleaning up any existing Docker container '{container_name}'...")
-    subprocess.run(["docker", "stop", container_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    subprocess.run(["docker", "rm", "-f", container_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
+    try:
+        # rm -f kills a running container right away; no need for the grace period of docker stop.
+        subprocess.run(["docker", "rm", "-f", container_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        # No docker on this machine; fine for configs that run a local process (e.g waii_stub).
+        logger.info(f"Unable to run docker: {e}")
 
-    config_pg_dir = os.path.join(os.environ.get("HOME"), "waii-sandbox-test-integ", "pg", container_name)
-    config_log_dir = os.path.join(os.environ.get("HOME"), "waii-sandbox-test-integ", "log", container_name)
+    # Same dirs that are mounted in the container via get_pg_dir() / get_log_dir()
+    config_pg_dir = os.path.join(PG_DIR, container_name)
+    config_log_dir = os.path.join(LOG_DIR, container_name)
     logger.info(f"Cleaning up directories: pg:{config_pg_dir}, log: {config_log_dir}")
-    shutil.rmtree(config_pg_dir, ignore_errors=True)
-    shutil.rmtree(config_log_dir, ignore_errors=True)
+    discard_dir(config_pg_dir)
+    discard_dir(config_log_dir)
+
+
+TRASH_SUFFIX = ".trash-"
+
+_trash_queue = queue.Queue()
+_trash_lock = threading.Lock()
+_trash_thread = None
+
+
+def discard_dir(path):
+    """
+    Rename path aside (<path>.trash-<id>) and delete it in a background thread. path is free to be reused as
+    soon as this returns. Falls back to deleting it here if it can't be renamed.
+    """
+    # Started first, so that its pick up of leftovers does not include this dir
+    start_trash_thread()
+    trash_path = f"{path}{TRASH_SUFFIX}{uuid.uuid4().hex[:8]}"
+    try:
+        os.rename(path, trash_path)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        logger.info(f"Unable to move {path} aside ({e}); deleting it now")
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    _trash_queue.put(trash_path)
+
+
+def start_trash_thread():
+    """Start the background deletion (once per process). It also picks up the dirs left by earlier runs."""
+    global _trash_thread
+    with _trash_lock:
+        if _trash_thread is not None:
+            return
+        for trash_path in glob.glob(os.path.join(PG_DIR, f"*{TRASH_SUFFIX}*")) + \
+                glob.glob(os.path.join(LOG_DIR, f"*{TRASH_SUFFIX}*")):
+            _trash_queue.put(trash_path)
+        _trash_thread = threading.Thread(target=delete_trash, name="trash-deleter", daemon=True)
+        _trash_thread.start()
+
+
+def delete_trash():
+    while True:
+        trash_path = _trash_queue.get()
+        start_time = time.time()
+        # Another process (xdist worker) may be deleting the same leftovers of an earlier run
+        shutil.rmtree(trash_path, ignore_errors=True)
+        logger.info(f"Deleted {trash_path} in {time.time() - start_time:.2f}s")
+        _trash_queue.task_done()
 
 
 def stop_docker_container(container_name):
@@ -69,3 +256,23 @@ def stop_docker_container(container_name):
     subprocess.run(["docker", "stop", container_name], check=True)
     logger.info(f"Docker container '{container_name}' stopped.")
 
+
+
+def remove_docker_container(container_name, process_pid=None):
+    """
+    Force remove (no stop grace period) the Docker container with the specified name, and terminate process_pid
+    (the process of its run command, e.g a local server) if it is still running.
+    """
+    if str(container_name).endswith("_local"):
+        logger.info("remove_docker_container: local process")
+        return
+    try:
+        subprocess.run(["docker", "rm", "-f", container_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        logger.info(f"Unable to run docker: {e}")
+    if process_pid:
+        try:
+            os.kill(process_pid, signal.SIGTERM)
+        except OSError:
+            pass
+    logger.info(f"Docker container '{container_name}' removed.")
@@ -0,0 +1,110 @@
+import base64
+import mmap
+import os
+import time
+from pathlib import Path
+
+from waii_sdk_py.database import IngestDocumentRequest, GetIngestDocumentJobStatusRequest, IngestDocumentJobStatus
+
+from tests.async_client import AsyncWaiiClient, run_concurrently
+from tests.log_util import init_logger
+from tests.polling import poll
+
+"""
+- Ingestion of documents (knowledge import) into Waii.
+- encode_file() base64-encodes a file from an mmap, chunk by chunk, into one preallocated buffer; the file is never
+  read into memory as a whole, nor encoded into an intermediate copy.
+- ingest_documents() submits several documents concurrently and then waits for all their jobs with one shared
+  poller (one round of status calls per poll), instead of a polling loop per document. Ingest latency (submit to
+  completed/failed) of every document is logged and returned.
+"""
+
+logger = init_logger()
+
+# Multiple of 3, so that the encoded chunks concatenate without padding in between
+ENCODE_CHUNK_SIZE = 3 * 1024 * 1024
+
+FINAL_STATUSES = (IngestDocumentJobStatus.completed, IngestDocumentJobStatus.failed)
+
+
+def encode_file(file_path, chunk_size=ENCODE_CHUNK_SIZE):
+    """Base64 of the content of file_path, as str."""
+    assert chunk_size % 3 == 0, "chunk_size should be a multiple of 3"
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return ""
+    encoded = bytearray(4 * ((size + 2) // 3))
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offset = 0
+        for start in range(0, size, chunk_size):
+            chunk = base64.b64encode(mm[start:start + chunk_size])
+            encoded[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+    return encoded.decode("ascii")
+
+
+class IngestJob:
+    """A submitted document and the status of its ingest job."""
+
+    def __init__(self, file_path):
+        self.file_path = Path(file_path)
+        self.job_id = None
+        self.status = None
+        self.submitted_at = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in FINAL_STATUSES
+
+    @property
+    def latency(self):
+        """Seconds from submission to completed/failed; None while in progress."""
+        return None if self.finished_at is None else self.finished_at - self.submitted_at
+
+    def __repr__(self):
+        return f"IngestJob({self.file_path.name}, job_id={self.job_id}, status={self.status}, latency={self.latency})"
+
+
+def submit_document(api_client, job, is_binary=False):
+    if not job.file_path.is_file():
+        raise FileNotFoundError(f"File not found: {job.file_path}")
+    content = encode_file(job.file_path)
+    job.submitted_at = time.time()
+    response = api_client.database.ingest_document(IngestDocumentRequest(
+        content=content,
+        is_binary=is_binary,
+        filename=job.file_path.name
+    ))
+    job.job_id = response.ingest_document_job_id
+    logger.info(f"Submitted {job.file_path.name} ({len(content)} bytes encoded): job ID: {job.job_id}")
+    return job
+
+
+def ingest_documents(api_client, file_paths, is_binary=False, timeout=600, max_concurrency=None):
+    """
+    Ingest file_paths (the same file may be repeated) concurrently and wait up to timeout seconds for all the jobs.
+    Returns the IngestJob of every file, in order; the jobs that did not finish in time have done == False.
+    """
+    aclient = AsyncWaiiClient(api_client, max_concurrency=max_concurrency)
+    jobs = [IngestJob(file_path) for file_path in file_paths]
+    run_concurrently(aclient.call(submit_document, api_client, job, is_binary) for job in jobs)
+
+    def fetch_statuses():
+        pending = [job for job in jobs if not job.done]
+        responses = run_concurrently(aclient.database.get_ingest_document_job_status(
+            GetIngestDocumentJobStatusRequest(ingest_document_job_id=job.job_id)) for job in pending)
+        now = time.time()
+        for job, response in zip(pending, responses):
+            job.status = response.status
+            if job.done:
+                job.finished_at = now
+                logger.info(f"Ingest document job {job.job_id} ({job.file_path.name}): {job.status} "
+                            f"in {job.latency:.2f}s")
+        return jobs
+
+    result = poll(fetch_statuses, lambda _: all(job.done for job in jobs), timeout=timeout,
+                  name=f"ingest of {len(jobs)} documents", category="ingest", max_delay=5)
+    if result.timed_out:
+        logger.info(f"Ingest document jobs not done after {timeout}s: {[job for job in jobs if not job.done]}")
+    return jobs
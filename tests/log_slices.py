@@ -0,0 +1,114 @@
+import os
+
+from tests.container_launcher import get_container_name, get_docker_name, get_replica_index
+from tests.docker_configs.docker_configs import DOCKER_CONFIGS, LOG_DIR
+from tests.docker_utils import TRASH_SUFFIX
+from tests.log_util import init_logger
+from tests.scheduling import get_assigned_replica
+
+"""
+- Slices of the container logs (waii-sandbox-test-integ/log/<container>, mounted in the container) written while a
+  test ran, attached to the test in the pytest-html report.
+- At test start, the (inode, size) of every log file of the container is recorded. At test end, only the bytes
+  written since then are read (seek to the recorded offset), so big logs are never read as a whole.
+- Rotated files are followed by inode: the rest of the file that was rotated away is read from its new name, and
+  the new file from its start.
+- A slice is capped at max_bytes (its last bytes are kept).
+"""
+
+logger = init_logger()
+
+DEFAULT_MAX_BYTES = 256 * 1024
+
+# nodeid -> (container_name, offsets at the start of the test)
+_started = {}
+
+
+def get_item_container_name(item):
+    """Container used by the test item (docker_config marker and assigned replica), or None."""
+    docker_name = get_docker_name(item)
+    if docker_name not in DOCKER_CONFIGS:
+        return None
+    config = DOCKER_CONFIGS[docker_name]
+    replica = get_assigned_replica(item)
+    return get_container_name(docker_name, config, get_replica_index(config) if replica is None else replica)
+
+
+def list_log_files(container_name):
+    """{path: os.stat_result} of the log files of the container."""
+    files = {}
+    for root, dirs, names in os.walk(os.path.join(LOG_DIR, container_name)):
+        dirs[:] = [name for name in dirs if TRASH_SUFFIX not in name]
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                files[path] = os.stat(path)
+            except OSError:
+                continue
+    return files
+
+
+def get_offsets(container_name):
+    """{path: (inode, size)} of the log files of the container."""
+    return {path: (stat.st_ino, stat.st_size) for path, stat in list_log_files(container_name).items()}
+
+
+def read_range(path, start, end, max_bytes):
+    """Text of bytes [start, end) of path, keeping the last max_bytes. Returns (text, truncated)."""
+    truncated = end - start > max_bytes
+    if truncated:
+        start = end - max_bytes
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return data.decode("utf-8", errors="replace"), truncated
+
+
+def read_slices(container_name, start_offsets, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    [(path relative to the log dir of the container, text, truncated)] of what was written to the log files of the
+    container since start_offsets (refer get_offsets). Files without new bytes are skipped.
+    """
+    log_dir = os.path.join(LOG_DIR, container_name)
+    files = list_log_files(container_name)
+    start_by_inode = {inode: size for inode, size in start_offsets.values()}
+    slices = []
+    for path, stat in sorted(files.items()):
+        # Same inode: the file the test started with, possibly under another name after rotation
+        start = start_by_inode.get(stat.st_ino, 0)
+        if start > stat.st_size:
+            # Truncated in place
+            start = 0
+        if stat.st_size == start:
+            continue
+        try:
+            text, truncated = read_range(path, start, stat.st_size, max_bytes)
+        except OSError as e:
+            logger.info(f"Unable to read log slice of {path}: {e}")
+            continue
+        slices.append((os.path.relpath(path, log_dir), text, truncated))
+    return slices
+
+
+def start_slice(item):
+    container_name = get_item_container_name(item)
+    if container_name is not None:
+        _started[item.nodeid] = (container_name, get_offsets(container_name))
+
+
+def end_slice(item, max_bytes=DEFAULT_MAX_BYTES):
+    """(container_name, slices) of the test item since start_slice(item); (None, []) if it uses no container."""
+    container_name, start_offsets = _started.pop(item.nodeid, (None, None))
+    if container_name is None:
+        return None, []
+    return container_name, read_slices(container_name, start_offsets, max_bytes)
+
+
+def get_report_extras(pytest_html, container_name, slices):
+    """pytest-html extras (one text extra per log file) of the slices."""
+    extras = []
+    for rel_path, text, truncated in slices:
+        if truncated:
+            text = f"[... only the last bytes of the slice are shown]\n{text}"
+        extras.append(pytest_html.extras.text(text, name=f"{container_name}/{rel_path}"))
+    return extras
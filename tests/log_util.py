@@ -1,13 +1,73 @@
 # logging_config.py
+import atexit
+import glob
+import json
 import logging
+import os
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
+from tests.container_state import RUN_ID, is_process_alive
 from tests.docker_configs.docker_configs import get_logger_file
+from tests.run_context import WORKER_ID, get_current_container, get_current_item, strip_group
+
+"""
+- Logging of the harness. Log calls only put the record in an (unbounded) queue; a listener thread of the process
+  writes it to the console and to a JSON-lines file of this process: logs/test_run.<run>.<worker>.<pid>.jsonl.
+  So no file is written by more than one process, and no test thread waits for file or console I/O.
+- Every record carries the worker id, the node id of the current test and its container (refer run_context.py).
+- merge_logs() (end of session, controller) merges the files of all the processes of the run, in time order, into
+  logs/test_run.jsonl and appends them as text to logs/test_run.log (rotated). What is logged afterwards (stop
+  threads, unconfigure, workers shutting down) is merged at exit; files of processes still running then are kept
+  and merged by the next run.
+"""
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] [%(worker)s] %(message)s"
+
+_listener = None
+_listener_started = False
+_file_handler = None
+# worker file -> offset up to which its records were merged by this process
+_offsets = {}
+# log files merged by this process
+_merged = set()
+
+
+class ContextFilter(logging.Filter):
+    """Adds worker, nodeid and container of the current test to the records (on the thread logging them)."""
+
+    def filter(self, record):
+        item = get_current_item()
+        record.worker = WORKER_ID
+        record.nodeid = strip_group(item.nodeid) if item is not None else None
+        record.container = get_current_container()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        return json.dumps({
+            "ts": record.created,
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "worker": getattr(record, "worker", WORKER_ID),
+            "pid": record.process,
+            "thread": record.threadName,
+            "nodeid": getattr(record, "nodeid", None),
+            "container": getattr(record, "container", None),
+            "message": record.getMessage(),
+        })
+
+
+def get_worker_log_file(log_file):
+    base, _ = os.path.splitext(log_file)
+    return f"{base}.{RUN_ID[:12]}.{WORKER_ID}.{os.getpid()}.jsonl"
 
 
 def init_logger(log_file="logs/test_run.log", level=logging.INFO):
-    final_file = get_logger_file(log_file)
+    global _listener, _listener_started, _file_handler
     # Create or get the logger
     this_logger = logging.getLogger("waii_tests")
     this_logger.setLevel(level)
@@ -15,18 +75,120 @@ def init_logger(log_file="logs/test_run.log", level=logging.INFO):
 
     # If handlers already exist, don't add them again.
     if not this_logger.handlers:
-        formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
-
-        file_handler = RotatingFileHandler(final_file, maxBytes=5*1024*1024, backupCount=3)
+        file_handler = logging.FileHandler(get_logger_file(get_worker_log_file(log_file)), mode="w", encoding="utf-8")
         file_handler.setLevel(level)
-        file_handler.setFormatter(formatter)
-        this_logger.addHandler(file_handler)
+        file_handler.setFormatter(JsonFormatter())
 
         console_handler = logging.StreamHandler(sys.stdout)
         console_handler.setLevel(level)
-        console_handler.setFormatter(formatter)
-        this_logger.addHandler(console_handler)
+        console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        # Unbounded: a log call never blocks, nor drops the record
+        log_queue = queue.SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        queue_handler.addFilter(ContextFilter())
+        this_logger.addHandler(queue_handler)
+        _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        _listener_started = True
+        _file_handler = file_handler
+        atexit.register(close_logs)
 
     return this_logger
 
+
+def flush_logs():
+    """Wait until the records logged so far by this process are written."""
+    global _listener_started
+    if _listener_started:
+        # stop() drains the queue; logging goes on (queued) until the listener is started again
+        _listener.stop()
+        _listener.start()
+
+
+def close_logs():
+    """Write the pending records (at exit). The file of this process is removed if it is empty."""
+    global _listener_started
+    if not _listener_started:
+        return
+    _listener.stop()
+    _listener_started = False
+    _file_handler.close()
+    if os.path.getsize(_file_handler.baseFilename) == 0:
+        os.remove(_file_handler.baseFilename)
+
+
+def get_file_pid(worker_file):
+    """Pid of the process of a test_run.<run>.<worker>.<pid>.jsonl file."""
+    return int(worker_file.rsplit(".", 2)[-2])
+
+
+def is_writing(worker_file):
+    """Whether the process of the file may still log to it."""
+    pid = get_file_pid(worker_file)
+    if pid == os.getpid():
+        return _listener_started
+    return is_process_alive(pid)
+
+
+def read_records(worker_file, offset=0):
+    """(records, offset after them) of the complete lines of the file from offset."""
+    with open(worker_file, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    # A line being written is left for the next read
+    data = data[:data.rfind(b"\n") + 1]
+    records = [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+    return records, offset + len(data)
+
+
+def merge_logs(log_file="logs/test_run.log"):
+    """
+    Merge the records not merged yet of the JSON-lines files of this run into <log_file>.jsonl and the text
+    log_file; the first merge of the process rewrites <log_file>.jsonl, the next ones append to it.
+    A file is removed once its process has exited; the files of the processes still running (e.g xdist workers
+    shutting down, this process) are read up to their end and kept, and their next records are merged by the next
+    merge. The first merge registers one at exit, after the logs of this process are closed. Files left by the
+    processes of earlier runs that exited are merged too.
+    Returns the number of records merged.
+    """
+    flush_logs()
+    base, _ = os.path.splitext(get_logger_file(log_file))
+    worker_files = [path for path in glob.glob(f"{base}.*.*.*.jsonl")
+                    if f".{RUN_ID[:12]}." in os.path.basename(path) or not is_writing(path)]
+    records = []
+    for worker_file in worker_files:
+        # Exited before reading: nothing is written after what is read
+        done = not is_writing(worker_file)
+        worker_records, _offsets[worker_file] = read_records(worker_file, _offsets.get(worker_file, 0))
+        records.extend(worker_records)
+        if done:
+            os.remove(worker_file)
+            del _offsets[worker_file]
+    records.sort(key=lambda record: record["ts"])
+
+    with open(f"{base}.jsonl", "a" if log_file in _merged else "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    text_handler = RotatingFileHandler(get_logger_file(log_file), maxBytes=5*1024*1024, backupCount=3)
+    text_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    try:
+        for record in records:
+            log_record = logging.makeLogRecord(dict(record, msg=record["message"], levelname=record["level"],
+                                                    created=record["ts"], msecs=(record["ts"] % 1) * 1000))
+            text_handler.handle(log_record)
+    finally:
+        text_handler.close()
+    if log_file not in _merged:
+        _merged.add(log_file)
+        atexit.register(merge_logs_at_exit, log_file)
+    return len(records)
+
+
+def merge_logs_at_exit(log_file):
+    """Merge the records logged after the last merge (e.g by stop threads and at unconfigure)."""
+    close_logs()
+    merge_logs(log_file)
+
+
 logger = init_logger()
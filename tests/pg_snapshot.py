@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+
+from tests.connections import get_fingerprint
+from tests.container_state import read_state
+from tests.docker_configs.docker_configs import SNAPSHOT_DIR, get_pg_dir
+from tests.docker_utils import discard_dir
+from tests.log_util import init_logger
+
+"""
+- Golden snapshots of the postgres data dir of a container.
+- Once a container has started and all the connections of a test class have been indexed (status: completed),
+  its pg data dir is copied to SNAPSHOT_DIR/<docker_name>/<key>.
+- The key is derived from (image digest, docker config, connection definitions). Next run with the same key
+  restores the data dir before the container is started, so that the connections do not have to be indexed again.
+  A changed definition (e.g content filters) gets another key, so a stale snapshot is never restored.
+- The declared connections are registered and the snapshot is captured before any custom_setup runs, so that
+  state of the test classes (semantic contexts, documents...) is not part of it (refer conftest.py).
+- The manifest keeps the fingerprints of the connections (refer connections.py); they are registered for the
+  container on restore, so that the connections are not registered (and indexed) again.
+- Postgres rewrites its pages in place, so snapshots are never hardlinked. Copies use reflinks where the
+  filesystem supports it (e.g btrfs, xfs) and fall back to a regular copy otherwise.
+"""
+
+logger = init_logger()
+
+# Keys that only decide how the container is reached, not what ends up in its data dir.
+NON_DATA_KEYS = ("api_port", "ui_port", "replicas", "base_url", "api_key", "ready_message", "startup_timeout",
+                 "pg_snapshot")
+
+MANIFEST_FILE = "manifest.json"
+
+
+def is_snapshot_enabled(config):
+    if os.environ.get("WAII_PG_SNAPSHOT", "1").lower() in ("0", "false", "no", "off"):
+        return False
+    return bool(config.get("pg_snapshot")) and bool(config.get("image"))
+
+
+def get_image_digest(config):
+    """Returns the id of the docker image used by the config or None, if it can't be resolved."""
+    image = config.get("image")
+    if not image:
+        return None
+    try:
+        result = subprocess.run(["docker", "image", "inspect", "--format", "{{.Id}}", image],
+                                capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.info(f"Unable to inspect docker image {image}: {e}")
+        return None
+    if result.returncode != 0:
+        logger.info(f"Unable to inspect docker image {image}: {result.stderr.strip()}")
+        return None
+    return result.stdout.strip()
+
+
+def get_snapshot_key(config, image_digest, connections):
+    """connections: {key: connection definition}"""
+    data_config = {k: v for k, v in config.items() if k not in NON_DATA_KEYS}
+    payload = json.dumps({
+        "image_digest": image_digest,
+        "config": data_config,
+        "connections": {key: get_fingerprint(connection) for key, connection in connections.items()},
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def get_snapshot_dir(docker_name, config, connections):
+    """Returns the snapshot dir for the given config and connections or None, if the image can't be resolved."""
+    image_digest = get_image_digest(config)
+    if image_digest is None:
+        return None
+    return os.path.join(SNAPSHOT_DIR, docker_name, get_snapshot_key(config, image_digest, connections))
+
+
+def copy_tree(src, dst):
+    """Copy src dir contents into dst using reflinks when available."""
+    os.makedirs(dst, exist_ok=True)
+    result = subprocess.run(["cp", "-a", "--reflink=auto", f"{src}{os.sep}.", dst],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode == 0:
+        return
+    # cp without reflink support (e.g BSD cp on mac). Fallback to python copy.
+    logger.info(f"cp --reflink failed ({result.stderr.strip()}); falling back to regular copy")
+    shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True)
+
+
+def restore_snapshot(docker_name, config, container_name, connections):
+    """
+    Restore the pg data dir of container_name from a golden snapshot (if available).
+    Has to be called after the existing container is cleaned up and before it is started.
+    Returns the manifest of the restored snapshot, or None if it was not restored.
+    """
+    snapshot_dir = get_snapshot_dir(docker_name, config, connections)
+    if snapshot_dir is None or not os.path.isdir(snapshot_dir):
+        logger.info(f"No pg snapshot available for {docker_name} with connections {sorted(connections)}")
+        return None
+
+    start_time = time.time()
+    pg_dir = get_pg_dir(container_name)
+    try:
+        copy_tree(os.path.join(snapshot_dir, "pg"), pg_dir)
+    except (OSError, shutil.Error) as e:
+        # Partially restored dir is worse than an empty one; let postgres initialize it again.
+        logger.error(f"Failed to restore pg snapshot {snapshot_dir} for {container_name}: {e}")
+        discard_dir(pg_dir)
+        get_pg_dir(container_name)
+        return None
+    logger.info(f"Restored pg snapshot {snapshot_dir} for {container_name} in {time.time() - start_time:.2f}s")
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def capture_snapshot(docker_name, config, container_name, connections):
+    """
+    Capture the pg data dir of the running container_name as golden snapshot (if not already present).
+    Container is paused while copying, so that postgres does not write to the files being copied.
+    Returns True if a new snapshot was captured.
+    """
+    snapshot_dir = get_snapshot_dir(docker_name, config, connections)
+    if snapshot_dir is None or os.path.isdir(snapshot_dir):
+        return False
+
+    start_time = time.time()
+    tmp_dir = f"{snapshot_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    paused = subprocess.run(["docker", "pause", container_name],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+    if not paused:
+        logger.info(f"Unable to pause {container_name}; skipping pg snapshot")
+        return False
+    try:
+        copy_tree(get_pg_dir(container_name), os.path.join(tmp_dir, "pg"))
+    except (OSError, shutil.Error) as e:
+        logger.error(f"Failed to capture pg snapshot for {container_name}: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+    finally:
+        subprocess.run(["docker", "unpause", container_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+        json.dump({
+            "docker_name": docker_name,
+            "image": config.get("image"),
+            "image_digest": get_image_digest(config),
+            "connections": sorted(connections),
+            "connection_fingerprints": {key: fingerprint for key, fingerprint
+                                        in read_state(container_name).get("connection_fingerprints", {}).items()
+                                        if key in connections},
+            "created_at": time.time(),
+        }, f, indent=2)
+
+    try:
+        # Atomic publish; another worker could have captured the same snapshot in the meantime.
+        os.rename(tmp_dir, snapshot_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+    logger.info(f"Captured pg snapshot {snapshot_dir} for {container_name} in {time.time() - start_time:.2f}s")
+    return True
@@ -0,0 +1,84 @@
+import random
+import time
+
+from tests.api_metrics import record_wait
+from tests.log_util import init_logger
+
+"""
+- Polling of long running server side work (connector indexing, document ingestion...) until it is done.
+- First poll is immediate. The delay between polls then grows exponentially (with jitter) from initial_delay up
+  to max_delay, so that short jobs are noticed quickly and long ones are not hammered.
+- Overall deadline: the last sleep is cut short, so that the final poll happens right at the deadline.
+- Latency of each poll is recorded in the returned PollResult (and logged as summary). Time spent between the polls
+  is recorded for the current test as well (refer api_metrics.py).
+"""
+
+logger = init_logger()
+
+
+class PollResult:
+    """Outcome of poll(): last fetched value, whether it is done and the per-poll metrics."""
+
+    def __init__(self, name):
+        self.name = name
+        self.value = None
+        self.done = False
+        self.latencies = []
+        self.elapsed = 0.0
+
+    @property
+    def polls(self):
+        return len(self.latencies)
+
+    @property
+    def idle_seconds(self):
+        """Time spent sleeping between the polls."""
+        return max(0.0, self.elapsed - sum(self.latencies))
+
+    @property
+    def timed_out(self):
+        return not self.done
+
+    def summary(self):
+        latencies = sorted(self.latencies) or [0.0]
+        return (f"{self.name}: {'done' if self.done else 'timed out'} after {self.elapsed:.2f}s, {self.polls} polls, "
+                f"poll latency p50: {latencies[len(latencies) // 2]:.3f}s max: {latencies[-1]:.3f}s, "
+                f"idle: {self.idle_seconds:.2f}s")
+
+
+def get_delays(initial_delay, max_delay, multiplier, jitter, rng=random):
+    """Infinite sequence of delays: initial_delay * multiplier^n capped at max_delay, with +/- jitter (ratio)."""
+    delay = initial_delay
+    while True:
+        yield max(0.0, delay * rng.uniform(1 - jitter, 1 + jitter))
+        delay = min(max_delay, delay * multiplier)
+
+
+def poll(fetch, is_done, timeout, name="poll", category="poll", initial_delay=0.5, max_delay=10.0, multiplier=2.0,
+         jitter=0.2, on_poll=None, sleep=time.sleep, clock=time.monotonic):
+    """
+    Call fetch() until is_done(value) or the timeout (seconds) expires. Returns PollResult.
+    on_poll(value, result) is called after every poll that is not done (e.g for progress logs).
+    name (e.g with the job id) is for the logs; the time spent between the polls is recorded under category
+    (e.g "ingest"), which should be the same for all the polls of a kind.
+    Exceptions raised by fetch/is_done are propagated.
+    """
+    result = PollResult(name)
+    start_time = clock()
+    deadline = start_time + timeout
+    delays = get_delays(initial_delay, max_delay, multiplier, jitter)
+    while True:
+        poll_start = clock()
+        result.value = fetch()
+        result.latencies.append(clock() - poll_start)
+        result.done = bool(is_done(result.value))
+        remaining = deadline - clock()
+        if result.done or remaining <= 0:
+            break
+        if on_poll is not None:
+            on_poll(result.value, result)
+        sleep(min(next(delays), remaining))
+    result.elapsed = clock() - start_time
+    record_wait(category, result.idle_seconds)
+    logger.info(result.summary())
+    return result
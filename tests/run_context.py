@@ -0,0 +1,42 @@
+import os
+
+"""
+- Context of the test being executed in this process (xdist worker).
+- Current item (and its container) is set by pytest_runtest_setup in conftest.py, before any of its fixtures are
+  set up.
+"""
+
+WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "master")
+
+_current_item = None
+_current_container = None
+
+
+def set_current_item(item, container_name=None):
+    global _current_item, _current_container
+    _current_item = item
+    _current_container = container_name
+
+
+def get_current_item():
+    return _current_item
+
+
+def get_current_container():
+    """Container (name) used by the current test, or None."""
+    return _current_container
+
+
+def get_current_docker_name():
+    """Docker config (docker_config marker) of the current test, or None."""
+    if _current_item is None:
+        return None
+    marker = _current_item.get_closest_marker("docker_config")
+    return marker.args[0] if marker and marker.args else None
+
+
+def strip_group(nodeid):
+    """xdist appends @<group> to the nodeid of the tests in an xdist_group."""
+    if nodeid.rfind("@") > nodeid.rfind("]"):
+        return nodeid.rsplit("@", 1)[0]
+    return nodeid
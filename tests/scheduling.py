@@ -0,0 +1,193 @@
+import statistics
+
+import pytest
+from xdist.scheduler import LoadGroupScheduling, LoadScopeScheduling
+
+from tests.container_launcher import get_container_name, get_docker_name, get_pool_size, require_replica
+from tests.container_state import read_run_states
+from tests.docker_configs.docker_configs import DOCKER_CONFIGS
+from tests.log_util import init_logger
+from tests.run_context import strip_group
+
+"""
+- Distribution of the collected tests across xdist workers (--dist=loadgroup, set in pytest.ini).
+- Every test using a docker config is assigned a container (replica of the config) at collection time and is put
+  in the xdist group of that container. All the classes using a container run on the same worker, one after the
+  other, so they never fight over the same container name.
+- Classes of a config with replicas are spread across its replicas longest-first (least loaded replica first).
+- Classes marked with @pytest.mark.docker_config(<name>, shard=True) are split into one shard per replica
+  of the docker config. Shards run on different workers, each against its own replica (and with its own
+  custom_setup). shard=N limits the number of shards (up to the number of replicas).
+- Tests without a docker config are grouped by their class (or module), same as --dist=loadscope.
+- Groups are handed out to the workers longest-first (LPT), based on the durations recorded by previous runs
+  (pytest cache: waii/durations) plus the startup time of the container (waii/startup_seconds).
+"""
+
+logger = init_logger()
+
+REPLICA_KEY = pytest.StashKey[int]()
+
+DURATIONS_CACHE_KEY = "waii/durations"
+STARTUP_CACHE_KEY = "waii/startup_seconds"
+
+# Estimates for tests and containers that have not been recorded yet.
+DEFAULT_TEST_SECONDS = 10.0
+DEFAULT_STARTUP_SECONDS = 60.0
+
+# nodeid (without xdist group) -> seconds (setup + call + teardown) recorded in this run
+_recorded_durations = {}
+
+
+def get_scope(nodeid):
+    return strip_group(nodeid).rsplit("::", 1)[0]
+
+
+class DurationEstimates:
+    """Estimated durations of tests and container startups, from the durations recorded by previous runs."""
+
+    def __init__(self, config):
+        # config.cache is missing with -p no:cacheprovider
+        cache = getattr(config, "cache", None)
+        self.durations = cache.get(DURATIONS_CACHE_KEY, {}) if cache else {}
+        self.startup_seconds = cache.get(STARTUP_CACHE_KEY, {}) if cache else {}
+        self.default_test_seconds = (statistics.median(self.durations.values()) if self.durations
+                                     else DEFAULT_TEST_SECONDS)
+
+    def test_seconds(self, nodeid):
+        return self.durations.get(strip_group(nodeid), self.default_test_seconds)
+
+    def container_seconds(self, docker_name):
+        return self.startup_seconds.get(docker_name, DEFAULT_STARTUP_SECONDS)
+
+    def group_seconds(self, group, nodeids):
+        """Estimated time for a worker to run the group: its tests plus the startup of its container."""
+        seconds = sum(self.test_seconds(nodeid) for nodeid in nodeids)
+        docker_name = get_group_docker_name(group)
+        if docker_name is not None:
+            seconds += self.container_seconds(docker_name)
+        return seconds
+
+
+def get_group_docker_name(group):
+    """Docker config of the xdist group of a container (refer assign_containers), or None."""
+    if group in DOCKER_CONFIGS:
+        return group
+    docker_name, _, replica = group.rpartition("-r")
+    if docker_name in DOCKER_CONFIGS and replica.isdigit():
+        return docker_name
+    return None
+
+
+class DockerGroupScheduling(LoadGroupScheduling):
+    """
+    Like loadgroup, but:
+      - tests without an xdist_group are grouped by class/module (like loadscope).
+      - groups are handed out longest-first, instead of in collection order.
+    """
+
+    def __init__(self, config, log=None):
+        super().__init__(config, log)
+        self.estimates = DurationEstimates(config)
+        self.ordered = False
+
+    def _split_scope(self, nodeid):
+        if nodeid.rfind("@") > nodeid.rfind("]"):
+            return nodeid.split("@")[-1]
+        return LoadScopeScheduling._split_scope(self, nodeid)
+
+    def _assign_work_unit(self, node):
+        # Work queue is built (in collection order) by schedule() right before the first unit is assigned.
+        if not self.ordered:
+            self.order_work_queue()
+            self.ordered = True
+        super()._assign_work_unit(node)
+
+    def order_work_queue(self):
+        costs = {scope: self.estimates.group_seconds(scope, nodeids) for scope, nodeids in self.workqueue.items()}
+        for scope in sorted(costs, key=costs.get, reverse=True):
+            self.workqueue.move_to_end(scope)
+        logger.info("Scheduling groups longest-first: "
+                    + ", ".join(f"{scope} ({costs[scope]:.0f}s)" for scope in self.workqueue))
+
+
+def get_shard_count(item, config):
+    shard = item.get_closest_marker("docker_config").kwargs.get("shard", False)
+    if not shard:
+        return 1
+    replicas = get_pool_size(config)
+    return replicas if shard is True else max(1, min(int(shard), replicas))
+
+
+def assign_containers(items, estimates):
+    """
+    Assign a replica (container) of its docker config to every test item with a docker config and put it in the
+    xdist group of that container. Sharded classes are split round-robin across the replicas; other classes go
+    longest-first to the least loaded replica. Only the first min(replicas, workers) replicas are used (a serial run
+    uses one container per config).
+    Has to be deterministic: every xdist worker collects (and assigns) the tests on its own.
+    """
+    classes = {}
+    for item in items:
+        docker_name = get_docker_name(item)
+        if docker_name not in DOCKER_CONFIGS:
+            continue
+        classes.setdefault((docker_name, get_scope(item.nodeid)), []).append(item)
+
+    loads = {}
+    unsharded = []
+    for (docker_name, scope), class_items in classes.items():
+        config = DOCKER_CONFIGS[docker_name]
+        replica_loads = loads.setdefault(docker_name, [0.0] * get_pool_size(config))
+        shards = get_shard_count(class_items[0], config)
+        if shards <= 1:
+            unsharded.append((docker_name, scope))
+            continue
+        for position, item in enumerate(class_items):
+            shard = position % shards
+            replica_loads[shard] += estimates.test_seconds(item.nodeid)
+            assign_replica(item, docker_name, config, shard)
+
+    def class_seconds(key):
+        return sum(estimates.test_seconds(item.nodeid) for item in classes[key])
+
+    for key in sorted(unsharded, key=lambda key: (-class_seconds(key), key)):
+        docker_name, _ = key
+        replica_loads = loads[docker_name]
+        replica = replica_loads.index(min(replica_loads))
+        replica_loads[replica] += class_seconds(key)
+        for item in classes[key]:
+            assign_replica(item, docker_name, DOCKER_CONFIGS[docker_name], replica)
+
+
+def assign_replica(item, docker_name, config, replica):
+    item.stash[REPLICA_KEY] = replica
+    require_replica(docker_name, replica)
+    item.add_marker(pytest.mark.xdist_group(get_container_name(docker_name, config, replica)))
+
+
+def get_assigned_replica(item):
+    """Replica assigned to the item at collection, or None."""
+    if item is None:
+        return None
+    return item.stash.get(REPLICA_KEY, None)
+
+
+def record_duration(report):
+    _recorded_durations[strip_group(report.nodeid)] = (_recorded_durations.get(strip_group(report.nodeid), 0.0)
+                                                       + report.duration)
+
+
+def save_durations(config):
+    """Merge the durations recorded in this run (and container startup times) into the pytest cache."""
+    if getattr(config, "cache", None) is None:
+        return
+    if _recorded_durations:
+        durations = config.cache.get(DURATIONS_CACHE_KEY, {})
+        durations.update({nodeid: round(seconds, 3) for nodeid, seconds in _recorded_durations.items()})
+        config.cache.set(DURATIONS_CACHE_KEY, durations)
+
+    startup_seconds = config.cache.get(STARTUP_CACHE_KEY, {})
+    for state in read_run_states():
+        if state.get("docker_name") and state.get("startup_seconds") is not None:
+            startup_seconds[state["docker_name"]] = round(state["startup_seconds"], 3)
+    config.cache.set(STARTUP_CACHE_KEY, startup_seconds)
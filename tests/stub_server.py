@@ -0,0 +1,310 @@
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+- Stand-in for the Waii API of the sandbox image, for self-tests and benchmarks of the harness (polling, scheduling,
+  fixtures) without docker, OPENAI_API_KEY or network. Answers are canned; nothing is generated.
+- Implements the endpoints used by this repo: connections (update-db-connect-info), get-table-definitions,
+  generate-query, run-query, like-query, get-history, get/update-semantic-context, ingest-document,
+  get-ingest-document-job-status and chat-message. Any other endpoint answers 404.
+- Stub only endpoint stub-registrations: {connection key: times added/updated}, for the tests of the harness.
+- Connections are 'indexing' for --indexing-seconds after they are added, ingest jobs 'in_progress' for
+  --ingest-seconds. Latency (--latency, --latency-jitter) and failures (--failure-rate, HTTP 500) can be injected.
+- Selected via the "waii_stub" entry of DOCKER_CONFIGS, or started in process with start_server().
+- Options default to $WAII_STUB_<OPTION> (e.g WAII_STUB_LATENCY=0.05), so that they can be set for the launched
+  server from the environment of pytest.
+"""
+
+READY_MESSAGE = "Waii stub server is ready"
+
+DEFAULT_OPTIONS = {
+    "latency": 0.0,
+    "latency_jitter": 0.0,
+    "failure_rate": 0.0,
+    "indexing_seconds": 1.0,
+    "ingest_seconds": 1.0,
+    "seed": None,
+}
+
+# Catalog served for every connection: {table: {column: type}}
+SAMPLE_TABLES = {
+    "movies": {"title": "text", "genre": "text", "year": "integer"},
+    "users": {"name": "text", "email": "text", "id": "integer"},
+}
+
+
+def get_default_options():
+    options = dict(DEFAULT_OPTIONS)
+    for name, default in DEFAULT_OPTIONS.items():
+        value = os.environ.get(f"WAII_STUB_{name.upper()}")
+        if value not in (None, ""):
+            options[name] = int(value) if name == "seed" else float(value)
+    return options
+
+
+def matches(pattern, name):
+    """Name filter of a SearchContext: '*', the name itself or a regex (case insensitive)."""
+    pattern = pattern or "*"
+    return pattern == "*" or pattern.lower() == name.lower() or re.fullmatch(pattern, name, re.IGNORECASE) is not None
+
+
+def get_connection_key(connection):
+    if connection.get("key"):
+        return connection["key"]
+    return (f"{connection.get('db_type')}://{connection.get('username')}@{connection.get('host')}:"
+            f"{connection.get('port')}/{connection.get('database')}")
+
+
+class StubState:
+    """In-memory state of the stub server. All the handlers run under one lock."""
+
+    def __init__(self, options):
+        self.options = options
+        self.lock = threading.Lock()
+        self.random = random.Random(options.get("seed"))
+        # key -> (connection, added_at)
+        self.connections = {}
+        # key -> number of times the connection was added/updated (stub-registrations endpoint)
+        self.registrations = {}
+        self.semantic_context = {}
+        self.history = []
+        self.ingest_jobs = {}
+        self.requests = {}
+
+    def connection_status(self, added_at):
+        indexed = time.time() - added_at >= self.options["indexing_seconds"]
+        return {"status": "completed" if indexed else "indexing"}
+
+    def connections_response(self):
+        return {
+            "connectors": [connection for connection, _ in self.connections.values()],
+            "connector_status": {key: self.connection_status(added_at)
+                                 for key, (_, added_at) in self.connections.items()},
+        }
+
+    def update_db_connect_info(self, body):
+        for connection in body.get("updated") or []:
+            key = get_connection_key(connection)
+            self.connections[key] = (dict(connection, key=key), time.time())
+            self.registrations[key] = self.registrations.get(key, 0) + 1
+        for key in body.get("removed") or []:
+            self.connections.pop(key, None)
+        return self.connections_response()
+
+    def stub_registrations(self, body):
+        """Stub only: how many times each connection was registered, for the tests of the harness."""
+        return dict(self.registrations)
+
+    def get_table_definitions(self, body):
+        database = body.get("scope", "").rsplit("/", 1)[-1] or "test"
+        search_context = body.get("search_context") or [{}]
+        schemas = []
+        for context in search_context:
+            if not matches(context.get("db_name"), database) or not matches(context.get("schema_name"), "public"):
+                continue
+            tables = [{
+                "name": {"table_name": table, "schema_name": "public", "database_name": database},
+                "columns": [{"name": column, "type": column_type,
+                             "sample_values": {"values": {f"{column}_{i}": 1 for i in range(3)}}
+                             if column_type == "text" else None}
+                            for column, column_type in columns.items()],
+            } for table, columns in SAMPLE_TABLES.items() if matches(context.get("table_name"), table)]
+            schemas = [{"name": {"schema_name": "public", "database_name": database}, "tables": tables}]
+            break
+        return {"catalogs": [{"name": database, "schemas": schemas}] if schemas else []}
+
+    def generate_query(self, body):
+        query = {
+            "uuid": body.get("uuid") or str(uuid.uuid4()),
+            "query": f"SELECT * FROM movies -- {body.get('ask', '')}",
+            "liked": False,
+            "detailed_steps": [],
+            "timestamp_ms": int(time.time() * 1000),
+        }
+        self.history.append({"history_type": "query", "timestamp_ms": query["timestamp_ms"],
+                             "query": query, "request": {"ask": body.get("ask")}})
+        return query
+
+    def run_query(self, body):
+        return {"rows": [{"title": "title_0", "genre": "genre_0", "year": 2000}],
+                "column_definitions": [{"name": column, "type": column_type}
+                                       for column, column_type in SAMPLE_TABLES["movies"].items()],
+                "query_uuid": body.get("query_uuid") or str(uuid.uuid4())}
+
+    def like_query(self, body):
+        self.history.append({"history_type": "query", "timestamp_ms": int(time.time() * 1000),
+                             "query": {"uuid": body.get("query_uuid"), "query": body.get("query"),
+                                       "liked": bool(body.get("liked"))},
+                             "request": {"ask": body.get("ask")}})
+        return {}
+
+    def get_history(self, body):
+        included_types = body.get("included_types")
+        return {"history": [entry for entry in self.history
+                            if not included_types or entry["history_type"] in included_types]}
+
+    def update_semantic_context(self, body):
+        updated = []
+        for statement in body.get("updated") or []:
+            statement = dict(statement, id=statement.get("id") or str(uuid.uuid4()))
+            self.semantic_context[statement["id"]] = statement
+            updated.append(statement)
+        deleted = [statement_id for statement_id in body.get("deleted") or []
+                   if self.semantic_context.pop(statement_id, None) is not None]
+        return {"updated": updated, "deleted": deleted}
+
+    def get_semantic_context(self, body):
+        statement_filter = body.get("filter") or {}
+        statements = [statement for statement in self.semantic_context.values()
+                      if (not statement_filter.get("scope") or statement.get("scope") == statement_filter["scope"])
+                      and set(statement_filter.get("labels") or []) <= set(statement.get("labels") or [])]
+        offset = body.get("offset") or 0
+        limit = body.get("limit") or len(statements)
+        return {"semantic_context": statements[offset:offset + limit], "available_statements": len(statements)}
+
+    def ingest_document(self, body):
+        job_id = str(uuid.uuid4())
+        self.ingest_jobs[job_id] = time.time()
+        return {"ingest_document_job_id": job_id}
+
+    def get_ingest_document_job_status(self, body):
+        started_at = self.ingest_jobs.get(body.get("ingest_document_job_id"))
+        if started_at is None:
+            return {"status": "failed", "message": "unknown job"}
+        if time.time() - started_at < self.options["ingest_seconds"]:
+            return {"status": "in_progress", "progress": 0.5}
+        return {"status": "completed", "progress": 1.0}
+
+    def chat_message(self, body):
+        chat_uuid = body.get("parent_uuid") or str(uuid.uuid4())
+        self.history.append({"history_type": "chat", "timestamp_ms": int(time.time() * 1000),
+                             "request": {"ask": body.get("ask")}, "response": {"chat_uuid": chat_uuid}})
+        return {"chat_uuid": chat_uuid, "response": f"Stub answer to: {body.get('ask', '')}", "is_new": True}
+
+
+ENDPOINTS = {
+    "update-db-connect-info": StubState.update_db_connect_info,
+    "get-table-definitions": StubState.get_table_definitions,
+    "generate-query": StubState.generate_query,
+    "run-query": StubState.run_query,
+    "like-query": StubState.like_query,
+    "get-history": StubState.get_history,
+    "update-semantic-context": StubState.update_semantic_context,
+    "get-semantic-context": StubState.get_semantic_context,
+    "ingest-document": StubState.ingest_document,
+    "get-ingest-document-job-status": StubState.get_ingest_document_job_status,
+    "chat-message": StubState.chat_message,
+    "stub-registrations": StubState.stub_registrations,
+}
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    server_version = "WaiiStub/1.0"
+
+    def do_POST(self):
+        state = self.server.state
+        endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+
+        with state.lock:
+            state.requests[endpoint] = state.requests.get(endpoint, 0) + 1
+            delay = max(0.0, state.options["latency"]
+                        + state.random.uniform(-1, 1) * state.options["latency_jitter"])
+            fail = state.random.random() < state.options["failure_rate"]
+        if delay:
+            time.sleep(delay)
+
+        handler = ENDPOINTS.get(endpoint)
+        if handler is None:
+            return self.respond(404, {"detail": f"Unknown endpoint: {endpoint}"})
+        if fail:
+            return self.respond(500, {"detail": f"Injected failure: {endpoint}"})
+        try:
+            with state.lock:
+                response = handler(state, body)
+        except Exception as e:
+            return self.respond(500, {"detail": f"{type(e).__name__}: {e}"})
+        self.respond(200, response)
+
+    def respond(self, status_code, payload):
+        content = json.dumps(payload).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        # Quiet by default; a request line per call would flood the container output log.
+        pass
+
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """Start the stub server in a background thread. Returns the server (server.server_address has the port)."""
+    server = ThreadingHTTPServer((host, port), StubRequestHandler)
+    server.daemon_threads = True
+    server.state = StubState(dict(get_default_options(), **options))
+    threading.Thread(target=server.serve_forever, name="waii-stub-server", daemon=True).start()
+    return server
+
+
+def get_base_url(server):
+    """Base url of the API of a server started by start_server."""
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/api/"
+
+
+def get_registrations(base_url, key):
+    """How many times the stub server at base_url registered the connection (stub-registrations endpoint)."""
+    request = urllib.request.Request(f"{base_url}stub-registrations", data=b"{}",
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response).get(key, 0)
+
+
+def exit_with_parent():
+    """Exit once the parent (the process that launched the server) is gone, so that servers are not leaked."""
+    parent_pid = os.getppid()
+    while os.getppid() == parent_pid:
+        time.sleep(1)
+    os._exit(0)
+
+
+def main(argv=None):
+    defaults = get_default_options()
+    parser = argparse.ArgumentParser(prog="python -m tests.stub_server", description="Stand-in Waii API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9859)
+    parser.add_argument("--latency", type=float, default=defaults["latency"], help="seconds added to every call")
+    parser.add_argument("--latency-jitter", type=float, default=defaults["latency_jitter"])
+    parser.add_argument("--failure-rate", type=float, default=defaults["failure_rate"],
+                        help="ratio of calls that fail with HTTP 500")
+    parser.add_argument("--indexing-seconds", type=float, default=defaults["indexing_seconds"])
+    parser.add_argument("--ingest-seconds", type=float, default=defaults["ingest_seconds"])
+    parser.add_argument("--seed", type=int, default=defaults["seed"])
+    parser.add_argument("--exit-with-parent", action="store_true")
+    args = parser.parse_args(argv)
+
+    options = {name: getattr(args, name) for name in DEFAULT_OPTIONS}
+    server = start_server(args.host, args.port, **options)
+    print(f"{READY_MESSAGE} on http://{args.host}:{server.server_address[1]}/api/ with {options}", flush=True)
+    if args.exit_with_parent:
+        exit_with_parent()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,10 @@
 import pytest
-from waii_sdk_py.database import ModifyDBConnectionRequest, DBConnection, DBContentFilter, DBContentFilterScope, \
-    DBContentFilterType, DBContentFilterActionType
 from waii_sdk_py.history import GetHistoryRequest, GeneratedHistoryEntryType
 from waii_sdk_py.query import QueryGenerationRequest
 
+from tests.connections import POSTGRES_CONN_KEY, get_tweakit_connection
 from tests.log_util import init_logger
-from tests.utils import wait_for_connector_status, verify_sample_values, like_query
+from tests.utils import register_connection, verify_sample_values, like_query
 
 """
 - Sample test case to add a Postgres connection
@@ -17,32 +16,14 @@ from tests.utils import wait_for_connector_status, verify_sample_values, like_qu
         3. Verify if liked query is present in history
 """
 
-CONN_KEY = "postgresql://waii@localhost:5432/test"
-
-CONNECTION = {
-    "key": "postgresql://waii@localhost:5432/test",
-    "db_type": "postgresql",
-    "password": "password",
-    "description": None,
-    "username": "waii",
-    "database": "test",
-    "host": "localhost",
-    "port": "5432",
-    "sample_col_values": True,
-    "push": False,
-    "embedding_model": "text-embedding-ada-002",
-    "db_access_policy": {
-        "read_only": False,
-        "allow_access_beyond_db_content_filter": True,
-        "allow_access_beyond_search_context": True
-    }
-}
+CONN_KEY = POSTGRES_CONN_KEY
+CONNECTION = get_tweakit_connection()
 
 # Init the logger for this class
 logger = init_logger(log_file="logs/test_basic_postgres_add.log")
 
 
-@pytest.mark.docker_config("waii_default_postgres")
+@pytest.mark.docker_config("waii_default_postgres", connections=[CONNECTION])
 class Test_Basic_Postgres_Add:
 
     # declare a class level api_client
@@ -62,25 +43,10 @@ class Test_Basic_Postgres_Add:
 
     @staticmethod
     def add_db_connection(client):
-        db_conn = DBConnection(**CONNECTION)
-        db_conn.db_content_filters = [DBContentFilter(
-            filter_scope=DBContentFilterScope.table,
-            filter_type=DBContentFilterType.include,
-            filter_action_type=DBContentFilterActionType.visibility,
-            pattern='(DB_OWNER_STORAGE|USERS|PARAMETERS)'
-        )]
+        db_conn = get_tweakit_connection()
 
-        response = client.database.modify_connections(params=ModifyDBConnectionRequest(updated=[db_conn]))
-
-        client.database.activate_connection(CONN_KEY)
-        logger.info(f"Activated alias: {CONN_KEY}")
-
-        logger.info(f"Check Connector status: {CONN_KEY}")
-        connector_statuses = client.database.get_connections().connector_status
-        logger.info(f"Local Connector status: {connector_statuses}")
-
-        # Wait for connector status to be ready
-        status = wait_for_connector_status(client, CONN_KEY, retry=60, logger=logger)
+        # Registered (and indexed) only if not already present in the container with the same definition
+        status = register_connection(client, db_conn, retry=60, logger=logger)
         assert status is True, f"Connection for alias {CONN_KEY} is not ready."
 
     def test_add_postgres_connection(self, docker_environment):
@@ -12,6 +12,7 @@ from waii_sdk_py.query import QueryGenerationRequest, DebugInfoType
 from waii_sdk_py.semantic_context import ModifySemanticContextRequest, GetSemanticContextRequest, \
     GetSemanticContextRequestFilter
 
+from tests.connections import ORACLE_CONN_KEY, ORACLE_CONNECTION
 from tests.log_util import init_logger
 from tests.utils import wait_for_connector_status, verify_sample_values, add_db_connection
 
@@ -26,48 +27,7 @@ Note: If you already have docker, you can comment `@pytest.mark.docker_config("w
 - Test confidence score
 """
 
-ORACLE_CONN_KEY = "oracle://movie_db_user@localhost:1521/movie_db"
-
-ORACLE_CONNECTION = {
-    "key": "oracle://movie_db_user@localhost:1521/movie_db",
-    "db_type": "oracle",
-    "password": "password",
-    "description": None,
-    "username": "movie_db_user",
-    "database": "movie_db",
-    "host": "localhost",
-    "port": "1521",
-    "sample_col_values": True,
-    "push": False,
-    "embedding_model": "text-embedding-ada-002",
-    "db_access_policy": {
-        "read_only": False,
-        "allow_access_beyond_db_content_filter": True,
-        "allow_access_beyond_search_context": True
-    }
-}
-
-PG_CONN_KEY = "postgresql://waii@localhost:5432/test"
-
-PG_CONNECTION = {
-    "key": "postgresql://waii@localhost:5432/test",
-    "db_type": "postgresql",
-    "password": "password",
-    "description": None,
-    "username": "waii",
-    "database": "test",
-    "host": "localhost",
-    "port": "5432",
-    "sample_col_values": True,
-    "push": False,
-    "embedding_model": "text-embedding-ada-002",
-    "db_access_policy": {
-        "read_only": False,
-        "allow_access_beyond_db_content_filter": True,
-        "allow_access_beyond_search_context": True
-    }
-}
-
+# Or POSTGRES_CONN_KEY/POSTGRES_CONNECTION of tests.connections
 CONN_KEY = ORACLE_CONN_KEY
 CONNECTION = ORACLE_CONNECTION
 
@@ -6,7 +6,7 @@ from tests.log_util import init_logger
 
 """
 - Test suite just for demoing that multiple dockers can be launched in parallel and tests can be run within that.
-- This will launch 3 dockers in parallel and run the tests in each of them.
+- This will launch 3 replicas of waii_default (waii_default-r0..r2) in parallel and run the tests in each of them (with -n 3 or more).
 - Each test will run for 10 seconds; They have their own setup and cleanup.
 - Check README.md to see how to run this.
 """
@@ -44,8 +44,8 @@ class Test_docker_waii_default:
         assert api_client is not None
 
 
-@pytest.mark.docker_config("waii_default_ex_1")
-class Test_docker_waii_default_ex_1:
+@pytest.mark.docker_config("waii_default")
+class Test_docker_waii_default_2:
     # declare a class level api_client
     apiclient = None
 
@@ -62,20 +62,20 @@ class Test_docker_waii_default_ex_1:
         cls.api_client = api_client
 
     def test_feature_one(self, docker_environment):
-        logger.info("Running Test_docker_waii_default_ex_1.test_feature_one;")
+        logger.info("Running Test_docker_waii_default_2.test_feature_one;")
         time.sleep(2)
         api_client = self.api_client
         assert api_client is not None
 
     def test_feature_two(self, docker_environment):
-        logger.info("Running Test_docker_waii_default_ex_1.test_feature_two;")
+        logger.info("Running Test_docker_waii_default_2.test_feature_two;")
         time.sleep(2)
         api_client = self.api_client
         assert api_client is not None
 
 
-@pytest.mark.docker_config("waii_default_ex_2")
-class Test_docker_waii_default_ex_2:
+@pytest.mark.docker_config("waii_default")
+class Test_docker_waii_default_3:
     # declare a class level api_client
     apiclient = None
 
@@ -92,13 +92,13 @@ class Test_docker_waii_default_ex_2:
         cls.api_client = api_client
 
     def test_feature_one(self, docker_environment):
-        logger.info("Running Test_docker_waii_default_ex_2.test_feature_one;")
+        logger.info("Running Test_docker_waii_default_3.test_feature_one;")
         time.sleep(2)
         api_client = self.api_client
         assert api_client is not None
 
     def test_feature_two(self, docker_environment):
-        logger.info("Running Test_docker_waii_default_ex_2.test_feature_two;")
+        logger.info("Running Test_docker_waii_default_3.test_feature_two;")
         time.sleep(2)
         api_client = self.api_client
         assert api_client is not None
@@ -0,0 +1,53 @@
+import pytest
+from waii_sdk_py.database import ModifyDBConnectionRequest, DBConnection
+
+from tests.connections import POSTGRES_CONNECTION
+from tests.stub_server import get_base_url, start_server
+from tests.utils import init_api_client
+
+"""
+- Fixtures of the self-tests of the harness (tests/test_harness). No docker or OPENAI_API_KEY needed.
+- Run as `pytest -n 2 tests/test_harness`
+"""
+
+
+@pytest.fixture(scope="class", autouse=True)
+def class_setup_api_client(request):
+    """
+    Overrides the one in tests/conftest.py for the classes without docker_config marker: they test the modules of
+    the harness on their own, or create clients for their own stub servers, instead of connecting to the default
+    (localhost:9859) Waii. Classes with the marker (e.g Test_Stub_Server) get the one of tests/conftest.py.
+    """
+    if request.node.get_closest_marker("docker_config") is None:
+        yield
+        return
+    yield request.getfixturevalue("class_setup_api_client")
+
+
+@pytest.fixture
+def stub_server():
+    """Starts in process stub servers with the options (refer stub_server.py); returns (server, base_url)."""
+    servers = []
+
+    def start(**options):
+        server = start_server(**options)
+        servers.append(server)
+        return server, get_base_url(server)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+@pytest.fixture
+def stub_client(stub_server):
+    """Starts a stub server with the options; returns it and a client for it with POSTGRES_CONNECTION registered."""
+
+    def start(**options):
+        server, base_url = stub_server(**options)
+        client = init_api_client(base_url=base_url, api_key="")
+        client.database.modify_connections(
+            params=ModifyDBConnectionRequest(updated=[DBConnection(**POSTGRES_CONNECTION)]))
+        return server, client
+
+    return start
@@ -0,0 +1,40 @@
+import pytest
+from waii_sdk_py.query import QueryGenerationRequest
+
+from tests.api_cache import ApiCacheMiss, evict, get_connection, get_total_bytes, store
+from tests.api_transport import make_response
+from tests.utils import init_api_client
+
+"""
+- Self-tests of the record/replay cache of the API calls (tests/api_cache.py).
+"""
+
+
+class Test_Api_Cache:
+
+    def test_record_and_replay(self, stub_client, monkeypatch, tmp_path):
+        monkeypatch.setenv("WAII_API_CACHE_DB", str(tmp_path / "api_cache.sqlite"))
+        monkeypatch.setenv("WAII_API_CACHE", "record")
+        server, client = stub_client(indexing_seconds=0)
+        recorded = client.database.get_connections().connector_status
+        server.shutdown()
+
+        monkeypatch.setenv("WAII_API_CACHE", "replay")
+        client = init_api_client(base_url=client.database.http_client.url, api_key="")
+        assert client.database.get_connections().connector_status == recorded
+        with pytest.raises(ApiCacheMiss):
+            client.query.generate(params=QueryGenerationRequest(ask="never recorded"))
+
+    def test_cache_size_kept_on_store_and_evict(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("WAII_API_CACHE_DB", str(tmp_path / "api_cache.sqlite"))
+        conn = get_connection()
+        for i in range(10):
+            store(conn, f"key {i}", "endpoint", "{}", None, None, make_response(200, b"x" * 98))
+        # Replaced: its old size is not counted
+        store(conn, "key 0", "endpoint", "{}", None, None, make_response(200, b"x" * 48))
+        assert get_total_bytes(conn) == 950
+        assert get_total_bytes(conn) == conn.execute("SELECT SUM(size) FROM responses").fetchone()[0]
+
+        assert evict(conn, 900) == 2
+        assert get_total_bytes(conn) == 750
+        assert conn.execute("SELECT key FROM responses WHERE key IN ('key 1', 'key 2')").fetchall() == []
@@ -0,0 +1,22 @@
+from tests.api_metrics import pop_test_calls, summarize_calls
+from tests.connections import POSTGRES_CONN_KEY
+from tests.utils import wait_for_connector_status
+
+"""
+- Self-tests of the instrumentation of the API calls (tests/api_metrics.py).
+"""
+
+
+class Test_Api_Metrics:
+
+    def test_api_calls_recorded_per_test(self, stub_client, request):
+        _, client = stub_client(latency=0.05, indexing_seconds=0.5)
+        assert wait_for_connector_status(client, POSTGRES_CONN_KEY, retry=1, timeout=10) is True
+
+        summary = summarize_calls(pop_test_calls(request.node.nodeid))
+        connections = summary["update-db-connect-info"]
+        assert connections["calls"] >= 3
+        assert connections["seconds"] >= 0.05 * connections["calls"]
+        assert connections["request_bytes"] > 0 and connections["response_bytes"] > 0
+        assert connections["errors"] == 0
+        assert summary["wait:connector indexing"]["seconds"] >= 0.5
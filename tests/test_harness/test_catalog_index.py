@@ -0,0 +1,43 @@
+from waii_sdk_py.database import ModifyDBConnectionRequest, DBConnection
+
+from tests.catalog_index import get_catalog_index, iter_catalogs, iter_tables
+from tests.connections import POSTGRES_CONN_KEY, POSTGRES_CONNECTION
+
+"""
+- Self-tests of the catalog index and the scoped catalog walk (tests/catalog_index.py).
+"""
+
+
+class Test_Catalog_Index:
+
+    def test_catalog_index_cache(self, stub_client):
+        server, client = stub_client(indexing_seconds=0)
+        client.database.activate_connection(POSTGRES_CONN_KEY)
+
+        index = get_catalog_index(client)
+        assert index.get_column(" MOVIES", "Title") is not None
+        assert index.get_table("movies", schema_name="PUBLIC", db_name="test") is not None
+        assert index.get_column("movies", "missing") is None
+        assert get_catalog_index(client) is index
+        # Listing the connections does not change them
+        client.database.get_connections()
+        assert get_catalog_index(client) is index
+        assert server.state.requests["get-table-definitions"] == 1
+
+        # Changing the connections drops the index
+        client.database.modify_connections(
+            params=ModifyDBConnectionRequest(updated=[DBConnection(**POSTGRES_CONNECTION)]))
+        assert get_catalog_index(client) is not index
+        assert server.state.requests["get-table-definitions"] == 2
+
+    def test_scoped_catalog_walk(self, stub_client):
+        server, client = stub_client(indexing_seconds=0)
+        client.database.activate_connection(POSTGRES_CONN_KEY)
+
+        tables = iter_tables(client, db_names=["missing", "TEST"])
+        assert server.state.requests.get("get-table-definitions") is None, "Tables should be fetched lazily"
+        assert [table.name.table_name for table in tables] == ["movies", "users"]
+        assert server.state.requests["get-table-definitions"] == 2
+
+        assert [table.name.table_name for table in iter_tables(client, db_names="test", table_name="mov.*")] == ["movies"]
+        assert [catalog.name for catalog in iter_catalogs(client, db_names=["test", "missing"])] == ["test"]
@@ -0,0 +1,50 @@
+from waii_sdk_py.database import DBConnection
+
+from tests.connections import POSTGRES_CONN_KEY, POSTGRES_CONNECTION, get_fingerprint, get_tweakit_connection, \
+    registry
+from tests.container_state import acquire_container, read_state, update_state, STATUS_READY, STATUS_STOPPED
+from tests.log_util import init_logger
+from tests.stub_server import get_registrations
+from tests.utils import init_api_client, register_connection
+
+"""
+- Self-tests of tests/connections.py: fingerprints of the connection definitions and the registry of a container.
+"""
+
+logger = init_logger(log_file="logs/test_harness.log")
+
+
+class Test_Connections:
+
+    def test_fingerprint_of_dict_and_db_connection(self):
+        assert get_fingerprint(POSTGRES_CONNECTION) == get_fingerprint(DBConnection(**POSTGRES_CONNECTION))
+        assert get_fingerprint(dict(POSTGRES_CONNECTION, sample_col_values=False)) != \
+            get_fingerprint(POSTGRES_CONNECTION)
+        # Content filters are part of the definition
+        assert get_fingerprint(get_tweakit_connection()) != get_fingerprint(POSTGRES_CONNECTION)
+
+    def test_connection_registry_without_container(self, stub_server):
+        _, base_url = stub_server(indexing_seconds=0)
+        client = init_api_client(base_url=base_url, api_key="")
+        assert register_connection(client, POSTGRES_CONNECTION, retry=1, logger=logger) is True
+        assert get_registrations(base_url, POSTGRES_CONN_KEY) == 1
+        assert register_connection(client, POSTGRES_CONNECTION, retry=1, logger=logger) is True
+        assert get_registrations(base_url, POSTGRES_CONN_KEY) == 1
+
+        # A changed definition is registered again
+        changed = dict(POSTGRES_CONNECTION, sample_col_values=False)
+        assert register_connection(client, changed, retry=1, logger=logger) is True
+        assert get_registrations(base_url, POSTGRES_CONN_KEY) == 2
+
+    def test_registry_does_not_hold_state_lock(self):
+        container_name, base_url = "harness-registry", "http://harness-registry/api/"
+        update_state(container_name, container_name=container_name, status=STATUS_READY, base_url=base_url)
+        try:
+            with registry(base_url) as fingerprints:
+                fingerprints["key"] = "fingerprint"
+                # e.g a class attaching to the container while another one registers (and indexes) a connection
+                assert acquire_container(container_name, "class_a") is True
+            assert read_state(container_name)["connection_fingerprints"] == {"key": "fingerprint"}
+            assert read_state(container_name)["users"] == ["class_a"]
+        finally:
+            update_state(container_name, status=STATUS_STOPPED, users=[])
@@ -0,0 +1,43 @@
+import time
+
+from waii_sdk_py.database import ModifyDBConnectionRequest, DBConnection
+
+from tests.connections import POSTGRES_CONN_KEY, POSTGRES_CONNECTION
+from tests.log_util import init_logger
+from tests.timing_store import PHASE_CONNECTOR_INDEXING
+from tests.utils import init_api_client, wait_for_connector_status, wait_for_connector_statuses
+
+"""
+- Self-tests of the connector status watcher (tests/connector_watcher.py) and the waits built on it (tests/utils.py).
+"""
+
+logger = init_logger(log_file="logs/test_harness.log")
+
+
+def get_connection(index):
+    return dict(POSTGRES_CONNECTION, key=f"postgresql://waii@localhost:5432/test_{index}", database=f"test_{index}")
+
+
+class Test_Connector_Watcher:
+
+    def test_connector_watcher_shares_polls(self, stub_server, monkeypatch):
+        timings = []
+        monkeypatch.setattr("tests.utils.record_timing", lambda phase, seconds, **kwargs: timings.append(phase))
+        server, base_url = stub_server(indexing_seconds=0.5)
+        client = init_api_client(base_url=base_url, api_key="")
+        connections = [DBConnection(**get_connection(i)) for i in range(5)]
+        client.database.modify_connections(params=ModifyDBConnectionRequest(updated=connections))
+
+        statuses = wait_for_connector_statuses(client, [connection.key for connection in connections],
+                                               timeout=10, logger=logger)
+        assert all(statuses.values()), statuses
+        # One get_connections per tick for all the aliases; polling each alias on its own needs > 5 calls.
+        assert server.state.requests["update-db-connect-info"] <= 6, server.state.requests
+        # One connector indexing timing for the wait, not one per alias
+        assert timings == [PHASE_CONNECTOR_INDEXING]
+
+    def test_connector_timeout(self, stub_client):
+        _, client = stub_client(indexing_seconds=60)
+        start_time = time.time()
+        assert wait_for_connector_status(client, POSTGRES_CONN_KEY, timeout=1, logger=logger) is False
+        assert time.time() - start_time < 5
@@ -0,0 +1,26 @@
+import sys
+
+from tests.container_logs import get_log_pump
+from tests.docker_configs.docker_configs import get_log_dir
+from tests.docker_utils import discard_dir, start_docker_container
+
+"""
+- Self-tests of the output pump of the containers (tests/container_logs.py).
+"""
+
+
+class Test_Container_Logs:
+
+    def test_container_output_drained_after_ready(self):
+        # ~1MB of output after the ready message: fills the pipe (64KB) unless it is still drained
+        discard_dir(get_log_dir("harness-log-pump"))
+        script = "print('READY', flush=True)\nfor i in range(20000): print(f'line {i:05d}', 'x' * 40)"
+        proc = start_docker_container(f"{sys.executable} -c \"{script}\"", "READY", 10, "harness-log-pump")
+        assert proc.wait(timeout=10) == 0
+        pump = get_log_pump("harness-log-pump")
+        assert pump.join(timeout=10)
+        assert pump.line_count == 20001
+        assert pump.tail(1)[0].startswith("line 19999")
+        assert len(pump.tail()) < 20000, "Only the last lines are kept in memory"
+        with open(pump.path) as f:
+            assert sum(1 for _ in f) == 20001
@@ -0,0 +1,21 @@
+from tests.container_state import acquire_container, claim_stop, release_container, update_state, STATUS_READY, \
+    STATUS_STOPPED
+
+"""
+- Self-tests of the state of the containers shared by the processes of a run (tests/container_state.py).
+"""
+
+
+class Test_Container_State:
+
+    def test_idle_clock_starts_at_first_release(self):
+        container_name = "harness-idle"
+        update_state(container_name, status=STATUS_READY, idle_since=None, users=[], done_users=[])
+        try:
+            assert claim_stop(container_name, idle_ttl=0) is False, "Not used yet: not idle"
+            assert acquire_container(container_name, "class_a") is True
+            assert release_container(container_name, "class_a", {"class_a", "class_b"}) is False
+            assert claim_stop(container_name, idle_ttl=60) is False
+            assert claim_stop(container_name, idle_ttl=0) is True
+        finally:
+            update_state(container_name, status=STATUS_STOPPED)
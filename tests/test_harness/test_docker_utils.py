@@ -0,0 +1,31 @@
+import glob
+import os
+import time
+
+from tests.docker_utils import TRASH_SUFFIX, discard_dir
+
+"""
+- Self-tests of the helpers of tests/docker_utils.py that do not need docker.
+"""
+
+
+class Test_Docker_Utils:
+
+    def test_discard_dir(self, tmp_path):
+        path = tmp_path / "pg" / "harness-discard"
+        (path / "base").mkdir(parents=True)
+        (path / "base" / "data").write_bytes(b"x" * 1000)
+
+        discard_dir(str(path))
+        # Free to be reused right away; the contents are deleted in the background
+        assert not path.exists()
+        path.mkdir()
+        deadline = time.time() + 10
+        while glob.glob(f"{path}{TRASH_SUFFIX}*") and time.time() < deadline:
+            time.sleep(0.05)
+        assert glob.glob(f"{path}{TRASH_SUFFIX}*") == []
+        assert os.listdir(path) == []
+
+    def test_discard_missing_dir(self, tmp_path):
+        discard_dir(str(tmp_path / "missing"))
+        assert os.listdir(tmp_path) == []
@@ -0,0 +1,41 @@
+import base64
+import os
+import time
+
+import pytest
+from waii_sdk_py.database import IngestDocumentJobStatus
+
+from tests.api_metrics import pop_test_calls, summarize_calls
+from tests.connections import POSTGRES_CONN_KEY
+from tests.document_ingest import encode_file, ingest_documents
+
+"""
+- Self-tests of the concurrent document ingestion (tests/document_ingest.py).
+"""
+
+
+class Test_Document_Ingest:
+
+    @pytest.mark.parametrize("size", [0, 1, 2, 3, 10, 1000])
+    def test_encode_file(self, tmp_path, size):
+        file_path = tmp_path / "document.bin"
+        file_path.write_bytes(os.urandom(size))
+        assert encode_file(file_path, chunk_size=6) == base64.b64encode(file_path.read_bytes()).decode("utf-8")
+
+    def test_concurrent_ingest(self, stub_client, tmp_path, request):
+        server, client = stub_client(ingest_seconds=0.5, latency=0.1)
+        client.database.activate_connection(POSTGRES_CONN_KEY)
+        file_path = tmp_path / "document.txt"
+        file_path.write_text("stub document")
+
+        start_time = time.time()
+        jobs = ingest_documents(client, [file_path] * 4, timeout=10)
+        assert all(job.status == IngestDocumentJobStatus.completed for job in jobs), jobs
+        assert all(0.5 <= job.latency < 5 for job in jobs), jobs
+        assert len({job.job_id for job in jobs}) == 4
+        # Submitted together: far less than 4 documents one after the other
+        assert time.time() - start_time < 4 * 0.5
+        assert server.state.requests["ingest-document"] == 4
+        # Waits are recorded under a stable category, not per job
+        assert [endpoint for endpoint in summarize_calls(pop_test_calls(request.node.nodeid))
+                if endpoint.startswith("wait:")] == ["wait:ingest"]
@@ -0,0 +1,34 @@
+import os
+
+from tests.docker_configs.docker_configs import get_log_dir
+from tests.docker_utils import discard_dir
+from tests.log_slices import get_offsets, read_slices
+
+"""
+- Self-tests of the slices of the container logs attached to the reports (tests/log_slices.py).
+"""
+
+
+class Test_Log_Slices:
+
+    def test_container_log_slices(self):
+        log_dir = get_log_dir("harness-log-slices")
+        discard_dir(log_dir)
+        log_dir = get_log_dir("harness-log-slices")
+        with open(os.path.join(log_dir, "server.log"), "w") as f:
+            f.write("before the test\n")
+        offsets = get_offsets("harness-log-slices")
+
+        with open(os.path.join(log_dir, "server.log"), "a") as f:
+            f.write("during the test\n")
+        # Rotated: the rest of server.log.1 and the new server.log are part of the slice
+        os.rename(os.path.join(log_dir, "server.log"), os.path.join(log_dir, "server.log.1"))
+        with open(os.path.join(log_dir, "server.log"), "w") as f:
+            f.write("after rotation\n")
+        with open(os.path.join(log_dir, "big.log"), "w") as f:
+            f.write("x" * 100 + "tail")
+
+        assert read_slices("harness-log-slices", offsets, max_bytes=20) == [
+            ("big.log", "x" * 16 + "tail", True), ("server.log", "after rotation\n", False),
+            ("server.log.1", "during the test\n", False)]
+        assert read_slices("harness-log-slices", get_offsets("harness-log-slices")) == []
@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import time
+
+from tests.container_state import RUN_ID
+from tests.docker_configs.docker_configs import get_logger_file
+from tests.docker_utils import discard_dir
+from tests.log_util import flush_logs, get_worker_log_file, init_logger, merge_logs, read_records
+
+"""
+- Self-tests of the logging of the harness (tests/log_util.py): context of the records and merge of the files of
+  the processes.
+"""
+
+logger = init_logger(log_file="logs/test_harness.log")
+
+
+class Test_Log_Util:
+
+    def test_log_records_carry_context(self, request):
+        logger.info("test_log_records_carry_context marker")
+        flush_logs()
+        records, _ = read_records(get_logger_file(get_worker_log_file("logs/test_run.log")))
+        record = next(record for record in records if record["message"] == "test_log_records_carry_context marker")
+        assert record["worker"] == os.environ.get("PYTEST_XDIST_WORKER", "master")
+        assert record["nodeid"] == request.node.nodeid.split("@")[0]
+
+    def test_merge_keeps_files_of_running_processes(self):
+        discard_dir(os.path.dirname(get_logger_file("logs/merge_test/test_run.log")))
+        running = subprocess.Popen(["sleep", "60"])
+        exited = subprocess.Popen(["true"])
+        exited.wait()
+
+        def write(proc, *messages):
+            path = get_logger_file(f"logs/merge_test/test_run.{RUN_ID[:12]}.gw9.{proc.pid}.jsonl")
+            with open(path, "a") as f:
+                f.writelines(json.dumps({"ts": time.time(), "level": "INFO", "worker": "gw9", "message": message})
+                             + "\n" for message in messages)
+            return path
+        running_file = write(running, "running 1")
+        exited_file = write(exited, "exited 1")
+        try:
+            assert merge_logs("logs/merge_test/test_run.log") == 2
+            assert os.path.exists(running_file) and not os.path.exists(exited_file)
+            # Logged after the merge (e.g by a worker shutting down): merged by the next one
+            write(running, "running 2")
+        finally:
+            running.kill()
+            running.wait()
+        assert merge_logs("logs/merge_test/test_run.log") == 1
+        assert not os.path.exists(running_file)
+        with open(get_logger_file("logs/merge_test/test_run.jsonl")) as f:
+            assert [json.loads(line)["message"] for line in f] == ["running 1", "exited 1", "running 2"]
@@ -0,0 +1,73 @@
+import subprocess
+
+import pytest
+from waii_sdk_py.database import DBConnection
+
+from tests.connections import POSTGRES_CONN_KEY, POSTGRES_CONNECTION
+from tests.pg_snapshot import capture_snapshot, restore_snapshot
+
+"""
+- Self-tests of the golden snapshots of the postgres data dirs (tests/pg_snapshot.py). docker is faked: the
+  data dirs are plain dirs under tmp_path.
+"""
+
+CONFIG = {"image": "harness/sandbox:latest", "pg_snapshot": True, "run_command": "", "api_port": "auto"}
+
+
+@pytest.fixture
+def pg_dirs(monkeypatch, tmp_path):
+    """Fakes docker for pg_snapshot.py; returns the docker commands run."""
+    docker_commands = []
+    run = subprocess.run
+
+    def fake_run(args, **kwargs):
+        if args[0] == "docker":
+            docker_commands.append(args[1:])
+            return subprocess.CompletedProcess(args, 0)
+        return run(args, **kwargs)
+
+    def get_pg_dir(container_name):
+        path = tmp_path / "pg" / container_name
+        path.mkdir(parents=True, exist_ok=True)
+        return str(path)
+
+    monkeypatch.setattr("tests.pg_snapshot.subprocess.run", fake_run)
+    monkeypatch.setattr("tests.pg_snapshot.SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr("tests.pg_snapshot.get_pg_dir", get_pg_dir)
+    monkeypatch.setattr("tests.pg_snapshot.get_image_digest", lambda config: "sha256:harness")
+    return docker_commands
+
+
+class Test_Pg_Snapshot:
+
+    def test_capture_and_restore(self, pg_dirs, tmp_path):
+        connections = {POSTGRES_CONN_KEY: POSTGRES_CONNECTION}
+        (tmp_path / "pg" / "harness-r0" / "base").mkdir(parents=True)
+        (tmp_path / "pg" / "harness-r0" / "base" / "data").write_text("indexed")
+
+        assert restore_snapshot("harness", CONFIG, "harness-r1", connections) is None
+        assert capture_snapshot("harness", CONFIG, "harness-r0", connections) is True
+        # Paused while copying
+        assert pg_dirs == [["pause", "harness-r0"], ["unpause", "harness-r0"]]
+        assert capture_snapshot("harness", CONFIG, "harness-r0", connections) is False, "Already captured"
+
+        manifest = restore_snapshot("harness", CONFIG, "harness-r1", connections)
+        assert manifest["connections"] == [POSTGRES_CONN_KEY]
+        assert (tmp_path / "pg" / "harness-r1" / "base" / "data").read_text() == "indexed"
+
+        # Same definition as DBConnection, other ports: same snapshot
+        assert restore_snapshot("harness", dict(CONFIG, api_port=9999), "harness-r2",
+                                {POSTGRES_CONN_KEY: DBConnection(**POSTGRES_CONNECTION)}) is not None
+
+    def test_no_restore_of_changed_definition(self, pg_dirs, tmp_path):
+        connections = {POSTGRES_CONN_KEY: POSTGRES_CONNECTION}
+        (tmp_path / "pg" / "harness-r0").mkdir(parents=True)
+        (tmp_path / "pg" / "harness-r0" / "data").write_text("indexed")
+        assert capture_snapshot("harness", CONFIG, "harness-r0", connections) is True
+
+        changed = dict(POSTGRES_CONNECTION, sample_col_values=False)
+        assert restore_snapshot("harness", CONFIG, "harness-r1", {POSTGRES_CONN_KEY: changed}) is None
+        assert restore_snapshot("harness", CONFIG, "harness-r1", {}) is None
+        other_image = dict(CONFIG, image="harness/sandbox:next")
+        assert restore_snapshot("harness", other_image, "harness-r1", connections) is None
+        assert not (tmp_path / "pg" / "harness-r1" / "data").exists()
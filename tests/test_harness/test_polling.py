@@ -0,0 +1,56 @@
+import itertools
+import random
+
+import pytest
+
+from tests.polling import get_delays, poll
+
+"""
+- Self-tests of the polling of long running server side work (tests/polling.py). Fake clock: no actual sleep.
+"""
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # The waits are not real: not recorded for the test (refer api_metrics.py)
+    monkeypatch.setattr("tests.polling.record_wait", lambda category, seconds: None)
+    return FakeClock()
+
+
+class Test_Polling:
+
+    def test_delays_grow_exponentially_up_to_max(self):
+        delays = get_delays(0.5, 10.0, 2.0, jitter=0, rng=random.Random(0))
+        assert list(itertools.islice(delays, 7)) == [0.5, 1, 2, 4, 8, 10, 10]
+
+    def test_delays_jitter(self):
+        delays = list(itertools.islice(get_delays(1.0, 1.0, 2.0, jitter=0.2, rng=random.Random(0)), 100))
+        assert all(0.8 <= delay <= 1.2 for delay in delays)
+        assert len(set(delays)) > 1
+        # Same seed, same delays
+        assert delays == list(itertools.islice(get_delays(1.0, 1.0, 2.0, jitter=0.2, rng=random.Random(0)), 100))
+
+    def test_last_sleep_cut_at_deadline(self, clock):
+        result = poll(lambda: "pending", lambda value: False, timeout=5, jitter=0, sleep=clock.sleep, clock=clock)
+        assert clock.sleeps == [0.5, 1, 2, 1.5]
+        assert result.timed_out and result.polls == 5
+        assert result.elapsed == 5
+
+    def test_done_on_first_poll(self, clock):
+        result = poll(lambda: "completed", lambda value: value == "completed", timeout=5, sleep=clock.sleep,
+                      clock=clock)
+        assert result.done and result.value == "completed" and result.polls == 1
+        assert clock.sleeps == []
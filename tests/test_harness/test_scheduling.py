@@ -0,0 +1,172 @@
+import collections
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tests.docker_configs.docker_configs import DOCKER_CONFIGS, PROJ_DIR
+from tests.scheduling import DockerGroupScheduling, DurationEstimates, DURATIONS_CACHE_KEY, STARTUP_CACHE_KEY, \
+    REPLICA_KEY, assign_containers, get_shard_count
+
+"""
+- Self-tests of the distribution of the tests across the containers and the xdist workers (tests/scheduling.py).
+- Items and configs are fakes: no pytest session and no container is needed.
+"""
+
+CONFIGS = {
+    "harness_replicated": {"replicas": 3, "run_command": ""},
+    "harness_single": {"run_command": ""},
+}
+
+# class -> (docker config, docker_config marker kwargs, seconds of each of its tests)
+CLASSES = {
+    "Test_A": ("harness_replicated", {}, [10, 10, 10]),
+    "Test_B": ("harness_replicated", {}, [20]),
+    "Test_C": ("harness_replicated", {}, [5, 5, 5]),
+    "Test_D": ("harness_replicated", {}, [8]),
+    "Test_E": ("harness_replicated", {}, [4, 4]),
+    "Test_Single": ("harness_single", {}, [1, 1]),
+    "Test_Unmarked": (None, {}, [1]),
+}
+
+
+class FakeItem:
+    def __init__(self, nodeid, docker_name=None, **kwargs):
+        self.nodeid = nodeid
+        self.stash = pytest.Stash()
+        self.markers = [pytest.mark.docker_config(docker_name, **kwargs).mark] if docker_name else []
+
+    def get_closest_marker(self, name):
+        return next((marker for marker in reversed(self.markers) if marker.name == name), None)
+
+    def add_marker(self, marker):
+        self.markers.append(marker.mark)
+
+    def get_group(self):
+        marker = self.get_closest_marker("xdist_group")
+        return marker.args[0] if marker else None
+
+
+class FakeEstimates:
+    def __init__(self, durations):
+        self.durations = durations
+
+    def test_seconds(self, nodeid):
+        return self.durations[nodeid]
+
+
+class FakeCache:
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key, default):
+        return self.values.get(key, default)
+
+
+def make_items(classes):
+    items, durations = [], {}
+    for class_name, (docker_name, kwargs, seconds) in classes.items():
+        for index, test_seconds in enumerate(seconds):
+            item = FakeItem(f"tests/test_fake.py::{class_name}::test_{index}", docker_name, **kwargs)
+            items.append(item)
+            durations[item.nodeid] = test_seconds
+    return items, FakeEstimates(durations)
+
+
+def get_groups(classes):
+    """Assigns the containers to the items of the classes; returns {nodeid: xdist group}."""
+    items, estimates = make_items(classes)
+    assign_containers(items, estimates)
+    return {item.nodeid: item.get_group() for item in items}
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    """Registers the fake configs; call with the number of xdist workers of the run."""
+    for docker_name, config in CONFIGS.items():
+        monkeypatch.setitem(DOCKER_CONFIGS, docker_name, config)
+    monkeypatch.setattr("tests.container_launcher.REQUIRED_REPLICAS", {})
+
+    def set_count(count):
+        monkeypatch.setenv("PYTEST_XDIST_WORKER_COUNT", str(count))
+    return set_count
+
+
+class Test_Scheduling:
+
+    def test_longest_class_first_to_least_loaded_replica(self, workers):
+        workers(3)
+        groups = get_groups(CLASSES)
+        # A (30s) -> r0, B (20s) -> r1, C (15s) -> r2, then D (8s, ties broken by name) -> r2 (15s), E (8s) -> r1 (20s)
+        expected = {"Test_A": "harness_replicated-r0", "Test_B": "harness_replicated-r1",
+                    "Test_C": "harness_replicated-r2", "Test_D": "harness_replicated-r2",
+                    "Test_E": "harness_replicated-r1", "Test_Single": "harness_single", "Test_Unmarked": None}
+        assert groups == {nodeid: expected[nodeid.split("::")[1]] for nodeid in groups}
+
+    def test_replicas_capped_by_workers(self, workers):
+        workers(1)
+        groups = get_groups(CLASSES)
+        assert {group for group in groups.values() if group and group.startswith("harness_replicated")} == \
+            {"harness_replicated-r0"}
+
+        workers(2)
+        assert {group for group in get_groups(CLASSES).values() if group and group.startswith("harness_replicated")} \
+            == {"harness_replicated-r0", "harness_replicated-r1"}
+
+    def test_sharded_class_round_robin(self, workers):
+        workers(3)
+        classes = {"Test_Sharded": ("harness_replicated", {"shard": True}, [1] * 4),
+                   "Test_Two_Shards": ("harness_replicated", {"shard": 2}, [1] * 4)}
+        items, estimates = make_items(classes)
+        assign_containers(items, estimates)
+        assert [item.stash[REPLICA_KEY] for item in items] == [0, 1, 2, 0, 0, 1, 0, 1]
+        assert items[1].get_group() == "harness_replicated-r1"
+
+    def test_shard_count(self, workers):
+        config = CONFIGS["harness_replicated"]
+        workers(2)
+        assert get_shard_count(FakeItem("a", "harness_replicated"), config) == 1
+        assert get_shard_count(FakeItem("a", "harness_replicated", shard=True), config) == 2
+        assert get_shard_count(FakeItem("a", "harness_replicated", shard=5), config) == 2
+        workers(4)
+        assert get_shard_count(FakeItem("a", "harness_replicated", shard=True), config) == 3
+        assert get_shard_count(FakeItem("a", "harness_replicated", shard=2), config) == 2
+        assert get_shard_count(FakeItem("a", "harness_single", shard=True), CONFIGS["harness_single"]) == 1
+
+    def test_order_work_queue_longest_first(self, workers):
+        workers(3)
+        config = collections.namedtuple("Config", "cache")(FakeCache({
+            DURATIONS_CACHE_KEY: {"tests/test_fake.py::Test_A::test_0": 30, "tests/test_fake.py::Test_B::test_0": 5},
+            STARTUP_CACHE_KEY: {"harness_replicated": 20},
+        }))
+        scheduler = DockerGroupScheduling.__new__(DockerGroupScheduling)
+        scheduler.estimates = DurationEstimates(config)
+        scheduler.workqueue = collections.OrderedDict([
+            # Not recorded yet: median of the recorded durations (17.5s) each
+            ("tests/test_fake.py::Test_New", {"tests/test_fake.py::Test_New::test_0": False}),
+            ("tests/test_fake.py::Test_B", {"tests/test_fake.py::Test_B::test_0": False}),
+            # 30s + startup of the container
+            ("harness_replicated-r0", {"tests/test_fake.py::Test_A::test_0@harness_replicated-r0": False}),
+        ])
+        scheduler.order_work_queue()
+        assert list(scheduler.workqueue) == ["harness_replicated-r0", "tests/test_fake.py::Test_New",
+                                             "tests/test_fake.py::Test_B"]
+
+    def test_assignment_deterministic_across_processes(self):
+        # Every xdist worker assigns the containers on its own: they have to agree whatever the hash seed.
+        script = ("import json\n"
+                  "from tests.docker_configs.docker_configs import DOCKER_CONFIGS\n"
+                  "from tests.test_harness.test_scheduling import CLASSES, CONFIGS, get_groups\n"
+                  "DOCKER_CONFIGS.update(CONFIGS)\n"
+                  "print(json.dumps(get_groups(CLASSES)))\n")
+        outputs = []
+        for seed in ("1", "2"):
+            env = dict(os.environ, PYTHONHASHSEED=seed, PYTEST_XDIST_WORKER_COUNT="3")
+            result = subprocess.run([sys.executable, "-c", script], cwd=PROJ_DIR, env=env, capture_output=True,
+                                    text=True, timeout=60)
+            assert result.returncode == 0, result.stderr
+            outputs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        assert outputs[0] == outputs[1]
+        assert len(set(outputs[0].values())) == 5
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+from waii_sdk_py.database import IngestDocumentRequest, GetIngestDocumentJobStatusRequest, IngestDocumentJobStatus
+from waii_sdk_py.history import GetHistoryRequest
+from waii_sdk_py.query import QueryGenerationRequest
+from waii_sdk_py.semantic_context import ModifySemanticContextRequest, GetSemanticContextRequest, SemanticStatement
+
+from tests.async_client import AsyncWaiiClient, run_concurrently
+from tests.connections import POSTGRES_CONN_KEY, POSTGRES_CONNECTION
+from tests.container_state import find_container_name, read_state
+from tests.log_util import init_logger
+from tests.polling import poll
+from tests.stub_server import get_registrations
+from tests.utils import init_api_client, verify_sample_values, like_query, register_connection
+
+"""
+- Self-tests of the stub Waii server (tests/stub_server.py) and of the harness around it.
+- Test_Stub_Server runs against the "waii_stub" docker config, i.e through the same launch/attach path as the
+  sandbox containers (pre-launch, readiness, scheduling).
+- Test_Stub_Server_Options starts its own in process servers to inject latency and failures.
+"""
+
+CONN_KEY = POSTGRES_CONN_KEY
+CONNECTION = POSTGRES_CONNECTION
+
+# Init the logger for this class
+logger = init_logger(log_file="logs/test_harness.log")
+
+
+@pytest.mark.docker_config("waii_stub")
+class Test_Stub_Server:
+    # declare a class level api_client
+    apiclient = None
+
+    @classmethod
+    def custom_setup(cls, api_client):
+        logger.info(f"Setting up resources for {cls.__name__} with api_client:{api_client}")
+        cls.apiclient = api_client
+        status = register_connection(api_client, CONNECTION, retry=3, logger=logger)
+        assert status is True, f"Connection for alias {CONN_KEY} is not ready."
+
+    @classmethod
+    def custom_cleanup(cls, api_client):
+        logger.info(f"Cleaning up resources for {cls.__name__} with api_client:{api_client}")
+
+    def test_connection_registry(self, docker_environment):
+        base_url = docker_environment["base_url"]
+        assert CONN_KEY in read_state(find_container_name(base_url))["connection_fingerprints"]
+        registrations = get_registrations(base_url, CONN_KEY)
+        assert register_connection(self.apiclient, CONNECTION, retry=3, logger=logger) is True
+        assert get_registrations(base_url, CONN_KEY) == registrations, \
+            "Indexed connection should not be registered again"
+
+    def test_sample_values(self, docker_environment):
+        verify_sample_values(self.apiclient, "movies", "title", should_be_none=False)
+        verify_sample_values(self.apiclient, "movies", "year", should_be_none=True)
+
+    def test_generate_and_like(self, docker_environment):
+        client = self.apiclient
+        ask = "show me all the movies"
+        response = client.query.generate(params=QueryGenerationRequest(ask=ask))
+        assert response.query is not None
+        like_query(ask, response.query, client)
+
+        history = client.history.get(params=GetHistoryRequest()).history
+        assert any(entry.query.liked for entry in history), "Liked query should be in history"
+
+    def test_concurrent_generations(self, docker_environment):
+        aclient = AsyncWaiiClient(self.apiclient, max_concurrency=4)
+        asks = [f"show me movies of year {year}" for year in range(2000, 2008)]
+        responses = run_concurrently(aclient.query.generate(params=QueryGenerationRequest(ask=ask)) for ask in asks)
+        assert [response.query.split("-- ")[-1] for response in responses] == asks
+
+    def test_semantic_context(self, docker_environment):
+        client = self.apiclient
+        statements = [SemanticStatement(statement=f"statement {i}", labels=["harness"]) for i in range(3)]
+        updated = client.semantic_context.modify_semantic_context(
+            ModifySemanticContextRequest(updated=statements)).updated
+        assert len(updated) == 3 and all(statement.id for statement in updated)
+
+        response = client.semantic_context.get_semantic_context(GetSemanticContextRequest())
+        assert {statement.id for statement in updated} <= {statement.id for statement in response.semantic_context}
+
+        deleted = client.semantic_context.modify_semantic_context(
+            ModifySemanticContextRequest(deleted=[statement.id for statement in updated])).deleted
+        assert len(deleted) == 3
+
+    def test_ingest_document(self, docker_environment):
+        db = self.apiclient.database
+        job_id = db.ingest_document(IngestDocumentRequest(content="c3R1Yg==", is_binary=False,
+                                                          filename="stub.txt")).ingest_document_job_id
+        result = poll(lambda: db.get_ingest_document_job_status(
+                          GetIngestDocumentJobStatusRequest(ingest_document_job_id=job_id)),
+                      lambda job: job.status == IngestDocumentJobStatus.completed,
+                      timeout=10, name=f"ingest document job {job_id}", category="ingest", initial_delay=0.1)
+        assert result.done, result.summary()
+
+
+class Test_Stub_Server_Options:
+
+    def test_injected_latency(self, stub_server):
+        _, base_url = stub_server(latency=0.2)
+        client = init_api_client(base_url=base_url, api_key="")
+        start_time = time.time()
+        client.database.get_connections()
+        assert time.time() - start_time >= 0.2
+
+    def test_injected_failures(self, stub_server):
+        _, base_url = stub_server(failure_rate=1.0)
+        # init_api_client lists the connections, so it already fails
+        with pytest.raises(Exception, match="Injected failure"):
+            init_api_client(base_url=base_url, api_key="")
@@ -0,0 +1,25 @@
+from tests.timeline import get_depths, render_waterfall, to_chrome_trace
+
+"""
+- Self-tests of the timeline of the session (tests/timeline.py).
+"""
+
+
+def make_span(name, start, end, thread="MainThread"):
+    return {"name": name, "cat": "test_call", "start": start, "end": end, "worker": "gw0", "thread": thread,
+            "args": {"outcome": "passed"}}
+
+
+class Test_Timeline:
+
+    def test_timeline(self):
+        spans = [make_span("setup", 0, 5), make_span("custom_setup", 1, 4), make_span("test", 5, 6),
+                 make_span("launch", 0, 2, thread="prelaunch-waii_stub-r0")]
+        assert get_depths(spans) == {0: 0, 1: 1, 2: 0, 3: 0}
+        trace = to_chrome_trace(spans)
+        events = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        assert [(event["ts"], event["dur"]) for event in events] == [(0, 5000000), (1000000, 3000000),
+                                                                    (5000000, 1000000), (0, 2000000)]
+        assert len({event["tid"] for event in events}) == 2
+        waterfall = render_waterfall(spans)
+        assert waterfall.count("<rect") == 4 and "gw0 / prelaunch-waii_stub-r0" in waterfall
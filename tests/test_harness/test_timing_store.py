@@ -0,0 +1,54 @@
+import contextlib
+import io
+
+from tests.timing_store import PHASE_CONNECTOR_INDEXING, PHASE_TEST, connect, find_regressions, load_history, main, \
+    print_report
+
+"""
+- Self-tests of the timing history of the runs and its regression report (tests/timing_store.py).
+"""
+
+
+def insert_rows(db_path, rows):
+    """rows: [(run_id, recorded_at, phase, node_id, seconds)]"""
+    with contextlib.closing(connect(db_path)) as conn, conn:
+        conn.executemany("INSERT INTO timings (run_id, recorded_at, phase, node_id, seconds) VALUES (?, ?, ?, ?, ?)",
+                         rows)
+
+
+class Test_Timing_Store:
+
+    def test_find_regressions(self, tmp_path):
+        db_path = str(tmp_path / "timings.sqlite")
+        rows = []
+        for index, run_id in enumerate(["run_1", "run_2", "run_3"]):
+            rows += [(run_id, index, PHASE_TEST, "test_slower", 10.0 + index),
+                     (run_id, index, PHASE_TEST, "test_same", 5.0), (run_id, index, PHASE_TEST, "test_small", 0.5)]
+        rows += [("run_4", 3, PHASE_TEST, "test_slower", 20.0), ("run_4", 3, PHASE_TEST, "test_same", 5.5),
+                 # Slower by 100% but by less than min_seconds
+                 ("run_4", 3, PHASE_TEST, "test_small", 1.0), ("run_4", 3, PHASE_TEST, "test_new", 100.0),
+                 # Phases of a run are summed up (e.g the aliases of a class): 2 x 7s against 10s
+                 ("run_1", 0, PHASE_CONNECTOR_INDEXING, "Test_Class", 10.0),
+                 ("run_4", 3, PHASE_CONNECTOR_INDEXING, "Test_Class", 7.0),
+                 ("run_4", 3, PHASE_CONNECTOR_INDEXING, "Test_Class", 7.0)]
+        insert_rows(db_path, rows)
+
+        with contextlib.closing(connect(db_path)) as conn:
+            history = load_history(conn)
+        assert find_regressions(history, "run_4") == [(PHASE_TEST, "test_slower", 11.0, 20.0),
+                                                      (PHASE_CONNECTOR_INDEXING, "Test_Class", 10.0, 14.0)]
+        assert find_regressions(history, "run_4", threshold=0.5) == [(PHASE_TEST, "test_slower", 11.0, 20.0)]
+        assert find_regressions(history, "run_4", min_seconds=0.1)[-1] == (PHASE_TEST, "test_small", 0.5, 1.0)
+
+    def test_report_fails_on_regression(self, tmp_path):
+        db_path = str(tmp_path / "timings.sqlite")
+        insert_rows(db_path, [("run_1", 0, PHASE_TEST, "test_a", 10.0), ("run_2", 1, PHASE_TEST, "test_a", 10.5)])
+        assert main(["--db", db_path, "report", "--fail-on-regression"]) == 0
+
+        insert_rows(db_path, [("run_3", 2, PHASE_TEST, "test_a", 30.0)])
+        assert main(["--db", db_path, "report"]) == 0
+        assert main(["--db", db_path, "report", "--fail-on-regression"]) == 1
+        out = io.StringIO()
+        with contextlib.closing(connect(db_path)) as conn:
+            assert print_report(conn, out=out) == [(PHASE_TEST, "test_a", 10.25, 30.0)]
+        assert "10.25s ->    30.00s  test_a" in out.getvalue()
@@ -0,0 +1,25 @@
+from waii_sdk_py.semantic_context import ModifySemanticContextRequest, GetSemanticContextRequest, SemanticStatement
+
+from tests.connections import POSTGRES_CONN_KEY
+from tests.log_util import init_logger
+from tests.utils import delete_all_semantic_contexts
+
+"""
+- Self-tests of the helpers of tests/utils.py that are not covered by the tests of their modules.
+"""
+
+logger = init_logger(log_file="logs/test_harness.log")
+
+
+class Test_Utils:
+
+    def test_bulk_delete_semantic_contexts(self, stub_client):
+        server, client = stub_client()
+        client.database.activate_connection(POSTGRES_CONN_KEY)
+        statements = [SemanticStatement(statement=f"statement {i}") for i in range(25)]
+        client.semantic_context.modify_semantic_context(ModifySemanticContextRequest(updated=statements))
+
+        assert delete_all_semantic_contexts(client, chunk_size=10, workers=2, logger=logger) == 25
+        # 1 to add, 3 chunks to delete
+        assert server.state.requests["update-semantic-context"] == 4
+        assert client.semantic_context.get_semantic_context(GetSemanticContextRequest()).semantic_context == []
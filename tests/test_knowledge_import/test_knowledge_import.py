@@ -1,19 +1,15 @@
-import base64
-import time
 from pathlib import Path
-from typing import cast
 
 import pytest
 from waii_sdk_py import Waii
-from waii_sdk_py.database import ModifyDBConnectionRequest, DBConnection, DBContentFilter, DBContentFilterScope, \
-    DBContentFilterType, DBContentFilterActionType, IngestDocumentRequest, DatabaseImpl, \
-    GetIngestDocumentJobStatusRequest, IngestDocumentJobStatus
+from waii_sdk_py.database import IngestDocumentJobStatus
 from waii_sdk_py.query import QueryGenerationRequest
-from waii_sdk_py.semantic_context import ModifySemanticContextRequest, GetSemanticContextRequest, \
-    GetSemanticContextRequestFilter
+from waii_sdk_py.semantic_context import GetSemanticContextRequest, GetSemanticContextRequestFilter
 
+from tests.connections import POSTGRES_CONN_KEY, get_tweakit_connection
+from tests.document_ingest import ingest_documents
 from tests.log_util import init_logger
-from tests.utils import wait_for_connector_status, verify_sample_values
+from tests.utils import register_connection, verify_sample_values, delete_all_semantic_contexts
 
 """
 
@@ -29,26 +25,8 @@ Note: If you already have docker, you can comment `@pytest.mark.docker_config("w
     - Verify if it is properly imported.
 """
 
-CONN_KEY = "postgresql://waii@localhost:5432/test"
-
-CONNECTION = {
-    "key": "postgresql://waii@localhost:5432/test",
-    "db_type": "postgresql",
-    "password": "password",
-    "description": None,
-    "username": "waii",
-    "database": "test",
-    "host": "localhost",
-    "port": "5432",
-    "sample_col_values": True,
-    "push": False,
-    "embedding_model": "text-embedding-ada-002",
-    "db_access_policy": {
-        "read_only": False,
-        "allow_access_beyond_db_content_filter": True,
-        "allow_access_beyond_search_context": True
-    }
-}
+CONN_KEY = POSTGRES_CONN_KEY
+CONNECTION = get_tweakit_connection()
 
 DB_NAME = "test"
 SCHEMA_NAME = "TWEAKIT"
@@ -56,7 +34,7 @@ SCHEMA_NAME = "TWEAKIT"
 logger = init_logger(log_file="logs/test_knowledge_import.log")
 
 
-@pytest.mark.docker_config("waii_default")
+@pytest.mark.docker_config("waii_default", connections=[CONNECTION])
 class TestKnowledgeImport:
     # declare a class level api_client
     apiclient = None
@@ -82,26 +60,11 @@ class TestKnowledgeImport:
 
     @staticmethod
     def add_db_connection(client):
-        db_conn = DBConnection(**CONNECTION)
-        db_conn.db_content_filters = [DBContentFilter(
-            filter_scope=DBContentFilterScope.table,
-            filter_type=DBContentFilterType.include,
-            filter_action_type=DBContentFilterActionType.visibility,
-            pattern='(DB_OWNER_STORAGE|USERS|PARAMETERS)'
-        )]
+        db_conn = get_tweakit_connection()
 
         try:
-            response = client.database.modify_connections(params=ModifyDBConnectionRequest(updated=[db_conn]))
-
-            client.database.activate_connection(CONN_KEY)
-            logger.info(f"Activated alias: {CONN_KEY}")
-
-            logger.info(f"Check Connector status: {CONN_KEY}")
-            connector_statuses = client.database.get_connections().connector_status
-            logger.info(f"Local Connector status: {connector_statuses}")
-
-            # Wait for connector status to be ready
-            status = wait_for_connector_status(client, CONN_KEY, retry=60, logger=logger)
+            # Registered (and indexed) only if not already present in the container with the same definition
+            status = register_connection(client, db_conn, retry=60, logger=logger)
             assert status is True, f"Connection for alias {CONN_KEY} is not ready."
         except Exception as e:
             logger.error(f"Failed to connect to alias {CONN_KEY}, {str(e)}")
@@ -133,26 +96,23 @@ class TestKnowledgeImport:
             logger.info(f"Deleting all semantic contexts")
             self.delete_all_sem_contexts()
 
-            # Now import from XLSX
-            logger.info(f"Ingesting doc (xlsx)")
-            self.ingest_document(file_name='tweakit_db_owner_storage.xlsx')
+            # Now import XLSX, PDF and contradictory statements (i.e with duplicate tables, columns and very
+            # contradictory descriptions) together
+            logger.info(f"Ingesting docs (xlsx, PDF, xlsx)")
+            self.ingest_documents('tweakit_db_owner_storage.xlsx', 'tweakit_doc.pdf',
+                                  'tweakit_contradictory_definitions.xlsx')
+
             labels = ["file_name=tweakit_db_owner_storage"]
             contexts = self.get_sem_contexts(labels=labels)
             logger.info(f"Number of contexts: {labels}: {len(contexts)}")
             # TODO: Due to https://waii-ai.atlassian.net/browse/WAII-4365
             assert len(contexts) >= 8, f"Expected atleast 8 contexts for scope {labels}, but got {len(contexts)}"
 
-            # Now import from PDF
-            logger.info(f"Ingesting doc (PDF)")
-            self.ingest_document(file_name='tweakit_doc.pdf')
             labels = ["file_name=tweakit_doc"]
             contexts = self.get_sem_contexts(labels=labels)
             logger.info(f"Number of contexts: {labels}: {len(contexts)}")
             assert len(contexts) >= 18, f"Expected at max 2 contexts for scope {labels}, but got {len(contexts)}"
 
-            # now import contradictory statements. ie with duplicate tables, columns and very contradictory descriptions
-            logger.info(f"Ingesting doc (xlsx)")
-            self.ingest_document(file_name='tweakit_contradictory_definitions.xlsx')
             labels = ["file_name=tweakit_contradictory_definitions"]
             contexts = self.get_sem_contexts(labels=labels)
             logger.info(f"Number of contexts: {labels}: {len(contexts)}")
@@ -161,9 +121,8 @@ class TestKnowledgeImport:
 
             logger.info(f"Deleting all contexts")
             self.delete_all_sem_contexts()
-            for i in range(5):
-                logger.info(f"Ingesting doc (xlsx)..itr: {i}")
-                self.ingest_document(file_name='tweakit_contradictory_definitions.xlsx')
+            logger.info(f"Ingesting doc (xlsx) 5 times")
+            self.ingest_documents(*['tweakit_contradictory_definitions.xlsx'] * 5)
 
             # Check users::name scope
             scope = "users.name"
@@ -191,64 +150,26 @@ class TestKnowledgeImport:
         """
         Delete all semantic contexts for the given database and schema.
         """
-        search_context = self.get_search_scope()
-        response = self.apiclient.semantic_context.get_semantic_context(
-            GetSemanticContextRequest(search_context=search_context))
-        contexts = []
-        for context in response.semantic_context:
-            if context.id:
-                contexts.append(context.id)
-                try:
-                    logger.info(f"Deleting semantic context: {context.id}")
-                    self.apiclient.semantic_context.modify_semantic_context(
-                        ModifySemanticContextRequest(deleted=contexts))
-                except Exception as e:
-                    logger.info(f"Error deleting semantic context: {e}")
-                    assert False, f"Failed to delete sem context: {context}, error: {str(e)}"
-                finally:
-                    contexts.clear()
+        try:
+            delete_all_semantic_contexts(self.apiclient, search_context=self.get_search_scope(), logger=logger)
+        except Exception as e:
+            logger.info(f"Error deleting semantic contexts: {e}")
+            assert False, f"Failed to delete sem contexts, error: {str(e)}"
         logger.info("Done deleting all semantic contexts")
 
-    def ingest_document(self, file_name, is_binary: bool = False):
+    def ingest_documents(self, *file_names, is_binary: bool = False):
         """
-        Ingest a document into WAII system (300 seconds is the timeout)
+        Ingest documents into WAII system concurrently (600 seconds is the timeout)
         """
         try:
-            # Import knowledge base
-            logger.info(f"Ingesting document: {file_name}")
             script_dir = Path(__file__).parent.absolute()
-            file_path = Path(script_dir, file_name)
-
-            if not file_path.is_file():
-                logger.error(f"File not found: {file_path}")
-                raise FileNotFoundError(f"File not found: {file_path}")
-
-            with open(file_path, 'rb') as f:
-                file_bytes = f.read()
-            encoded_content = base64.b64encode(file_bytes).decode('utf-8')
-
-            db = cast(DatabaseImpl, self.apiclient.database)
-            response = db.ingest_document(IngestDocumentRequest(
-                content=encoded_content,
-                is_binary=is_binary,
-                filename=file_name
-            ))
-            logger.info(f"Ingested document response: {response}")
-            job_id = response.ingest_document_job_id
-            logger.info(f"Ingest document Job ID: {job_id}")
-            stime = time.time()
-            while True:
-                response = db.get_ingest_document_job_status(
-                    GetIngestDocumentJobStatusRequest(ingest_document_job_id=job_id))
-                logger.info(f"Ingest document job status: {response.status}")
-                timeout = 600
-                if response.status == IngestDocumentJobStatus.completed or (time.time() - stime) > timeout:
-                    if (time.time() - stime) > timeout:
-                        logger.info(
-                            f"Error getting ingest document job status even after {timeout} seconds...bailing out")
-                    break
-                logger.info(f"Waiting for ingest document job to complete...Sleep for 3 seconds")
-                time.sleep(3)
+            jobs = ingest_documents(self.apiclient, [Path(script_dir, file_name) for file_name in file_names],
+                                    is_binary=is_binary, timeout=600)
+            for job in jobs:
+                logger.info(f"Ingest document job status: {job}")
         except Exception as e:
             logger.error(f"Error ingesting document: {e}")
             assert False, f"Failed to ingest document: {e}"
+        # Timed out jobs are returned with their last status
+        incomplete = [job for job in jobs if job.status != IngestDocumentJobStatus.completed]
+        assert not incomplete, f"Ingest document jobs not completed: {incomplete}"
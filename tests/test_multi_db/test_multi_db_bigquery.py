@@ -3,11 +3,13 @@ import base64
 import pandas as pd
 from pandas._testing import assert_frame_equal
 
+from tests.async_client import AsyncWaiiClient, run_concurrently
+from tests.catalog_index import get_catalog_index, iter_catalogs, iter_tables
 from tests.log_util import init_logger
-from tests.utils import wait_for_connector_status
+from tests.utils import wait_for_connector_statuses
 from waii_sdk_py import Waii
 from waii_sdk_py.database import ModifyDBConnectionRequest, DBConnection, ModifyDBConnectionResponse, SearchContext, \
-    GetCatalogRequest, FilterType
+    FilterType
 from waii_sdk_py.history import GetHistoryRequest, GetHistoryResponse
 from waii_sdk_py.query import QueryGenerationRequest, RunQueryRequest
 
@@ -107,8 +109,8 @@ class TestMultiDB:
             logger.info(f"Local Connector status: {connector_statuses}")
 
             # Wait for connector status to be ready
-            status = wait_for_connector_status(client, CONN_KEY, retry=120, logger=logger)
-            assert status is True, f"Connection for alias {CONN_KEY} is not ready."
+            statuses = wait_for_connector_statuses(client, [CONN_KEY], retry=120, logger=logger)
+            assert all(statuses.values()), f"Connections not ready: {[key for key, ready in statuses.items() if not ready]}"
         except Exception as e:
             logger.error(f"Failed to connect to alias {CONN_KEY}, {str(e)}")
 
@@ -123,10 +125,10 @@ class TestMultiDB:
             "triple-nectar-461407-k3": {"test"}
         }
 
-        # Fetch all catalogs
+        # Fetch the expected catalogs only, one at a time
         actual_catalogs = {
-            catalog.name: {schema.name.schema_name for schema in catalog.schemas}
-            for catalog in client.database.get_catalogs(GetCatalogRequest()).catalogs
+            catalog.name: {schema.name.schema_name for schema in catalog.schemas or []}
+            for catalog in iter_catalogs(client, db_names=list(expected_schemas))
         }
 
         # Step 1: Assert all expected catalogs exist
@@ -221,9 +223,12 @@ class TestMultiDB:
         client.database.activate_connection(CONN_KEY)
         logger.info(f"Activated alias: {CONN_KEY}")
 
-        for i in range(1, 3):
-            ask = f"Can you show 10 name from sample_table ? Show name field only. Iteration: {i}"
-            response = client.query.generate(params=QueryGenerationRequest(ask=ask, use_cache=False))
+        # Generations are independent of each other; send them concurrently.
+        aclient = AsyncWaiiClient(client)
+        asks = [f"Can you show 10 name from sample_table ? Show name field only. Iteration: {i}" for i in range(1, 3)]
+        responses = run_concurrently(aclient.query.generate(params=QueryGenerationRequest(ask=ask, use_cache=False))
+                                     for ask in asks)
+        for response in responses:
             logger.info(f"Generated query: {response.query}")
 
         # atleast 3 entries should be there in history
@@ -240,22 +245,16 @@ class TestMultiDB:
         self.check_samples_in_table(client, table_name="sample_table", schema_name="test", db_name="triple-nectar-461407-k3")
 
     def check_samples_in_table(self, client, table_name: str, schema_name: str, db_name: str):
-        # for all catalogs, go through schemas, and for all schemas, go through tables
-        catalogs = client.database.get_catalogs(GetCatalogRequest()).catalogs
-        logger.info(f"Catalogs: {[catalog.name for catalog in catalogs]}")
-        for catalog in catalogs:
-            logger.info(f"Catalog: {catalog.name}")
-            for schema in catalog.schemas:
-                if schema.name.schema_name == "INFORMATION_SCHEMA":
-                    continue
-                logger.info(f"  Schema: {schema.name.schema_name}")
-                for table in schema.tables:
-                    logger.info(f"    Table: {table.name.table_name}")
-                    if table.name.table_name.strip().lower() == table_name and table.name.database_name.strip().lower() == db_name and table.name.schema_name.strip().lower() == schema_name:
-                        for column in table.columns:
-                            if column.type.lower() == "text" or column.type.lower() == "string":
-                                logger.info(f"    Column: {column.name}, samples: {column.sample_values}")
-                                assert column.sample_values is not None, f"Sample values for column {column} should not be None"
+        index = get_catalog_index(client)
+        logger.info(f"Catalogs: {index.catalog_names}")
+        table = index.get_table(table_name, schema_name=schema_name, db_name=db_name)
+        if table is None:
+            logger.info(f"Table {db_name}.{schema_name}.{table_name} not found in {len(index)} tables")
+            return
+        for column in table.columns or []:
+            if column.type.lower() == "text" or column.type.lower() == "string":
+                logger.info(f"    Column: {column.name}, samples: {column.sample_values}")
+                assert column.sample_values is not None, f"Sample values for column {column} should not be None"
 
     # TODO: There is bug in the system. It is not filtering correctly.
     def test_multi_db_with_table_filter(self, docker_environment):
@@ -316,22 +315,14 @@ class TestMultiDB:
 
                 # Wait for connector status to be ready
                 # TODO: completed status in WAII is broken for multi-db. This could be a reason why this test is failing.
-                status = wait_for_connector_status(client, CONN_KEY, retry=120, logger=logger)
-                assert status is True, f"Connection for alias {CONN_KEY} is not ready."
+                statuses = wait_for_connector_statuses(client, [CONN_KEY], retry=120, logger=logger)
+                assert all(statuses.values()), f"Connections not ready: {[key for key, ready in statuses.items() if not ready]}"
 
                 client.database.activate_connection(CONN_KEY)
-                catalogs = client.database.get_catalogs(GetCatalogRequest()).catalogs
-                for catalog in catalogs:
-                    logger.info(f"Catalog: {catalog.name}")
-                    if catalog.name.lower() == "cine_db":
-                        for schema in catalog.schemas:
-                            if schema.name.schema_name == "INFORMATION_SCHEMA":
-                                continue
-                            logger.info(f"  Schema: {schema.name.schema_name}")
-                            for table in schema.tables:
-                                if table.name.table_name.strip().lower() == "triple-nectar-461407-k3" and table.name.database_name.strip().lower() == 'test_table1':
-                                    logger.error(
-                                        f"Table {table.name.table_name} should not be present in catalog {catalog.name} as it is filtered out")
-                                    assert False, f"Table {table.name.table_name} should not be present in catalog {catalog.name} as it is filtered out"
+                for table in iter_tables(client, db_names="triple-nectar-461407-k3"):
+                    if table.name.table_name.strip().lower() == "test_table1":
+                        logger.error(
+                            f"Table {table.name.table_name} should not be present in catalog triple-nectar-461407-k3 as it is filtered out")
+                        assert False, f"Table {table.name.table_name} should not be present in catalog triple-nectar-461407-k3 as it is filtered out"
         except Exception as e:
             logger.error(f"Failed to connect to alias {CONN_KEY}, {str(e)}")
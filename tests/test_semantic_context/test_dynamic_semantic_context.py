@@ -4,6 +4,7 @@ from waii_sdk_py.database import SearchContext
 from waii_sdk_py.semantic_context import SemanticStatement
 from waii_sdk_py.query import QueryGenerationRequest
 
+from tests.connections import POSTGRES_CONN_KEY, POSTGRES_CONNECTION
 from tests.log_util import init_logger
 from tests.utils import add_db_connection
 
@@ -18,33 +19,17 @@ Note: If you already have docker, you can comment `@pytest.mark.docker_config("w
 - Test confidence score
 """
 
-CONN_KEY = "postgresql://waii@localhost:5432/test"
-
-CONNECTION = {
-    "key": "postgresql://waii@localhost:5432/test",
-    "db_type": "postgresql",
-    "password": "password",
-    "description": None,
-    "username": "waii",
-    "database": "test",
-    "host": "localhost",
-    "port": "5432",
-    "sample_col_values": True,
-    "push": False,
-    "embedding_model": "text-embedding-ada-002",
-    "db_access_policy": {
-        "read_only": False,
-        "allow_access_beyond_db_content_filter": True,
-        "allow_access_beyond_search_context": True
-    }
-}
+CONN_KEY = POSTGRES_CONN_KEY
+CONNECTION = POSTGRES_CONNECTION
 
 DB_NAME = "test"
 SCHEMA_NAME = "TWEAKIT"
 # Init the logger for this class
 logger = init_logger(log_file="logs/test_dynamic_semantic_context.log")
 
-@pytest.mark.docker_config("waii_default_postgres")
+# CONNECTION is not declared: the pg snapshot of waii_default_postgres has the tweakit definition of the same key
+# (test_basic_postgres_add); custom_setup registers this one.
+@pytest.mark.docker_config("waii_default_postgres", shard=True)
 class TestConfidenceScore:
     # declare a class level api_client
     apiclient = None
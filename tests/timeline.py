@@ -0,0 +1,171 @@
+import contextlib
+import glob
+import html
+import json
+import os
+import threading
+import time
+
+from tests.container_state import RUN_ID
+from tests.docker_configs.docker_configs import get_logger_file
+from tests.run_context import WORKER_ID
+
+"""
+- Timeline of the session: spans (name, category, start/end wall clock time, worker and thread) of the container
+  launches/stops, the docker_environment attach, custom_setup/custom_cleanup and the setup/call/teardown of every
+  test.
+- Spans are buffered in each process and appended to logs/timeline.<run>.<worker>.<pid>.jsonl when its session
+  finishes; the controller then collects the files of all the processes of the run (collect_spans).
+- Rendered as a waterfall (one lane per worker and thread, nested spans stacked) in the html report, and exported
+  as Chrome trace JSON (logs/timeline.json; open it in chrome://tracing or https://ui.perfetto.dev).
+"""
+
+TRACE_FILE = "logs/timeline.json"
+
+CATEGORY_COLORS = {
+    "container_launch": "#8e6bbf",
+    "container_stop": "#b8a3d6",
+    "docker_environment": "#e0a03b",
+    "custom_setup": "#4f9fd1",
+    "custom_cleanup": "#9cc8e6",
+    "test_setup": "#c9c9c9",
+    "test_call": "#5aae61",
+    "test_teardown": "#a6a6a6",
+}
+FAILED_COLOR = "#d6604d"
+
+_lock = threading.Lock()
+_spans = []
+
+
+def record_span(name, category, start, end, **args):
+    """Record a span of this process, on the current thread."""
+    span = {"name": name, "cat": category, "start": start, "end": end, "worker": WORKER_ID,
+            "thread": threading.current_thread().name, "args": args}
+    with _lock:
+        _spans.append(span)
+
+
+@contextlib.contextmanager
+def span(name, category, **args):
+    """Record the enclosed block as a span. The yielded dict can be updated with more args (e.g outcome)."""
+    start = time.time()
+    try:
+        yield args
+    finally:
+        record_span(name, category, start, time.time(), **args)
+
+
+def get_span_file(worker=WORKER_ID, pid=None):
+    return get_logger_file(f"logs/timeline.{RUN_ID[:12]}.{worker}.{pid or os.getpid()}.jsonl")
+
+
+def flush_spans():
+    """Append the spans recorded so far by this process to its file."""
+    with _lock:
+        spans = list(_spans)
+        _spans.clear()
+    if spans:
+        with open(get_span_file(), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(span, default=str) + "\n" for span in spans)
+
+
+def collect_spans():
+    """Spans of all the processes of this run, by start time. Their files are removed."""
+    flush_spans()
+    spans = []
+    for span_file in glob.glob(get_span_file(worker="*", pid="*")):
+        with open(span_file, encoding="utf-8") as f:
+            spans.extend(json.loads(line) for line in f if line.strip())
+        os.remove(span_file)
+    return sorted(spans, key=lambda span: span["start"])
+
+
+def get_lane(span):
+    """Waterfall lane of the span: its worker, plus its thread if it is not the main one."""
+    if span["thread"] == "MainThread":
+        return span["worker"]
+    return f"{span['worker']} / {span['thread']}"
+
+
+def to_chrome_trace(spans):
+    """Chrome trace (Trace Event Format) of the spans: one process per worker, one thread per thread."""
+    workers = sorted({span["worker"] for span in spans})
+    threads = sorted({(span["worker"], span["thread"]) for span in spans})
+    pids = {worker: index + 1 for index, worker in enumerate(workers)}
+    tids = {thread: index + 1 for index, thread in enumerate(threads)}
+    events = [{"name": "process_name", "ph": "M", "pid": pids[worker], "args": {"name": worker}}
+              for worker in workers]
+    events += [{"name": "thread_name", "ph": "M", "pid": pids[worker], "tid": tids[(worker, thread)],
+                "args": {"name": thread}} for worker, thread in threads]
+    for span in spans:
+        events.append({"name": span["name"], "cat": span["cat"], "ph": "X",
+                       "ts": int(span["start"] * 1e6), "dur": int((span["end"] - span["start"]) * 1e6),
+                       "pid": pids[span["worker"]], "tid": tids[(span["worker"], span["thread"])],
+                       "args": span["args"]})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def save_chrome_trace(spans, trace_file=TRACE_FILE):
+    path = get_logger_file(trace_file)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_chrome_trace(spans), f, default=str)
+    return path
+
+
+def get_depths(spans):
+    """Nesting depth of each span (index -> depth) within its lane; spans must be sorted by start."""
+    depths = {}
+    open_spans = {}
+    for index, span in enumerate(spans):
+        stack = open_spans.setdefault(get_lane(span), [])
+        while stack and stack[-1]["end"] <= span["start"]:
+            stack.pop()
+        depths[index] = len(stack)
+        stack.append(span)
+    return depths
+
+
+def render_waterfall(spans, width=1200, label_width=220, row_height=14):
+    """Self-contained html (inline svg) of the spans as a waterfall, one lane per worker/thread."""
+    if not spans:
+        return ""
+    spans = sorted(spans, key=lambda span: (span["start"], -span["end"]))
+    depths = get_depths(spans)
+    lanes = sorted({get_lane(span) for span in spans})
+    lane_depths = {lane: 1 + max(depths[index] for index, span in enumerate(spans) if get_lane(span) == lane)
+                   for lane in lanes}
+    start = min(span["start"] for span in spans)
+    total = max(max(span["end"] for span in spans) - start, 1e-3)
+    scale = (width - label_width) / total
+
+    elements = []
+    lane_y = {}
+    y = 20
+    for lane in lanes:
+        lane_y[lane] = y
+        elements.append(f'<text x="4" y="{y + row_height - 3}" font-size="11">{html.escape(lane)}</text>')
+        elements.append(f'<line x1="0" x2="{width}" y1="{y - 1}" y2="{y - 1}" stroke="#eee"/>')
+        y += lane_depths[lane] * row_height + 4
+    height = y + 20
+    # Time axis: about 10 ticks
+    step = max(1, round(total / 10))
+    for second in range(0, int(total) + 1, step):
+        x = label_width + second * scale
+        elements.append(f'<line x1="{x:.1f}" x2="{x:.1f}" y1="14" y2="{height - 16}" stroke="#f3f3f3"/>')
+        elements.append(f'<text x="{x:.1f}" y="10" font-size="9" text-anchor="middle">{second}s</text>')
+    for index, span in enumerate(spans):
+        x = label_width + (span["start"] - start) * scale
+        bar_width = max(1.0, (span["end"] - span["start"]) * scale)
+        bar_y = lane_y[get_lane(span)] + depths[index] * row_height
+        failed = span["args"].get("outcome") == "failed"
+        color = FAILED_COLOR if failed else CATEGORY_COLORS.get(span["cat"], "#888")
+        title = f"{span['name']} [{span['cat']}] {span['end'] - span['start']:.2f}s"
+        elements.append(f'<rect x="{x:.1f}" y="{bar_y}" width="{bar_width:.1f}" height="{row_height - 2}" '
+                        f'fill="{color}"><title>{html.escape(title)}</title></rect>')
+    legend = " ".join(f'<span style="background:{color};padding:0 6px">&nbsp;</span> {category}'
+                      for category, color in CATEGORY_COLORS.items())
+    return (f'<h2>Timeline</h2><p>{legend} <span style="background:{FAILED_COLOR};padding:0 6px">&nbsp;</span> '
+            f'failed. Hover a span for details; full trace in {TRACE_FILE}.</p>'
+            f'<div style="overflow-x:auto"><svg xmlns="http://www.w3.org/2000/svg" width="{width}" '
+            f'height="{height}" font-family="sans-serif">{"".join(elements)}</svg></div>')
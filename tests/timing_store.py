@@ -0,0 +1,226 @@
+import argparse
+import contextlib
+import functools
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+from tests.container_state import RUN_ID
+from tests.docker_configs.docker_configs import DOCKER_CONFIGS, PROJ_DIR, TIMING_DB
+from tests.pg_snapshot import get_image_digest
+from tests.run_context import WORKER_ID, get_current_docker_name, get_current_item
+
+"""
+- Timing history of the test runs, kept across runs in a local SQLite DB (TIMING_DB, or $WAII_TIMING_DB).
+- One row per (run, phase, node id): container_startup, custom_setup, connector_indexing, test, custom_cleanup.
+  Rows also carry the docker config, its image digest and the git SHA of this repo.
+- Timings are buffered in each process (xdist worker) and written when its session finishes.
+- Report p50/p95 per phase and node id, and flag the regressions of the latest run:
+    python -m tests.timing_store report [--phase test] [--threshold 0.2]
+    python -m tests.timing_store trend --phase container_startup
+"""
+
+PHASE_CONTAINER_STARTUP = "container_startup"
+PHASE_CUSTOM_SETUP = "custom_setup"
+PHASE_CONNECTOR_INDEXING = "connector_indexing"
+PHASE_TEST = "test"
+PHASE_CUSTOM_CLEANUP = "custom_cleanup"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS timings (
+    run_id TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    git_sha TEXT,
+    worker TEXT,
+    phase TEXT NOT NULL,
+    node_id TEXT NOT NULL,
+    docker_name TEXT,
+    image_digest TEXT,
+    seconds REAL NOT NULL,
+    outcome TEXT
+);
+CREATE INDEX IF NOT EXISTS timings_phase_node ON timings (phase, node_id, recorded_at);
+"""
+
+_pending = []
+
+
+def get_db_path():
+    return os.environ.get("WAII_TIMING_DB", TIMING_DB)
+
+
+def connect(db_path=None):
+    db_path = db_path or get_db_path()
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    # Workers flush at the same time at the end of the session; wait for the lock instead of failing.
+    conn = sqlite3.connect(db_path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@functools.lru_cache(maxsize=None)
+def get_git_sha():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJ_DIR,
+                                capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() or None
+
+
+@functools.lru_cache(maxsize=None)
+def get_config_digest(docker_name):
+    config = DOCKER_CONFIGS.get(docker_name)
+    return get_image_digest(config) if config else None
+
+
+def record_timing(phase, seconds, node_id=None, docker_name=None, outcome=None):
+    """
+    Buffer a timing of this run. node_id and docker_name default to the test being executed (if any).
+    Container startups use the container name as node_id.
+    """
+    item = get_current_item()
+    if node_id is None:
+        node_id = item.nodeid if item is not None else "<session>"
+    if docker_name is None:
+        docker_name = get_current_docker_name()
+    _pending.append({
+        "run_id": RUN_ID,
+        "recorded_at": time.time(),
+        "worker": WORKER_ID,
+        "phase": phase,
+        "node_id": node_id,
+        "docker_name": docker_name,
+        "seconds": seconds,
+        "outcome": outcome,
+    })
+
+
+def flush(db_path=None):
+    """Write the buffered timings of this process to the DB."""
+    if not _pending:
+        return 0
+    rows, _pending[:] = list(_pending), []
+    git_sha = get_git_sha()
+    # closing() closes the connection; the connection itself (as context manager) commits.
+    with contextlib.closing(connect(db_path)) as conn, conn:
+        conn.executemany(
+            "INSERT INTO timings (run_id, recorded_at, git_sha, worker, phase, node_id, docker_name, image_digest,"
+            " seconds, outcome) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(row["run_id"], row["recorded_at"], git_sha, row["worker"], row["phase"], row["node_id"],
+              row["docker_name"], get_config_digest(row["docker_name"]) if row["docker_name"] else None,
+              row["seconds"], row["outcome"]) for row in rows])
+    return len(rows)
+
+
+def percentile(values, q):
+    """Linear interpolation between the closest ranks (q in 0..100)."""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def load_history(conn, phase=None):
+    """Returns {(phase, node_id): [(run_id, seconds), ...]} ordered by time. Phases of a run are summed up."""
+    query = "SELECT phase, node_id, run_id, SUM(seconds), MIN(recorded_at) FROM timings"
+    params = ()
+    if phase:
+        query += " WHERE phase = ?"
+        params = (phase,)
+    query += " GROUP BY phase, node_id, run_id ORDER BY MIN(recorded_at)"
+    history = {}
+    for row_phase, node_id, run_id, seconds, _ in conn.execute(query, params):
+        history.setdefault((row_phase, node_id), []).append((run_id, seconds))
+    return history
+
+
+def get_latest_run_id(conn):
+    row = conn.execute("SELECT run_id FROM timings ORDER BY recorded_at DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def find_regressions(history, run_id, threshold=0.2, min_seconds=1.0):
+    """
+    Timings of run_id that are slower than the p50 of the earlier runs by more than threshold (ratio) and
+    min_seconds. Returns [(phase, node_id, p50, seconds)], worst first.
+    """
+    regressions = []
+    for (phase, node_id), runs in history.items():
+        latest = [seconds for rid, seconds in runs if rid == run_id]
+        earlier = [seconds for rid, seconds in runs if rid != run_id]
+        if not latest or not earlier:
+            continue
+        p50 = percentile(earlier, 50)
+        if latest[-1] > p50 * (1 + threshold) and latest[-1] - p50 > min_seconds:
+            regressions.append((phase, node_id, p50, latest[-1]))
+    return sorted(regressions, key=lambda r: r[3] - r[2], reverse=True)
+
+
+def print_report(conn, phase=None, threshold=0.2, min_seconds=1.0, out=sys.stdout):
+    history = load_history(conn, phase)
+    if not history:
+        print("No timings recorded yet.", file=out)
+        return []
+    print(f"{'phase':<20} {'runs':>5} {'p50':>9} {'p95':>9} {'last':>9}  node id", file=out)
+    for (row_phase, node_id), runs in sorted(history.items()):
+        values = [seconds for _, seconds in runs]
+        print(f"{row_phase:<20} {len(values):>5} {percentile(values, 50):>8.2f}s {percentile(values, 95):>8.2f}s "
+              f"{values[-1]:>8.2f}s  {node_id}", file=out)
+
+    run_id = get_latest_run_id(conn)
+    regressions = find_regressions(history, run_id, threshold, min_seconds)
+    print(f"\nRegressions in the latest run ({run_id}), slower than p50 of earlier runs by > {threshold:.0%}:",
+          file=out)
+    for row_phase, node_id, p50, seconds in regressions:
+        print(f"  {row_phase:<20} {p50:>8.2f}s -> {seconds:>8.2f}s  {node_id}", file=out)
+    if not regressions:
+        print("  None", file=out)
+    return regressions
+
+
+def print_trend(conn, phase, node_id=None, out=sys.stdout):
+    """p50/p95 of the phase per run (oldest first), optionally for one node id."""
+    query = ("SELECT run_id, MIN(recorded_at), MAX(git_sha), GROUP_CONCAT(seconds) FROM"
+             " (SELECT run_id, MIN(recorded_at) AS recorded_at, MAX(git_sha) AS git_sha, SUM(seconds) AS seconds"
+             "  FROM timings WHERE phase = ? AND (? IS NULL OR node_id = ?) GROUP BY run_id, node_id)"
+             " GROUP BY run_id ORDER BY MIN(recorded_at)")
+    print(f"{'started':<20} {'git sha':<10} {'count':>5} {'p50':>9} {'p95':>9}  run id", file=out)
+    for run_id, recorded_at, git_sha, seconds in conn.execute(query, (phase, node_id, node_id)):
+        values = [float(value) for value in seconds.split(",")]
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(recorded_at))
+        print(f"{started:<20} {git_sha or '-':<10} {len(values):>5} {percentile(values, 50):>8.2f}s "
+              f"{percentile(values, 95):>8.2f}s  {run_id}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m tests.timing_store",
+                                     description="Timing history of the integration test runs.")
+    parser.add_argument("--db", default=None, help=f"timing DB (default: {get_db_path()})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="p50/p95 per phase and node id, and regressions of the latest run")
+    report.add_argument("--phase", default=None)
+    report.add_argument("--threshold", type=float, default=0.2, help="regression ratio over p50 (default: 0.2)")
+    report.add_argument("--min-seconds", type=float, default=1.0, help="ignore regressions below (default: 1s)")
+    report.add_argument("--fail-on-regression", action="store_true", help="exit with 1 if there are regressions")
+    trend = commands.add_parser("trend", help="p50/p95 of a phase per run")
+    trend.add_argument("--phase", default=PHASE_TEST)
+    trend.add_argument("--node-id", default=None)
+    args = parser.parse_args(argv)
+
+    with contextlib.closing(connect(args.db)) as conn:
+        if args.command == "report":
+            regressions = print_report(conn, args.phase, args.threshold, args.min_seconds)
+            return 1 if regressions and args.fail_on_regression else 0
+        print_trend(conn, args.phase, args.node_id)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
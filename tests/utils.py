@@ -4,56 +4,95 @@ import time
 
 import pytest
 from waii_sdk_py import Waii
-from waii_sdk_py.database import DBConnectionIndexingStatus, DBConnection, ModifyDBConnectionRequest
+from waii_sdk_py.database import DBConnection, ModifyDBConnectionRequest
 from waii_sdk_py.query import LikeQueryRequest
+from waii_sdk_py.semantic_context import ModifySemanticContextRequest, GetSemanticContextRequest
 
+from tests.api_cache import enable_api_cache
+from tests.api_metrics import enable_api_metrics, record_wait
+from tests.async_client import AsyncWaiiClient, run_concurrently
+from tests.catalog_index import enable_catalog_index, get_catalog_index
+from tests.connections import get_fingerprint, registry
+from tests.log_util import init_logger
+from tests.connector_watcher import get_connector_watcher
+from tests.timing_store import PHASE_CONNECTOR_INDEXING, record_timing
 
-def wait_for_connector_status(api_client, alias_key, retry=10, logger:logging.Logger = None):
-    # Get the connector status for the given alias_key
-    connector_statuses = api_client.database.get_connections().connector_status
-    if alias_key not in connector_statuses:
-        pytest.fail(f"No connector status found for key: {alias_key}")
+default_logger = init_logger()
 
-    db_conn_status: DBConnectionIndexingStatus = connector_statuses[alias_key]
 
-    # Retry for a maximum of 60 seconds (retry every 10 seconds, up to 6 times)
-    status = db_conn_status.status
-    while retry > 0:
-        if status is None or status != 'completed':
-            logger.info(f"About to get connected status for : {alias_key}; Will retry {retry} times, {connector_statuses[alias_key]}")
-            time.sleep(10)
-            retry -= 1
-            status = api_client.database.get_connections().connector_status[alias_key].status
-        else:
-            break
-
-    if status == 'completed':
-        logger.info(f"Connection ready for {alias_key}: status: {db_conn_status.status}")
-        return True
-    else:
-        return False
+def wait_for_connector_status(api_client, alias_key, retry=10, logger:logging.Logger = None, timeout=None):
+    """
+    Wait until the connector of alias_key is indexed (status: completed). Returns True if it is.
+    Waits up to timeout seconds (defaults to retry * 10s).
+    """
+    return wait_for_connector_statuses(api_client, [alias_key], retry=retry, logger=logger, timeout=timeout)[alias_key]
 
-def add_db_connection(client, connection, conn_key, logger):
-    db_conn = DBConnection(**connection)
-    # db_conn.db_content_filters = [DBContentFilter(
-    #     filter_scope=DBContentFilterScope.table,
-    #     filter_type=DBContentFilterType.include,
-    #     filter_action_type=DBContentFilterActionType.visibility,
-    #     pattern='(DB_OWNER_STORAGE|USERS|PARAMETERS)'
-    # )]
 
-    try:
-        response = client.database.modify_connections(params=ModifyDBConnectionRequest(updated=[db_conn]))
+def wait_for_connector_statuses(api_client, alias_keys, retry=10, logger:logging.Logger = None, timeout=None):
+    """
+    Wait until the connectors of all alias_keys are indexed. Returns {alias_key: True if completed}.
+    All the aliases (and concurrent waits on the same client) share one polling loop; refer connector_watcher.py.
+    """
+    logger = logger or default_logger
+    timeout = retry * 10 if timeout is None else timeout
+    start_time = time.time()
+    futures = get_connector_watcher(api_client).wait_all(alias_keys, timeout)
+    elapsed = time.time() - start_time
+    record_wait("connector indexing", elapsed)
+
+    statuses = {}
+    for alias_key, future in futures.items():
+        error = future.exception() if future.done() else TimeoutError("connector status could not be fetched")
+        if isinstance(error, LookupError):
+            pytest.fail(str(error))
+        if error is not None and not isinstance(error, TimeoutError):
+            raise error
+        statuses[alias_key] = error is None
+        if error is None:
+            logger.info(f"Connection ready for {alias_key}: status: {future.result().status}")
+        else:
+            logger.info(f"Connection not ready for {alias_key} after {timeout}s: {error}")
+    # One timing per wait, however many aliases: the timings of a test are summed up (refer timing_store.py)
+    record_timing(PHASE_CONNECTOR_INDEXING, elapsed, outcome='completed' if all(statuses.values()) else 'timeout')
+    return statuses
 
-        client.database.activate_connection(conn_key)
-        logger.info(f"Activated alias: {conn_key}")
+def register_connection(api_client, connection, retry=60, logger:logging.Logger = None):
+    """
+    Make sure the connection (dict or DBConnection) is registered in the container of api_client, indexed and
+    activated. Registers it only if it is not registered yet with the same definition (refer connections.py).
+    Returns True once indexed.
+    """
+    logger = logger or default_logger
+    db_conn = connection if isinstance(connection, DBConnection) else DBConnection(**connection)
+    key = db_conn.key
+    fingerprint = get_fingerprint(db_conn)
+    base_url = api_client.database.http_client.url
+
+    # Held while indexing, so that other classes on the same container wait for it instead of registering again
+    with registry(base_url) as fingerprints:
+        if fingerprints.get(key) == fingerprint:
+            status = (api_client.database.get_connections().connector_status or {}).get(key)
+            if status is not None and status.status == 'completed':
+                api_client.database.activate_connection(key)
+                logger.info(f"Connection {key} already registered and indexed at {base_url}; activated")
+                return True
+
+        logger.info(f"Registering connection {key} at {base_url}: fingerprint {fingerprint}, "
+                    f"registered: {fingerprints.get(key)}")
+        fingerprints.pop(key, None)
+        api_client.database.modify_connections(params=ModifyDBConnectionRequest(updated=[db_conn]))
+        api_client.database.activate_connection(key)
+        logger.info(f"Activated alias: {key}")
+
+        status = wait_for_connector_status(api_client, key, retry=retry, logger=logger)
+        if status:
+            fingerprints[key] = fingerprint
+        return status
 
-        logger.info(f"Check Connector status: {conn_key}")
-        connector_statuses = client.database.get_connections().connector_status
-        logger.info(f"Local Connector status: {connector_statuses}")
 
-        # Wait for connector status to be ready
-        status = wait_for_connector_status(client, conn_key, retry=60, logger=logger)
+def add_db_connection(client, connection, conn_key, logger):
+    try:
+        status = register_connection(client, connection, retry=60, logger=logger)
         assert status is True, f"Connection for alias {conn_key} is not ready."
     except Exception as e:
         logger.error(f"Failed to connect to alias {conn_key}, {str(e)}")
@@ -61,25 +100,19 @@ def add_db_connection(client, connection, conn_key, logger):
 
 def verify_sample_values(api_client, table_name, column_name, should_be_none):
     """
-    Iterate through catalogs to verify the sample values for a given table column.
+    Verify the sample values of a table column, looked up in the (cached) catalog index of the activated connection.
     """
-    catalogs = api_client.database.get_catalogs().catalogs
-    for catalog in catalogs:
-        for schema in catalog.schemas:
-            for table in schema.tables:
-                if table.name.table_name.upper() == table_name.upper():
-                    for col in table.columns:
-                        if col.name.upper() == column_name.upper():
-                            if should_be_none:
-                                assert col.sample_values is None, (
-                                    f"Sample values for {col.name} should be None"
-                                )
-                            else:
-                                assert col.sample_values is not None, (
-                                    f"Sample values for {col.name} should not be None"
-                                )
-                            return  # Found the column; exit the function.
-    pytest.fail(f"Column {column_name} in table {table_name} not found.")
+    col = get_catalog_index(api_client).get_column(table_name, column_name)
+    if col is None:
+        pytest.fail(f"Column {column_name} in table {table_name} not found.")
+    if should_be_none:
+        assert col.sample_values is None, (
+            f"Sample values for {col.name} should be None"
+        )
+    else:
+        assert col.sample_values is not None, (
+            f"Sample values for {col.name} should not be None"
+        )
 
 
 def like_query(question, query, client:Waii):
@@ -87,7 +120,42 @@ def like_query(question, query, client:Waii):
     client.query.like(LikeQueryRequest(query_uuid=question_hash, ask=question, query=query, liked=True))
 
 
+def delete_semantic_contexts(api_client, context_ids, chunk_size=500, workers=1, logger:logging.Logger = None):
+    """
+    Delete the semantic contexts of context_ids with one request per chunk_size ids; up to workers requests at a time.
+    Returns the number of deleted contexts.
+    """
+    logger = logger or default_logger
+    context_ids = list(context_ids)
+    chunks = [context_ids[i:i + chunk_size] for i in range(0, len(context_ids), chunk_size)]
+    start_time = time.time()
+    aclient = AsyncWaiiClient(api_client, max_concurrency=workers)
+    responses = run_concurrently(aclient.semantic_context.modify_semantic_context(
+        ModifySemanticContextRequest(deleted=chunk)) for chunk in chunks)
+    deleted = sum(len(response.deleted or []) for response in responses)
+    elapsed = time.time() - start_time
+    logger.info(f"Deleted {deleted}/{len(context_ids)} semantic contexts with {len(chunks)} requests in {elapsed:.2f}s "
+                f"({deleted / elapsed if elapsed else 0:.1f}/s)")
+    return deleted
+
+
+def delete_all_semantic_contexts(api_client, search_context=None, chunk_size=500, workers=1,
+                                 logger:logging.Logger = None):
+    """
+    Delete all the semantic contexts (within search_context, if given). Returns the number of deleted contexts.
+    """
+    response = api_client.semantic_context.get_semantic_context(GetSemanticContextRequest(search_context=search_context))
+    context_ids = [context.id for context in response.semantic_context or [] if context.id]
+    return delete_semantic_contexts(api_client, context_ids, chunk_size=chunk_size, workers=workers, logger=logger)
+
+
 def init_api_client(base_url, api_key):
+    # Latency/sizes of the API calls of the tests (refer api_metrics.py); outermost, so that it sees all the calls
+    enable_api_metrics()
+    # Drop cached catalog indexes when connections change; installed before the cache, so that it sees replayed calls too
+    enable_catalog_index()
+    # Record/replay of the API calls, if enabled by $WAII_API_CACHE
+    enable_api_cache()
     client = Waii()
     client.initialize(url=base_url, api_key=api_key)
     return client